@@ -0,0 +1,120 @@
+"""
+对比两次压测结果，标出延迟上升或吞吐下降超过阈值的配置
+
+用法：
+    python -m benchmarks.compare benchmarks/results/<基准>.json benchmarks/results/<本次>.json --threshold 10
+    python -m benchmarks.compare            # 对比结果目录中最近的两次压测
+
+存在回退时以退出码1结束，便于在部署前的检查中使用。
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.load_test import RESULTS_DIR
+
+# 指标名 → 数值越大越好
+METRICS = (('qps', True), ('p50', False), ('p95', False), ('p99', False), ('error_rate', False))
+
+
+def _load(file_path: str) -> Dict[str, Any]:
+    with open(file_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _metric(run: Dict[str, Any], name: str) -> Optional[float]:
+    if name in ('qps', 'error_rate'):
+        return run.get(name)
+    return (run.get('latency_ms') or {}).get(name)
+
+
+def _run_key(run: Dict[str, Any]) -> Tuple[str, str, int]:
+    return run['provider'], run['endpoint'], run['concurrency']
+
+
+def compare_runs(baseline: Dict[str, Any], candidate: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    按（服务商、接口、并发数）对齐两次压测结果并计算变化
+
+    :param baseline: 基准结果
+    :param candidate: 本次结果
+    :param threshold: 判定回退的变化百分比
+    :return: 每个配置的对比结果
+    """
+    baseline_runs = {_run_key(run): run for run in baseline['runs']}
+    rows = []
+    for run in candidate['runs']:
+        previous = baseline_runs.get(_run_key(run))
+        if previous is None:
+            continue
+        changes, regressions = {}, []
+        for name, higher_is_better in METRICS:
+            old, new = _metric(previous, name), _metric(run, name)
+            if old is None or new is None:
+                continue
+            if name == 'error_rate':
+                # 错误率按百分点比较
+                change = (new - old) * 100
+                regressed = change > threshold / 10
+            else:
+                change = (new - old) / old * 100 if old else 0.0
+                regressed = -change > threshold if higher_is_better else change > threshold
+            changes[name] = (old, new, change)
+            if regressed:
+                regressions.append(name)
+        rows.append({'key': _run_key(run), 'changes': changes, 'regressions': regressions})
+    return rows
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    lines = []
+    for row in rows:
+        provider, endpoint, concurrency = row['key']
+        marker = '回退' if row['regressions'] else '  ok'
+        parts = []
+        for name, (old, new, change) in row['changes'].items():
+            unit = 'pp' if name == 'error_rate' else '%'
+            flag = '!' if name in row['regressions'] else ' '
+            parts.append(f'{name} {old:g}→{new:g} ({change:+.1f}{unit}){flag}')
+        lines.append(f'[{marker}] {provider:<10} {endpoint:<11} c={concurrency:<3} ' + '  '.join(parts))
+    return '\n'.join(lines)
+
+
+def _latest_two(results_dir: str) -> List[str]:
+    files = sorted(glob.glob(os.path.join(results_dir, '*.json')))
+    if len(files) < 2:
+        raise SystemExit(f'{results_dir} 中的压测结果少于两份')
+    return files[-2:]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对比两次压测结果')
+    parser.add_argument('baseline', nargs='?', help='基准结果文件')
+    parser.add_argument('candidate', nargs='?', help='本次结果文件')
+    parser.add_argument('--threshold', type=float, default=10.0, help='判定回退的变化百分比')
+    parser.add_argument('--results-dir', default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+
+    if args.baseline and args.candidate:
+        baseline_path, candidate_path = args.baseline, args.candidate
+    else:
+        baseline_path, candidate_path = _latest_two(args.results_dir)
+
+    baseline, candidate = _load(baseline_path), _load(candidate_path)
+    if baseline.get('mock') != candidate.get('mock'):
+        print('注意：两次压测的模拟服务配置不同，结果不可直接比较', file=sys.stderr)
+
+    print(f"基准: {baseline_path} ({baseline.get('git_commit')})")
+    print(f"本次: {candidate_path} ({candidate.get('git_commit')})\n")
+    rows = compare_runs(baseline, candidate, args.threshold)
+    print(format_comparison(rows))
+
+    if any(row['regressions'] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+对话历史的内存占用基准测试
+
+比较同样的对话在不同保存方式下占用的内存（tracemalloc统计）：
+  dict        —— 每轮一个字典、ISO格式时间戳（之前的实现）
+  records     —— Interaction 记录
+  records+llm —— Interaction 记录及缓存的LLM格式消息（活跃会话的状态）
+  compacted   —— 压缩保存（空闲会话的状态）
+并测量 get_history_for_llm 的耗时（每次重新格式化、使用缓存、压缩后首次访问）。
+
+用法（在项目根目录执行）：
+    python -m benchmarks.history_memory --sessions 1000 --turns 10 --label baseline
+
+结果保存到 benchmarks/results/memory/。
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import time
+import timeit
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from sakuratalk import conversation_history as history_module
+from sakuratalk.conversation_history import ConversationHistory, format_history_for_llm
+
+from benchmarks.load_test import PROJECT_ROOT, _git_commit
+
+MEMORY_RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results', 'memory')
+
+
+class DictHistory:
+    """
+    之前的保存方式：每轮一个字典，每次读取时重新格式化
+    """
+    def __init__(self, max_history: int):
+        self.history = deque(maxlen=max_history)
+        self.summary = ''
+
+    def add_interaction(self, user_input: str, ai_response: str) -> None:
+        self.history.append({
+            'timestamp': datetime.now().isoformat(),
+            'user': user_input,
+            'ai': ai_response
+        })
+
+    def get_history_for_llm(self) -> List[Dict[str, str]]:
+        return format_history_for_llm(self.history, self.summary)
+
+
+def _fill(history, session: int, turns: int):
+    # 每轮的文本都不同，避免字符串被共享而低估内存
+    for turn in range(turns):
+        history.add_interaction(f'今日は何をしましたか？（{session}-{turn}）',
+                                f'図書館で日本語の本を読みました。とても面白かったです。（{session}-{turn}）')
+    return history
+
+
+def measure_memory(build: Callable[[], Any], sessions: int) -> Dict[str, Any]:
+    """
+    测量构造sessions个会话后仍被持有的内存
+
+    :param build: 构造一个会话的历史的函数（参数为会话序号）
+    :param sessions: 会话数
+    :return: 总字节数和每个会话的字节数
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        histories = [build(session) for session in range(sessions)]
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del histories
+    return {'bytes': retained, 'per_session': round(retained / sessions, 1)}
+
+
+def measure_time(fn: Callable[[], Any], repeat: int = 5) -> float:
+    """
+    测量单次调用耗时的中位数（微秒）
+    """
+    timer = timeit.Timer(fn)
+    loops, _ = timer.autorange()
+    return round(statistics.median(total / loops * 1e6 for total in timer.repeat(repeat=repeat, number=loops)), 3)
+
+
+def _first_access_after_compact(turns: int) -> Callable[[], Any]:
+    history = _fill(ConversationHistory(max_history=turns), 0, turns)
+
+    def run():
+        history.compact()
+        return history.get_history_for_llm()
+    return run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='对话历史的内存占用基准测试')
+    parser.add_argument('--sessions', type=int, default=1000, help='会话数')
+    parser.add_argument('--turns', type=int, default=10, help='每个会话的对话轮数（即最大历史记录数）')
+    parser.add_argument('--label', default='run', help='结果文件名中的标签')
+    parser.add_argument('--output-dir', default=MEMORY_RESULTS_DIR, help='结果保存目录')
+    args = parser.parse_args(argv)
+    turns = args.turns
+
+    def records(session):
+        return _fill(ConversationHistory(max_history=turns), session, turns)
+
+    def records_with_view(session):
+        history = records(session)
+        history.get_history_for_llm()
+        return history
+
+    def compacted(session):
+        history = records(session)
+        history.compact()
+        return history
+
+    layouts = {
+        'dict': lambda session: _fill(DictHistory(turns), session, turns),
+        'records': records,
+        'records+llm': records_with_view,
+        'compacted': compacted
+    }
+    codec = 'zstd' if history_module.zstandard is not None else 'zlib'
+    print(f'{args.sessions}个会话 × {turns}轮（压缩算法: {codec}）')
+
+    memory: Dict[str, Dict[str, Any]] = {}
+    for name, build in layouts.items():
+        memory[name] = measure_memory(build, args.sessions)
+        print(f"memory.{name:<20} {memory[name]['bytes'] / 1024:>12.1f} KiB  {memory[name]['per_session']:>10.1f} B/会话",
+              flush=True)
+
+    cached = records_with_view(0)
+    timings = {
+        'get_history_for_llm.dict': measure_time(_fill(DictHistory(turns), 0, turns).get_history_for_llm),
+        'get_history_for_llm.cached': measure_time(cached.get_history_for_llm),
+        'get_history_for_llm.after_compact': measure_time(_first_access_after_compact(turns))
+    }
+    for name, median_us in timings.items():
+        print(f'{name:<40} {median_us:>10.2f} µs', flush=True)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    file_path = os.path.join(args.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{args.label}.json")
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'label': args.label,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sessions': args.sessions,
+            'turns': turns,
+            'codec': codec,
+            'memory': memory,
+            'timings_us': timings
+        }, f, ensure_ascii=False, indent=2)
+    print(f'\n结果已保存: {file_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,432 @@
+"""
+端到端压测：在模拟服务商接口上运行应用，对 /api/chat 及语音相关接口施加并发负载
+
+用法（在项目根目录执行）：
+    python -m benchmarks.load_test --providers dashscope,ollama --concurrency 4,16 --duration 20 --label baseline
+
+每种服务商配置在独立的子进程中启动应用（服务实例和配置都是模块级的），
+压测结果（p50/p95/p99延迟、QPS、错误率、各处理阶段平均耗时）输出到终端，
+并保存到 benchmarks/results/<时间>-<标签>.json，可用 benchmarks.compare 对比不同时间的结果。
+"""
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+from prometheus_client.parser import text_string_to_metric_families
+
+from benchmarks.mock_providers import (MockProviderServer, add_settings_arguments, provider_env,
+                                       settings_from_args, synthesize_wav)
+from benchmarks.mock_redis import MockRedisServer
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results')
+
+PROVIDERS = ('dashscope', 'openai', 'gemini', 'ollama')
+ENDPOINTS = ('chat', 'tts', 'stt', 'voice_turn')
+
+
+# ---------- 被压测的应用（子进程） ----------
+
+def serve_app(port: int) -> None:
+    """
+    在当前进程中启动应用（由压测主进程以子进程方式调用，服务商配置通过环境变量传入）
+
+    :param port: 监听端口
+    """
+    from werkzeug.serving import make_server
+    from sakuratalk.app import create_app
+
+    # 不输出每个请求的访问日志
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', port, create_app(), threaded=True)
+    print(f'app listening on {port}', flush=True)
+    server.serve_forever()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class AppProcess:
+    """
+    以指定服务商配置运行应用的子进程
+    """
+    def __init__(self, provider: str, mock_url: str, cache_dir: str, state_env: Optional[Dict[str, str]] = None):
+        """
+        :param provider: LLM服务商
+        :param mock_url: 模拟服务地址
+        :param cache_dir: 发音评分缓存和后台任务数据库目录（使用临时目录，避免污染本地缓存）
+        :param state_env: 共享状态存储的环境变量
+        """
+        self.provider = provider
+        self.port = _free_port()
+        self.base_url = f'http://127.0.0.1:{self.port}'
+        self.env = {
+            **os.environ,
+            **provider_env(mock_url),
+            'LLM_PROVIDER': provider,
+            'STT_PROVIDER': 'dashscope',
+            'TTS_PROVIDER': 'dashscope',
+            'OLLAMA_KEEPALIVE_INTERVAL': '0',
+            'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'WARNING'),
+            'LOG_PAYLOAD_SAMPLE_RATE': '0',
+            'TRACING_EXPORTER': 'none',
+            'PRONUNCIATION_CACHE_DIR': cache_dir,
+            'JOB_QUEUE_DB': os.path.join(cache_dir, 'jobs.sqlite3'),
+            'JOB_UPLOAD_DIR': os.path.join(cache_dir, 'job_uploads'),
+            # 推测执行会在后台额外调用服务商接口，默认关闭以便与之前的结果对比
+            'SPECULATION_ENABLED': os.environ.get('SPECULATION_ENABLED', 'false'),
+            # 压测的所有请求来自同一IP，默认不限流（服务商并发限制仍然生效）
+            'RATE_LIMIT_IP_RATE': os.environ.get('RATE_LIMIT_IP_RATE', '0'),
+            'RATE_LIMIT_SESSION_RATE': os.environ.get('RATE_LIMIT_SESSION_RATE', '0'),
+            **(state_env or {})
+        }
+        self.process = None
+
+    def __enter__(self) -> 'AppProcess':
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.load_test', '--serve-app', '--port', str(self.port)],
+            cwd=PROJECT_ROOT, env=self.env, stdout=subprocess.DEVNULL
+        )
+        self._wait_ready()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    def _wait_ready(self, timeout: float = 60.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'应用进程启动失败（{self.provider}），退出码 {self.process.returncode}')
+            try:
+                if requests.get(f'{self.base_url}/api/ready', timeout=2).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f'等待应用就绪超时（{self.provider}）')
+
+    def stage_totals(self) -> Dict[str, List[float]]:
+        """
+        读取 /metrics 中各处理阶段的累计耗时与次数
+
+        :return: {阶段: [累计秒数, 次数]}
+        """
+        totals = defaultdict(lambda: [0.0, 0.0])
+        text = requests.get(f'{self.base_url}/metrics', timeout=5).text
+        for family in text_string_to_metric_families(text):
+            if family.name != 'sakuratalk_stage_duration_seconds':
+                continue
+            for sample in family.samples:
+                if sample.name.endswith('_sum'):
+                    totals[sample.labels['stage']][0] += sample.value
+                elif sample.name.endswith('_count'):
+                    totals[sample.labels['stage']][1] += sample.value
+        return totals
+
+
+# ---------- 请求构造 ----------
+
+class RequestFactory:
+    """
+    构造各接口的压测请求；每个请求使用不同的文本和音频，避免被请求合并（single-flight）吸收
+    """
+    def __init__(self):
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._audio = bytearray(synthesize_wav('こんにちは、元気ですか？'))
+
+    def next_id(self) -> int:
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def audio(self, request_id: int) -> bytes:
+        audio = bytearray(self._audio)
+        # 修改最后一个采样点，使每段音频的内容哈希不同
+        audio[-2:] = (request_id % 65536).to_bytes(2, 'little')
+        return bytes(audio)
+
+    def chat(self, session: requests.Session, base_url: str) -> Dict[str, Any]:
+        response = session.post(f'{base_url}/api/chat', json={'message': f'こんにちは（{self.next_id()}）'}, timeout=60)
+        return {'ok': response.status_code == 200}
+
+    def tts(self, session: requests.Session, base_url: str) -> Dict[str, Any]:
+        response = session.post(f'{base_url}/api/text_to_speech',
+                                json={'text': f'今日はいい天気ですね。{self.next_id()}'}, timeout=60)
+        return {'ok': response.status_code == 200}
+
+    def stt(self, session: requests.Session, base_url: str) -> Dict[str, Any]:
+        audio = self.audio(self.next_id())
+        response = session.post(f'{base_url}/api/speech_to_text',
+                                files={'audio': ('speech.wav', io.BytesIO(audio), 'audio/wav')}, timeout=60)
+        return {'ok': response.status_code == 200}
+
+    def voice_turn(self, session: requests.Session, base_url: str) -> Dict[str, Any]:
+        audio = self.audio(self.next_id())
+        start = time.perf_counter()
+        response = session.post(f'{base_url}/api/voice_turn', data={'tts': 'true'},
+                                files={'audio': ('speech.wav', io.BytesIO(audio), 'audio/wav')},
+                                stream=True, timeout=60)
+        ttfb, events = None, []
+        for line in response.iter_lines():
+            if not line:
+                continue
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+            events.append(json.loads(line)['event'])
+        ok = response.status_code == 200 and events[-1:] == ['done'] and 'error' not in events
+        return {'ok': ok, 'ttfb': ttfb}
+
+
+# ---------- 负载生成与统计 ----------
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """
+    最近秩法计算分位数
+
+    :param sorted_values: 已排序的数据
+    :param fraction: 分位（0–1）
+    :return: 分位数，无数据时返回None
+    """
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize_latencies(values: List[float]) -> Optional[Dict[str, float]]:
+    """
+    汇总延迟分布（毫秒）
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        'p50': round(percentile(values, 0.50) * 1000, 2),
+        'p95': round(percentile(values, 0.95) * 1000, 2),
+        'p99': round(percentile(values, 0.99) * 1000, 2),
+        'mean': round(sum(values) / len(values) * 1000, 2),
+        'max': round(values[-1] * 1000, 2)
+    }
+
+
+def run_load(base_url: str, send: Callable, concurrency: int, duration: float, warmup: int = 2) -> Dict[str, Any]:
+    """
+    以固定并发数（闭环）持续发送请求
+
+    :param base_url: 应用地址
+    :param send: 发送一个请求的函数，返回 {'ok': bool, 'ttfb': 秒数（可选）}
+    :param concurrency: 并发数
+    :param duration: 持续时间（秒）
+    :param warmup: 每个并发线程正式计时前的预热请求数
+    :return: 统计结果
+    """
+    latencies, ttfbs = [], []
+    counts = {'requests': 0, 'errors': 0}
+    lock = threading.Lock()
+    warmed_up = threading.Barrier(concurrency + 1)
+    started_event = threading.Event()
+    deadline = [0.0]
+
+    def worker():
+        with requests.Session() as session:
+            for _ in range(warmup):
+                try:
+                    send(session, base_url)
+                except requests.RequestException:
+                    pass
+            warmed_up.wait()
+            started_event.wait()
+            while time.perf_counter() < deadline[0]:
+                start = time.perf_counter()
+                try:
+                    result = send(session, base_url)
+                except requests.RequestException:
+                    result = {'ok': False}
+                elapsed = time.perf_counter() - start
+                with lock:
+                    counts['requests'] += 1
+                    if result['ok']:
+                        latencies.append(elapsed)
+                        if result.get('ttfb') is not None:
+                            ttfbs.append(result['ttfb'])
+                    else:
+                        counts['errors'] += 1
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    # 所有线程预热完成后同时开始计时
+    warmed_up.wait()
+    started = time.perf_counter()
+    deadline[0] = started + duration
+    started_event.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': counts['requests'],
+        'errors': counts['errors'],
+        'error_rate': round(counts['errors'] / counts['requests'], 4) if counts['requests'] else 0.0,
+        'qps': round(len(latencies) / elapsed, 2),
+        'elapsed_seconds': round(elapsed, 2),
+        'latency_ms': summarize_latencies(latencies),
+        'ttfb_ms': summarize_latencies(ttfbs)
+    }
+
+
+def stage_means(before: Dict[str, List[float]], after: Dict[str, List[float]]) -> Dict[str, float]:
+    """
+    根据两次 /metrics 读数计算本轮压测中各阶段的平均耗时（毫秒）
+    """
+    means = {}
+    for stage, (total, count) in after.items():
+        previous_total, previous_count = before.get(stage, (0.0, 0.0))
+        if count > previous_count:
+            means[stage] = round((total - previous_total) / (count - previous_count) * 1000, 3)
+    return means
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_table(runs: List[Dict[str, Any]]) -> str:
+    """
+    将压测结果格式化为文本表格
+    """
+    header = f"{'provider':<10} {'endpoint':<11} {'conc':>4} {'reqs':>6} {'err%':>6} {'qps':>8} " \
+             f"{'p50':>8} {'p95':>8} {'p99':>8} {'ttfb50':>8}"
+    lines = [header, '-' * len(header)]
+    for run in runs:
+        latency = run['latency_ms'] or {}
+        ttfb = run['ttfb_ms'] or {}
+        lines.append(
+            f"{run['provider']:<10} {run['endpoint']:<11} {run['concurrency']:>4} {run['requests']:>6} "
+            f"{run['error_rate'] * 100:>6.1f} {run['qps']:>8.2f} "
+            f"{latency.get('p50', float('nan')):>8.1f} {latency.get('p95', float('nan')):>8.1f} "
+            f"{latency.get('p99', float('nan')):>8.1f} {ttfb.get('p50', float('nan')):>8.1f}"
+        )
+    return '\n'.join(lines)
+
+
+def save_results(results: Dict[str, Any], label: str, output_dir: str = RESULTS_DIR) -> str:
+    """
+    保存压测结果
+
+    :return: 结果文件路径
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    file_path = os.path.join(output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{label}.json")
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return file_path
+
+
+def _split_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SakuraTalk 端到端压测')
+    parser.add_argument('--providers', default=','.join(PROVIDERS), help='LLM服务商，逗号分隔')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help=f"压测接口，逗号分隔（{', '.join(ENDPOINTS)}）")
+    parser.add_argument('--concurrency', default='1,8', help='并发数，逗号分隔，每个值单独压测一轮')
+    parser.add_argument('--duration', type=float, default=10.0, help='每轮压测的持续时间（秒）')
+    parser.add_argument('--warmup', type=int, default=2, help='每个并发线程的预热请求数')
+    parser.add_argument('--label', default='run', help='结果文件名中的标签')
+    parser.add_argument('--output-dir', default=RESULTS_DIR, help='结果保存目录')
+    parser.add_argument('--state-backend', choices=('local', 'memory', 'redis'), default='local',
+                        help='共享状态存储（redis时使用本地的Redis替身服务）')
+    parser.add_argument('--serve-app', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, default=0, help=argparse.SUPPRESS)
+    add_settings_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.serve_app:
+        serve_app(args.port)
+        return
+
+    providers = _split_list(args.providers)
+    endpoints = _split_list(args.endpoints)
+    concurrency_levels = [int(value) for value in _split_list(args.concurrency)]
+    for name, allowed, values in (('provider', PROVIDERS, providers), ('endpoint', ENDPOINTS, endpoints)):
+        unknown = set(values) - set(allowed)
+        if unknown:
+            parser.error(f"未知的{name}: {', '.join(sorted(unknown))}")
+
+    settings = settings_from_args(args)
+    mock_server = MockProviderServer(settings=settings).start()
+    redis_server = MockRedisServer().start() if args.state_backend == 'redis' else None
+    state_env = {'STATE_BACKEND': args.state_backend}
+    if redis_server is not None:
+        state_env['STATE_REDIS_URL'] = redis_server.url
+    request_factory = RequestFactory()
+    runs = []
+    try:
+        with tempfile.TemporaryDirectory(prefix='sakuratalk-bench-') as cache_dir:
+            for provider in providers:
+                # 语音接口不经过LLM，只在第一个服务商配置下压测
+                provider_endpoints = [e for e in endpoints if e in ('chat', 'voice_turn') or provider == providers[0]]
+                with AppProcess(provider, mock_server.base_url, cache_dir, state_env) as app:
+                    for endpoint in provider_endpoints:
+                        for concurrency in concurrency_levels:
+                            print(f'[{provider}] {endpoint} 并发 {concurrency} ...', file=sys.stderr, flush=True)
+                            before = app.stage_totals()
+                            result = run_load(app.base_url, getattr(request_factory, endpoint),
+                                              concurrency, args.duration, args.warmup)
+                            runs.append({
+                                'provider': provider,
+                                'endpoint': endpoint,
+                                'concurrency': concurrency,
+                                **result,
+                                'stages_ms': stage_means(before, app.stage_totals())
+                            })
+    finally:
+        mock_server.stop()
+        if redis_server is not None:
+            redis_server.stop()
+
+    results = {
+        'label': args.label,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'duration_seconds': args.duration,
+        'state_backend': args.state_backend,
+        'mock': settings.to_dict(),
+        'runs': runs
+    }
+    print(format_table(runs))
+    print(f'\n结果已保存: {save_results(results, args.label, args.output_dir)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+每轮对话都会执行的Python代码的微基准测试
+
+覆盖：对话历史格式化（ConversationHistory.get_history_for_llm）、各服务的消息构建、
+模型输出的JSON解析（含大体积和格式错误的输出）、返回结果的构建、TTS音频文件写入。
+
+用法（在项目根目录执行）：
+    python -m benchmarks.microbench --label baseline
+    python -m benchmarks.microbench --filter parse --baseline benchmarks/results/micro/<基准>.json
+
+结果保存到 benchmarks/results/micro/；指定 --baseline 时，中位数变慢超过阈值的项会被标记，并以退出码1结束。
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 微基准测试时只输出错误日志，避免格式错误的输出触发的警告刷屏
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+from sakuratalk.conversation_history import ConversationHistory
+from sakuratalk.logging_config import setup_logging
+from sakuratalk.response_parser import parse_json_object
+
+from benchmarks.load_test import PROJECT_ROOT, _git_commit
+from benchmarks.mock_providers import DEFAULT_CHAT_REPLY
+
+MICRO_RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results', 'micro')
+
+HISTORY_SIZES = (10, 100, 1000)
+AUDIO_SIZES = (64 * 1024, 1024 * 1024)
+
+
+# ---------- 测试数据 ----------
+
+def make_history(size: int) -> ConversationHistory:
+    """
+    构造包含指定轮数的对话历史
+    """
+    history = ConversationHistory(max_history=size)
+    for i in range(size):
+        history.add_interaction(f'今日は何をしましたか？（{i}）', f'図書館で日本語の本を読みました。とても面白かったです。（{i}）')
+    return history
+
+
+def make_model_outputs() -> Dict[str, str]:
+    """
+    构造不同形态的模型输出
+    """
+    clean = json.dumps(DEFAULT_CHAT_REPLY, ensure_ascii=False)
+    large_reply = dict(DEFAULT_CHAT_REPLY, japanese='今日はいい天気ですね。' * 800, chinese='今天天气真好呢。' * 800)
+    large = json.dumps(large_reply, ensure_ascii=False)
+    return {
+        'clean': clean,
+        'fenced': f'以下是回复：\n```json\n{json.dumps(DEFAULT_CHAT_REPLY, ensure_ascii=False, indent=2)}\n```\n',
+        'large': large,
+        'trailing_comma': clean[:-1] + ',}',
+        'curly_quotes': clean.replace('"japanese"', '“japanese”'),
+        'truncated': clean[:len(clean) * 2 // 3],
+        'large_truncated': large[:len(large) - 40],
+        'not_json': 'すみません、もう一度お願いします。' * 20
+    }
+
+
+def _llm_services() -> Dict[str, Any]:
+    """
+    创建各LLM服务实例（构造时不会发起网络请求）
+    """
+    from sakuratalk.services.llm.dashscope_service import DashScopeService
+    from sakuratalk.services.llm.gemini_service import GeminiService
+    from sakuratalk.services.llm.ollama_service import OllamaService
+    from sakuratalk.services.llm.openai_service import OpenAIService
+    return {
+        'dashscope': DashScopeService(),
+        'openai': OpenAIService(),
+        'gemini': GeminiService(),
+        'ollama': OllamaService()
+    }
+
+
+# ---------- 基准测试项 ----------
+
+def build_benchmarks(work_dir: str) -> List[Tuple[str, Callable[[], Any]]]:
+    """
+    构造所有基准测试项
+
+    :param work_dir: 音频写入测试使用的临时目录
+    :return: [(名称, 无参函数)]
+    """
+    benchmarks = []
+
+    histories = {size: make_history(size) for size in HISTORY_SIZES}
+    for size, history in histories.items():
+        benchmarks.append((f'history.get_history_for_llm[{size}]', history.get_history_for_llm))
+
+    services = _llm_services()
+    for size in (10, 1000):
+        formatted = histories[size].get_history_for_llm()
+        for name, service in services.items():
+            build = service._build_prompt if name == 'gemini' else service._build_messages
+            benchmarks.append((f'messages.{name}[{size}]', lambda build=build, formatted=formatted: build('こんにちは', formatted)))
+
+    outputs = make_model_outputs()
+    parser_service = services['dashscope']
+    for name, text in outputs.items():
+        benchmarks.append((f'parse.parse_json_object[{name}]', lambda text=text: parse_json_object(text)))
+    for name in ('clean', 'large', 'truncated'):
+        text = outputs[name]
+        benchmarks.append((f'parse.parse_chat_response[{name}]', lambda text=text: parser_service._parse_chat_response(text)))
+
+    from sakuratalk.app import _build_chat_result
+    normalized = parser_service._parse_chat_response(outputs['clean'])
+    benchmarks.append(('app.build_chat_result', lambda: _build_chat_result(normalized)))
+
+    from sakuratalk.services.tts.aliyun_tts_service import AliyunTTSService
+    tts_service = AliyunTTSService()
+    tts_service.AUDIO_DIR = work_dir
+    for size in AUDIO_SIZES:
+        data = os.urandom(size)
+        benchmarks.append((f'tts.save_audio[{size // 1024}KB]', lambda data=data: tts_service._save_audio(data, 'bench.wav', 'wav')))
+
+    return benchmarks
+
+
+def measure(fn: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    """
+    测量单次调用耗时：先自动确定循环次数，再重复多轮取统计值
+
+    :param fn: 被测函数
+    :param repeat: 重复轮数
+    :param min_time: 每轮的最短时间（秒）
+    :return: 每次调用的耗时统计（微秒）
+    """
+    timer = timeit.Timer(fn)
+    loops, elapsed = timer.autorange()
+    if elapsed < min_time:
+        loops = max(1, int(loops * min_time / max(elapsed, 1e-9)))
+    per_call = [total / loops * 1e6 for total in timer.repeat(repeat=repeat, number=loops)]
+    return {
+        'loops': loops,
+        'median_us': round(statistics.median(per_call), 3),
+        'mean_us': round(statistics.fmean(per_call), 3),
+        'min_us': round(min(per_call), 3),
+        'stdev_us': round(statistics.stdev(per_call), 3) if len(per_call) > 1 else 0.0
+    }
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, Any]], baseline_path: str, threshold: float) -> List[str]:
+    """
+    与基准结果比较中位数
+
+    :return: 变慢超过阈值的测试项
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['benchmarks']
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        change = (result['median_us'] - previous['median_us']) / previous['median_us'] * 100
+        result['baseline_median_us'] = previous['median_us']
+        result['change_pct'] = round(change, 1)
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='每轮对话热路径的微基准测试')
+    parser.add_argument('--filter', help='只运行名称包含该字符串的测试项')
+    parser.add_argument('--repeat', type=int, default=5, help='每项重复轮数')
+    parser.add_argument('--min-time', type=float, default=0.2, help='每轮的最短时间（秒）')
+    parser.add_argument('--baseline', help='用于对比的基准结果文件')
+    parser.add_argument('--threshold', type=float, default=15.0, help='判定回退的中位数变化百分比')
+    parser.add_argument('--label', default='run', help='结果文件名中的标签')
+    parser.add_argument('--output-dir', default=MICRO_RESULTS_DIR, help='结果保存目录')
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory(prefix='sakuratalk-micro-') as work_dir:
+        for name, fn in build_benchmarks(work_dir):
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = measure(fn, args.repeat, args.min_time)
+            print(f"{name:<45} {results[name]['median_us']:>12.2f} µs  ±{results[name]['stdev_us']:.2f}", flush=True)
+
+    regressions: Optional[List[str]] = None
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.threshold)
+        print(f'\n与基准对比（{args.baseline}）：')
+        for name, result in results.items():
+            if 'change_pct' in result:
+                flag = '  回退' if name in regressions else ''
+                print(f"{name:<45} {result['baseline_median_us']:>10.2f} → {result['median_us']:>10.2f} µs "
+                      f"({result['change_pct']:+.1f}%){flag}")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    file_path = os.path.join(args.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{args.label}.json")
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'label': args.label,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'benchmarks': results
+        }, f, ensure_ascii=False, indent=2)
+    print(f'\n结果已保存: {file_path}')
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
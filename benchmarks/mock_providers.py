@@ -0,0 +1,712 @@
+"""
+本地模拟的LLM/STT/TTS服务商接口，用于离线压测
+
+在同一端口上模拟以下协议：
+    DashScope  HTTP   POST /api/v1/services/aigc/text-generation/generation（支持SSE流式）
+    DashScope  WS     GET  /api-ws/v1/inference（sambert语音合成、paraformer语音识别）
+    OpenAI     HTTP   POST /v1/chat/completions（支持SSE流式）
+    Gemini     HTTP   POST /v1beta/models/{model}:generateContent、:streamGenerateContent
+    Ollama     HTTP   POST /api/chat、/api/generate（支持NDJSON流式），GET /api/ps、/api/tags
+
+用法：
+    python -m benchmarks.mock_providers --port 8765 --latency-ms 300 --chunk-delay-ms 20
+
+应用通过以下环境变量指向模拟服务（详见 provider_env）：
+    DASHSCOPE_HTTP_BASE_URL、DASHSCOPE_WEBSOCKET_BASE_URL、OPENAI_API_BASE、GEMINI_API_BASE、OLLAMA_API_BASE
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import uuid
+import wave
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# WebSocket握手使用的固定GUID（RFC 6455）
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+WS_TEXT, WS_BINARY, WS_CLOSE, WS_PING, WS_PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+
+# 模拟的对话回复（符合 PromptManager.CHAT_RESPONSE_SCHEMA）
+DEFAULT_CHAT_REPLY = {
+    'japanese': 'こんにちは！今日はいい天気ですね。',
+    'hiragana': 'こんにちは！きょうはいいてんきですね。',
+    'chinese': '你好！今天天气真好呢。',
+    'pronunciation_score': 85,
+    'next_suggestion': 'はい、散歩に行きたいです。',
+    'suggestion_hiragana': 'はい、さんぽにいきたいです。',
+    'suggestion_chinese': '是的，我想去散步。'
+}
+DEFAULT_TRANSCRIPT = 'こんにちは、元気ですか？'
+
+
+class MockSettings:
+    """
+    模拟服务的行为配置
+    """
+    def __init__(self, latency_ms: float = 200, jitter_ms: float = 0, chunk_delay_ms: float = 20,
+                 chunks: int = 8, error_rate: float = 0.0, reply: Optional[Dict[str, Any]] = None,
+                 transcript: str = DEFAULT_TRANSCRIPT, seconds_per_char: float = 0.12):
+        """
+        初始化模拟服务配置
+
+        :param latency_ms: 首字节延迟（毫秒），模拟模型排队与推理时间
+        :param jitter_ms: 延迟的随机抖动范围（毫秒）
+        :param chunk_delay_ms: 流式输出时相邻分块之间的间隔（毫秒）
+        :param chunks: 流式输出的分块数量
+        :param error_rate: 返回服务端错误的比例（0–1）
+        :param reply: LLM返回的对话内容
+        :param transcript: 语音识别返回的文本
+        :param seconds_per_char: 语音合成时每个字符对应的音频时长（秒）
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.chunk_delay_ms = chunk_delay_ms
+        self.chunks = max(1, chunks)
+        self.error_rate = error_rate
+        self.reply = reply or DEFAULT_CHAT_REPLY
+        self.transcript = transcript
+        self.seconds_per_char = seconds_per_char
+
+    def wait_first_byte(self) -> None:
+        """
+        模拟首字节延迟
+        """
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+    def wait_chunk(self) -> None:
+        """
+        模拟流式分块之间的间隔
+        """
+        if self.chunk_delay_ms > 0:
+            time.sleep(self.chunk_delay_ms / 1000.0)
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'latency_ms': self.latency_ms,
+            'jitter_ms': self.jitter_ms,
+            'chunk_delay_ms': self.chunk_delay_ms,
+            'chunks': self.chunks,
+            'error_rate': self.error_rate
+        }
+
+
+def split_text(text: str, parts: int) -> Iterator[str]:
+    """
+    将文本按字符数均分为若干段，用于模拟逐段输出
+
+    :param text: 文本
+    :param parts: 段数
+    :return: 文本片段
+    """
+    size = max(1, math.ceil(len(text) / parts))
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算token数量
+
+    :param text: 文本
+    :return: token数量
+    """
+    return max(1, len(text) // 2)
+
+
+def synthesize_wav(text: str, sample_rate: int = 16000, seconds_per_char: float = 0.12) -> bytes:
+    """
+    生成与文本长度成正比的正弦波WAV音频，代替真实的语音合成结果
+
+    :param text: 要“合成”的文本
+    :param sample_rate: 采样率
+    :param seconds_per_char: 每个字符对应的音频时长（秒）
+    :return: WAV文件内容
+    """
+    duration = min(10.0, max(0.3, len(text) * seconds_per_char))
+    frequency = 220 + int(hashlib.md5(text.encode('utf-8')).hexdigest()[:2], 16)
+    n_samples = int(sample_rate * duration)
+    samples = (int(8000 * math.sin(2 * math.pi * frequency * i / sample_rate)) for i in range(n_samples))
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(struct.pack(f'<{n_samples}h', *samples))
+    return buffer.getvalue()
+
+
+def _iter_strings(value: Any) -> Iterator[str]:
+    """
+    遍历请求体中的所有字符串（提示词可能位于messages、prompt或contents中）
+    """
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _iter_strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _iter_strings(item)
+
+
+def grammar_reply(prompt: str) -> Dict[str, Any]:
+    """
+    模拟语法纠错结果：原样返回句子（批量提示词中每行以 [编号] 开头）
+    """
+    batch = re.findall(r'^\[(\d+)\] (.*)$', prompt, re.MULTILINE)
+    if batch:
+        return {'results': [{'index': int(index), 'corrected_text': text, 'errors': []} for index, text in batch]}
+    lines = [line for line in prompt.strip().splitlines() if line.strip()]
+    text = lines[-1].split('：', 1)[-1] if lines else ''
+    return {'corrected_text': text, 'errors': []}
+
+
+def summary_reply(prompt: str) -> Dict[str, Any]:
+    """
+    模拟对话摘要结果：按对话轮数生成固定格式的摘要
+    """
+    turns = len(re.findall(r'^用户: ', prompt, re.MULTILINE))
+    return {'summary': f'学习者用日语进行了{turns}轮日常对话。'}
+
+
+def _unmask(data: bytes, mask: bytes) -> bytes:
+    """
+    对客户端发送的WebSocket帧去掩码
+    """
+    n = len(data)
+    if n == 0:
+        return data
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(key, 'big')).to_bytes(n, 'big')
+
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    """
+    模拟服务商接口的请求处理器
+    """
+    protocol_version = 'HTTP/1.1'
+    server_version = 'SakuraTalkMock/1.0'
+
+    GEMINI_PATH = re.compile(r'^/v1beta/models/(?P<model>[^:/]+):(?P<method>generateContent|streamGenerateContent)$')
+
+    @property
+    def settings(self) -> MockSettings:
+        return self.server.settings
+
+    def log_message(self, format, *args):
+        # 压测时每秒数百个请求，不输出访问日志
+        pass
+
+    # ---------- 通用工具 ----------
+
+    def _count(self, route: str) -> None:
+        with self.server.stats_lock:
+            self.server.stats[route] += 1
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        return json.loads(body) if body else {}
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type: str) -> None:
+        # 流式响应不带Content-Length，发送完毕后关闭连接
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+    def _write_stream(self, data: str) -> None:
+        self.wfile.write(data.encode('utf-8'))
+        self.wfile.flush()
+
+    def _reply_text(self, body: Dict[str, Any]) -> str:
+        prompt = '\n'.join(_iter_strings(body))
+        if '"corrected_text"' in prompt:
+            return json.dumps(grammar_reply(prompt), ensure_ascii=False)
+        if '"summary"' in prompt:
+            return json.dumps(summary_reply(prompt), ensure_ascii=False)
+        return json.dumps(self.settings.reply, ensure_ascii=False)
+
+    def _prompt_text(self, body: Dict[str, Any]) -> str:
+        return json.dumps(body, ensure_ascii=False)
+
+    # ---------- 路由 ----------
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path.startswith('/api-ws/') and self.headers.get('Upgrade', '').lower() == 'websocket':
+            self._handle_dashscope_websocket()
+        elif path == '/api/ps':
+            self._count('ollama_ps')
+            self._send_json({'models': [{'name': name, 'model': name} for name in self.server.ollama_models]})
+        elif path == '/api/tags':
+            self._send_json({'models': [{'name': name, 'model': name} for name in self.server.ollama_models]})
+        elif path == '/stats':
+            with self.server.stats_lock:
+                self._send_json({'requests': dict(self.server.stats), 'settings': self.settings.to_dict()})
+        elif path == '/health':
+            self._send_json({'status': 'ok'})
+        else:
+            self._send_json({'error': f'unknown path: {path}'}, 404)
+
+    def do_POST(self):
+        path = self.path.split('?', 1)[0]
+        body = self._read_json()
+        if self.settings.should_fail():
+            self._count('injected_error')
+            self.settings.wait_first_byte()
+            self._send_json({'code': 'InternalError', 'message': 'mock provider failure',
+                             'error': {'message': 'mock provider failure'}}, 500)
+            return
+
+        gemini_match = self.GEMINI_PATH.match(path)
+        if path.endswith('/services/aigc/text-generation/generation'):
+            self._handle_dashscope_generation(body)
+        elif path.endswith('/chat/completions'):
+            self._handle_openai_chat(body)
+        elif gemini_match:
+            self._handle_gemini(body, gemini_match.group('model'), gemini_match.group('method'))
+        elif path == '/api/chat':
+            self._handle_ollama(body, chat=True)
+        elif path == '/api/generate':
+            self._handle_ollama(body, chat=False)
+        else:
+            self._send_json({'error': f'unknown path: {path}'}, 404)
+
+    # ---------- DashScope HTTP ----------
+
+    def _handle_dashscope_generation(self, body: Dict[str, Any]) -> None:
+        self._count('dashscope_generation')
+        text = self._reply_text(body)
+        usage = {
+            'input_tokens': estimate_tokens(self._prompt_text(body)),
+            'output_tokens': estimate_tokens(text)
+        }
+        usage['total_tokens'] = usage['input_tokens'] + usage['output_tokens']
+        request_id = uuid.uuid4().hex
+        streaming = (self.headers.get('X-DashScope-SSE', '').lower() == 'enable'
+                     or 'text/event-stream' in self.headers.get('Accept', ''))
+        incremental = body.get('parameters', {}).get('incremental_output', False)
+
+        self.settings.wait_first_byte()
+        if not streaming:
+            self._send_json({
+                'output': {'choices': [{'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': text}}]},
+                'usage': usage,
+                'request_id': request_id
+            })
+            return
+
+        self._start_stream('text/event-stream;charset=UTF-8')
+        content = ''
+        pieces = list(split_text(text, self.settings.chunks))
+        for index, piece in enumerate(pieces, 1):
+            content += piece
+            finished = index == len(pieces)
+            message = {
+                'output': {'choices': [{
+                    'finish_reason': 'stop' if finished else 'null',
+                    'message': {'role': 'assistant', 'content': piece if incremental else content}
+                }]},
+                'usage': usage,
+                'request_id': request_id
+            }
+            self._write_stream(f"id:{index}\nevent:result\n:HTTP_STATUS/200\n"
+                               f"data:{json.dumps(message, ensure_ascii=False)}\n\n")
+            if not finished:
+                self.settings.wait_chunk()
+
+    # ---------- OpenAI ----------
+
+    def _handle_openai_chat(self, body: Dict[str, Any]) -> None:
+        self._count('openai_chat')
+        text = self._reply_text(body)
+        model = body.get('model', 'mock')
+        created = int(time.time())
+        completion_id = f'chatcmpl-{uuid.uuid4().hex[:24]}'
+        usage = {
+            'prompt_tokens': estimate_tokens(self._prompt_text(body)),
+            'completion_tokens': estimate_tokens(text)
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+
+        self.settings.wait_first_byte()
+        if not body.get('stream'):
+            self._send_json({
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                'usage': usage
+            })
+            return
+
+        self._start_stream('text/event-stream')
+        pieces = list(split_text(text, self.settings.chunks))
+        for index, piece in enumerate(pieces):
+            delta = {'content': piece}
+            if index == 0:
+                delta['role'] = 'assistant'
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]
+            }
+            self._write_stream(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+            self.settings.wait_chunk()
+        final_chunk = {
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': created,
+            'model': model,
+            'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]
+        }
+        self._write_stream(f"data: {json.dumps(final_chunk)}\n\ndata: [DONE]\n\n")
+
+    # ---------- Gemini ----------
+
+    def _handle_gemini(self, body: Dict[str, Any], model: str, method: str) -> None:
+        self._count('gemini_generate')
+        text = self._reply_text(body)
+        usage = {
+            'promptTokenCount': estimate_tokens(self._prompt_text(body)),
+            'candidatesTokenCount': estimate_tokens(text)
+        }
+        usage['totalTokenCount'] = usage['promptTokenCount'] + usage['candidatesTokenCount']
+
+        def candidate(part_text: str, finished: bool) -> Dict[str, Any]:
+            entry = {
+                'candidates': [{
+                    'content': {'parts': [{'text': part_text}], 'role': 'model'},
+                    'index': 0
+                }],
+                'usageMetadata': usage,
+                'modelVersion': model
+            }
+            if finished:
+                entry['candidates'][0]['finishReason'] = 'STOP'
+            return entry
+
+        self.settings.wait_first_byte()
+        if method == 'generateContent':
+            self._send_json(candidate(text, True))
+            return
+
+        # streamGenerateContent：alt=sse时为SSE，否则为逐步输出的JSON数组
+        pieces = list(split_text(text, self.settings.chunks))
+        use_sse = 'alt=sse' in self.path
+        self._start_stream('text/event-stream' if use_sse else 'application/json')
+        if not use_sse:
+            self._write_stream('[')
+        for index, piece in enumerate(pieces):
+            finished = index == len(pieces) - 1
+            data = json.dumps(candidate(piece, finished), ensure_ascii=False)
+            if use_sse:
+                self._write_stream(f"data: {data}\r\n\r\n")
+            else:
+                self._write_stream(('' if index == 0 else ',\r\n') + data)
+            if not finished:
+                self.settings.wait_chunk()
+        if not use_sse:
+            self._write_stream(']')
+
+    # ---------- Ollama ----------
+
+    def _handle_ollama(self, body: Dict[str, Any], chat: bool) -> None:
+        self._count('ollama_chat' if chat else 'ollama_generate')
+        model = body.get('model', 'mock')
+        with self.server.stats_lock:
+            self.server.ollama_models.add(model)
+
+        # 不带prompt/messages的请求用于预加载模型，直接返回
+        has_input = body.get('messages') if chat else body.get('prompt')
+        text = self._reply_text(body) if has_input else ''
+        final = {
+            'model': model,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'done': True,
+            'done_reason': 'stop' if has_input else 'load',
+            'total_duration': int(self.settings.latency_ms * 1e6),
+            'prompt_eval_count': estimate_tokens(self._prompt_text(body)) if has_input else 0,
+            'eval_count': estimate_tokens(text) if has_input else 0
+        }
+
+        def content(piece: str) -> Dict[str, Any]:
+            return {'message': {'role': 'assistant', 'content': piece}} if chat else {'response': piece}
+
+        if has_input:
+            self.settings.wait_first_byte()
+        if not body.get('stream', True) or not has_input:
+            self._send_json({**final, **content(text)})
+            return
+
+        self._start_stream('application/x-ndjson')
+        for piece in split_text(text, self.settings.chunks):
+            chunk = {'model': model, 'created_at': final['created_at'], 'done': False, **content(piece)}
+            self._write_stream(json.dumps(chunk, ensure_ascii=False) + '\n')
+            self.settings.wait_chunk()
+        self._write_stream(json.dumps({**final, **content('')}, ensure_ascii=False) + '\n')
+
+    # ---------- DashScope WebSocket（语音合成 / 语音识别） ----------
+
+    def _ws_recv_frame(self) -> Tuple[int, bytes]:
+        """
+        读取一个完整的WebSocket消息（合并分片），自动回应ping
+
+        :return: (操作码, 数据)
+        """
+        message_opcode, chunks = None, []
+        while True:
+            header = self.rfile.read(2)
+            if len(header) < 2:
+                return WS_CLOSE, b''
+            fin, opcode = header[0] & 0x80, header[0] & 0x0F
+            masked, length = header[1] & 0x80, header[1] & 0x7F
+            if length == 126:
+                length = struct.unpack('>H', self.rfile.read(2))[0]
+            elif length == 127:
+                length = struct.unpack('>Q', self.rfile.read(8))[0]
+            mask = self.rfile.read(4) if masked else None
+            data = self.rfile.read(length)
+            if mask:
+                data = _unmask(data, mask)
+
+            if opcode == WS_PING:
+                self._ws_send(WS_PONG, data)
+                continue
+            if opcode == WS_PONG:
+                continue
+            if opcode == WS_CLOSE:
+                return WS_CLOSE, data
+            if opcode != 0:
+                message_opcode = opcode
+            chunks.append(data)
+            if fin:
+                return message_opcode, b''.join(chunks)
+
+    def _ws_send(self, opcode: int, data: bytes) -> None:
+        length = len(data)
+        if length < 126:
+            header = struct.pack('>BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('>BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('>BBQ', 0x80 | opcode, 127, length)
+        self.wfile.write(header + data)
+        self.wfile.flush()
+
+    def _ws_send_event(self, event: str, task_id: str, payload: Optional[Dict[str, Any]] = None, **header) -> None:
+        message = {'header': {'event': event, 'task_id': task_id, **header}, 'payload': payload or {}}
+        self._ws_send(WS_TEXT, json.dumps(message, ensure_ascii=False).encode('utf-8'))
+
+    def _handle_dashscope_websocket(self) -> None:
+        key = self.headers.get('Sec-WebSocket-Key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode('ascii')).digest()).decode('ascii')
+        self.send_response(101, 'Switching Protocols')
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept)
+        self.end_headers()
+        self.close_connection = True
+
+        opcode, data = self._ws_recv_frame()
+        if opcode != WS_TEXT:
+            return
+        message = json.loads(data)
+        header, payload = message.get('header', {}), message.get('payload', {})
+        task_id = header.get('task_id') or uuid.uuid4().hex
+
+        if self.settings.should_fail():
+            self._count('injected_error')
+            self.settings.wait_first_byte()
+            self._ws_send_event('task-failed', task_id, error_code='InternalError', error_message='mock provider failure')
+        elif header.get('streaming') == 'duplex':
+            self._handle_recognition(task_id, payload)
+        else:
+            self._handle_synthesis(task_id, payload)
+        self._ws_close()
+
+    def _handle_synthesis(self, task_id: str, payload: Dict[str, Any]) -> None:
+        self._count('dashscope_tts')
+        text = payload.get('input', {}).get('text', '')
+        sample_rate = int(payload.get('parameters', {}).get('sample_rate') or 16000)
+        self._ws_send_event('task-started', task_id)
+
+        audio = synthesize_wav(text, sample_rate, self.settings.seconds_per_char)
+        self.settings.wait_first_byte()
+        chunk_size = max(4096, math.ceil(len(audio) / self.settings.chunks))
+        for start in range(0, len(audio), chunk_size):
+            if start:
+                self.settings.wait_chunk()
+            self._ws_send(WS_BINARY, audio[start:start + chunk_size])
+        self._ws_send_event('task-finished', task_id)
+
+    def _handle_recognition(self, task_id: str, payload: Dict[str, Any]) -> None:
+        self._count('dashscope_asr')
+        sample_rate = int(payload.get('parameters', {}).get('sample_rate') or 16000)
+        self._ws_send_event('task-started', task_id)
+
+        # 接收音频直到客户端发送finish-task
+        audio_bytes = 0
+        while True:
+            opcode, data = self._ws_recv_frame()
+            if opcode == WS_BINARY:
+                audio_bytes += len(data)
+            elif opcode == WS_TEXT:
+                if json.loads(data).get('header', {}).get('action') == 'finish-task':
+                    break
+            else:
+                return
+
+        end_time = int(audio_bytes / (sample_rate * 2) * 1000)
+        transcript = self.settings.transcript
+        self.settings.wait_first_byte()
+        partial = ''
+        pieces = list(split_text(transcript, self.settings.chunks))
+        for index, piece in enumerate(pieces, 1):
+            partial += piece
+            finished = index == len(pieces)
+            sentence = {'begin_time': 0, 'end_time': end_time if finished else None,
+                        'text': partial, 'sentence_end': finished}
+            usage = {'duration': max(1, end_time // 1000)} if finished else None
+            self._ws_send_event('result-generated', task_id, {'output': {'sentence': sentence}, 'usage': usage})
+            if not finished:
+                self.settings.wait_chunk()
+        self._ws_send_event('task-finished', task_id)
+
+    def _ws_close(self) -> None:
+        # 等待客户端关闭连接，再回应关闭帧
+        try:
+            while True:
+                opcode, _ = self._ws_recv_frame()
+                if opcode == WS_CLOSE:
+                    break
+            self._ws_send(WS_CLOSE, struct.pack('>H', 1000))
+        except OSError:
+            pass
+
+
+class MockProviderServer(ThreadingHTTPServer):
+    """
+    模拟服务商的HTTP/WebSocket服务器
+    """
+    daemon_threads = True
+    request_queue_size = 512
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, settings: Optional[MockSettings] = None):
+        """
+        初始化模拟服务器
+
+        :param host: 监听地址
+        :param port: 监听端口，0表示自动分配
+        :param settings: 模拟服务配置
+        """
+        super().__init__((host, port), MockProviderHandler)
+        self.settings = settings or MockSettings()
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+        self.ollama_models = set()
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'MockProviderServer':
+        """
+        在后台线程中启动服务器
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name='mock-providers', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def provider_env(base_url: str) -> Dict[str, str]:
+    """
+    生成将应用指向模拟服务所需的环境变量
+
+    :param base_url: 模拟服务地址，例如 http://127.0.0.1:8765
+    :return: 环境变量
+    """
+    ws_url = base_url.replace('http://', 'ws://', 1)
+    return {
+        'DASHSCOPE_API_KEY': 'mock-key',
+        'DASHSCOPE_HTTP_BASE_URL': f'{base_url}/api/v1',
+        'DASHSCOPE_WEBSOCKET_BASE_URL': f'{ws_url}/api-ws/v1/inference',
+        'OPENAI_API_KEY': 'mock-key',
+        'OPENAI_API_BASE': f'{base_url}/v1',
+        'GEMINI_API_KEY': 'mock-key',
+        'GEMINI_API_BASE': base_url,
+        'OLLAMA_API_BASE': f'{base_url}/api'
+    }
+
+
+def add_settings_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    添加模拟服务配置的命令行参数（与压测脚本共用）
+    """
+    parser.add_argument('--latency-ms', type=float, default=200, help='模拟的首字节延迟（毫秒）')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='延迟的随机抖动范围（毫秒）')
+    parser.add_argument('--chunk-delay-ms', type=float, default=20, help='流式分块间隔（毫秒）')
+    parser.add_argument('--chunks', type=int, default=8, help='流式输出的分块数量')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='注入服务端错误的比例（0–1）')
+
+
+def settings_from_args(args) -> MockSettings:
+    return MockSettings(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, chunk_delay_ms=args.chunk_delay_ms,
+                        chunks=args.chunks, error_rate=args.error_rate)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='本地模拟的LLM/STT/TTS服务商接口')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_settings_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = MockProviderServer(args.host, args.port, settings_from_args(args))
+    print(f'模拟服务已启动: {server.base_url}')
+    for key, value in provider_env(server.base_url).items():
+        print(f'  export {key}={value}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
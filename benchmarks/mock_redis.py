@@ -0,0 +1,145 @@
+"""
+本地的Redis替身服务：以RESP协议提供 sakuratalk.shared_state.MemoryStore 实现的命令子集，
+用于在没有Redis的环境中测试多进程共享状态（STATE_BACKEND=redis）
+
+用法：
+    python -m benchmarks.mock_redis --port 6380
+    STATE_BACKEND=redis STATE_REDIS_URL=redis://127.0.0.1:6380/0 python run.py
+"""
+import argparse
+import threading
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from typing import Any, List, Optional
+
+from sakuratalk.exceptions import StateError
+from sakuratalk.shared_state import MemoryStore
+
+
+def encode_reply(value: Any) -> bytes:
+    """
+    将命令结果编码为RESP回复
+    """
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, StateError):
+        return b'-%s\r\n' % str(value).encode('utf-8')
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(encode_reply(item) for item in value)
+    data = str(value).encode('utf-8')
+    return b'$%d\r\n%s\r\n' % (len(data), data)
+
+
+class MockRedisHandler(StreamRequestHandler):
+    """
+    一个客户端连接：逐条读取命令，MULTI之后的命令排队到EXEC时作为事务执行
+    """
+    def _read_command(self) -> Optional[List[str]]:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            # 手工调试时（例如 telnet）发送的内联命令
+            return line.decode('utf-8').split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode('utf-8'))
+        return args
+
+    def handle(self) -> None:
+        store: MemoryStore = self.server.store
+        queued: Optional[List[List[str]]] = None
+        while True:
+            try:
+                command = self._read_command()
+            except (OSError, ValueError):
+                return
+            if not command:
+                return
+            name = command[0].upper()
+            if name in ('AUTH', 'SELECT'):
+                reply = b'+OK\r\n'
+            elif name == 'MULTI':
+                queued = []
+                reply = b'+OK\r\n'
+            elif name == 'EXEC' and queued is not None:
+                try:
+                    reply = encode_reply(store.pipeline(queued, transaction=True))
+                except StateError as e:
+                    reply = encode_reply(e)
+                queued = None
+            elif name == 'DISCARD':
+                queued = None
+                reply = b'+OK\r\n'
+            elif queued is not None:
+                queued.append(command)
+                reply = b'+QUEUED\r\n'
+            else:
+                try:
+                    reply = encode_reply(store.execute(*command))
+                except StateError as e:
+                    reply = encode_reply(e)
+            with self.server.stats_lock:
+                self.server.commands += 1
+            self.wfile.write(reply)
+
+
+class MockRedisServer(ThreadingTCPServer):
+    """
+    Redis替身服务器
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        """
+        :param host: 监听地址
+        :param port: 监听端口，0表示自动分配
+        """
+        super().__init__((host, port), MockRedisHandler)
+        self.store = MemoryStore(prefix='')
+        self.commands = 0
+        self.stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'redis://{host}:{port}/0'
+
+    def start(self) -> 'MockRedisServer':
+        """
+        在后台线程中启动服务器
+        """
+        self._thread = threading.Thread(target=self.serve_forever, name='mock-redis', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='本地的Redis替身服务（RESP协议）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6380)
+    args = parser.parse_args(argv)
+
+    server = MockRedisServer(args.host, args.port)
+    print(f'Redis替身服务已启动: {server.url}')
+    print(f'  export STATE_BACKEND=redis STATE_REDIS_URL={server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+冷启动耗时测试：在全新的Python进程中导入应用并创建Flask应用，测量启动耗时
+
+用法（在项目根目录执行）：
+    python -m benchmarks.startup --runs 5
+    LLM_PROVIDER=ollama python -m benchmarks.startup --warm-up
+
+--warm-up 时同时测量服务创建与预热的耗时（各服务商的导入与创建耗时见 /api/startup）。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.load_test import PROJECT_ROOT
+
+# 在子进程中执行的测量代码
+_PROBE = """
+import json, time
+start = time.perf_counter()
+from sakuratalk import app as app_module
+imported = time.perf_counter()
+app_module.create_app()
+created = time.perf_counter()
+result = {'import_seconds': imported - start, 'create_app_seconds': created - imported}
+if {warm_up}:
+    app_module.warm_up_services()
+    result['warm_up_seconds'] = time.perf_counter() - created
+    result['timings'] = app_module.get_startup_report()
+print(json.dumps(result))
+"""
+
+
+def measure_once(warm_up: bool) -> dict:
+    env = {**os.environ, 'SERVICE_WARM_UP': 'false', 'OLLAMA_PRELOAD': 'false', 'LOG_LEVEL': 'ERROR'}
+    output = subprocess.check_output([sys.executable, '-c', _PROBE.replace('{warm_up}', str(warm_up))],
+                                     cwd=PROJECT_ROOT, env=env, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='应用冷启动耗时测试')
+    parser.add_argument('--runs', type=int, default=5, help='启动次数')
+    parser.add_argument('--warm-up', action='store_true', help='同时测量服务创建与预热耗时')
+    args = parser.parse_args(argv)
+
+    runs = [measure_once(args.warm_up) for _ in range(args.runs)]
+    for key in ('import_seconds', 'create_app_seconds', 'warm_up_seconds'):
+        values = [run[key] for run in runs if key in run]
+        if values:
+            print(f'{key:<20} 中位数 {statistics.median(values) * 1000:8.1f} ms  '
+                  f'最小 {min(values) * 1000:8.1f} ms  最大 {max(values) * 1000:8.1f} ms')
+    if args.warm_up:
+        print('\n服务导入与创建耗时（最后一次）：')
+        for entry in runs[-1]['timings']:
+            print(f"  {entry['kind']:<4} {entry['provider']:<10} {entry['stage']:<10} {entry['seconds'] * 1000:8.1f} ms  {entry['target']}")
+
+
+if __name__ == '__main__':
+    main()
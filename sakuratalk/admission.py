@@ -0,0 +1,391 @@
+"""
+准入控制：在调用服务商接口之前限制请求
+
+- 按会话和IP的令牌桶限流，超出时立即返回429
+- 按服务商限制同时进行的调用数（同一服务商的LLM、语音识别和语音合成共享），
+  排队的请求按客户端轮流获得调用名额，避免单个客户端占满服务商的配额
+- 每个请求有排队截止时间，排队已满或等待超过截止时间时立即返回503，而不是等到上游超时
+
+配置了共享状态存储时，限流计数保存在共享存储中，多个工作进程共用同一份限额；并发名额仍按进程计算。
+"""
+import contextvars
+import functools
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+from .config import Config
+from .exceptions import AdmissionRejected
+from .metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED, timed
+from .shared_state import StateStore
+
+# 跟踪限流状态的最大客户端数
+MAX_CLIENTS = 10000
+
+# 后台工作（后台任务、推测执行）使用的客户端标识
+BACKGROUND_CLIENT = 'background'
+
+# 当前请求的（客户端标识, 排队截止时间）
+_current_request: contextvars.ContextVar[Optional[Tuple[str, float]]] = contextvars.ContextVar(
+    'admission_request', default=None)
+
+
+class TokenBucket:
+    """
+    令牌桶：以固定速率补充令牌，最多积累burst个
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """
+        取出一个令牌
+
+        :param now: 当前时间（time.monotonic）
+        :return: 0表示取到令牌，否则为需要等待的秒数
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    按客户端（会话或IP）的令牌桶限流器，只保留最近活跃的客户端
+    """
+    def __init__(self, rate: float, burst: int, max_clients: int = MAX_CLIENTS):
+        """
+        初始化限流器
+
+        :param rate: 每秒补充的请求数，0表示不限流
+        :param burst: 允许的突发请求数
+        :param max_clients: 跟踪的最大客户端数
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self._buckets: 'OrderedDict[str, TokenBucket]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        """
+        为客户端占用一次请求
+
+        :param key: 客户端标识
+        :return: 0表示允许，否则为建议的重试等待秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.take(now)
+
+
+class SharedRateLimiter:
+    """
+    计数保存在共享状态存储中的限流器（所有进程共用）
+
+    共享存储不能原子地执行令牌桶的读-改-写，因此使用固定窗口计数：每个窗口长burst/rate秒，最多允许burst个请求，
+    长期速率与令牌桶相同；计数和过期时间通过管道一次往返更新。
+    """
+    def __init__(self, store: StateStore, name: str, rate: float, burst: int):
+        """
+        初始化共享的限流器
+
+        :param store: 共享状态存储
+        :param name: 限流器名称（键的命名空间）
+        :param rate: 每秒补充的请求数，0表示不限流
+        :param burst: 每个窗口允许的请求数
+        """
+        self.store = store
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.window = self.burst / rate if rate > 0 else 0
+
+    def acquire(self, key: str) -> float:
+        """
+        为客户端占用一次请求
+
+        :param key: 客户端标识
+        :return: 0表示允许，否则为到下一个窗口的秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.time()
+        window_index = int(now // self.window)
+        counter = self.store.key('ratelimit', self.name, key, window_index)
+        count, _ = self.store.pipeline([
+            ('INCR', counter),
+            ('EXPIRE', counter, max(1, int(self.window * 2)))
+        ])
+        if count <= self.burst:
+            return 0.0
+        return (window_index + 1) * self.window - now
+
+
+class _Waiter:
+    __slots__ = ('client', 'event', 'granted')
+
+    def __init__(self, client: str):
+        self.client = client
+        self.event = threading.Event()
+        self.granted = False
+
+
+class ProviderGate:
+    """
+    服务商的并发闸门：调用名额用完时按客户端分组排队，名额释放后在排队的客户端之间轮流分配
+    """
+    def __init__(self, name: str, limit: int, max_queue: int):
+        """
+        初始化并发闸门
+
+        :param name: 服务商名称（用于指标）
+        :param limit: 同时进行的调用数，0表示不限制
+        :param max_queue: 最大排队数
+        """
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+        # 客户端 -> 该客户端排队中的请求；顺序即轮转顺序
+        self._waiting: 'OrderedDict[str, deque]' = OrderedDict()
+
+    def _update_gauges(self) -> None:
+        ADMISSION_IN_FLIGHT.labels(self.name).set(self._active)
+        ADMISSION_QUEUE_DEPTH.labels(self.name).set(self._queued)
+
+    def acquire(self, client: str, deadline: Optional[float] = None, wait: bool = True) -> None:
+        """
+        获取一个调用名额
+
+        :param client: 客户端标识，排队时按客户端轮流分配名额
+        :param deadline: 排队截止时间（time.monotonic），None表示一直等待
+        :param wait: 没有空闲名额时是否排队
+        :raises AdmissionRejected: 不排队且没有空闲名额、排队已满或超过截止时间
+        """
+        if self.limit <= 0:
+            return
+        with self._lock:
+            if self._active < self.limit and not self._queued:
+                self._active += 1
+                self._update_gauges()
+                return
+            if not wait:
+                raise _reject('busy', f'{self.name} 服务繁忙')
+            if self._queued >= self.max_queue:
+                raise _reject('queue_full', f'{self.name} 服务繁忙，请稍后重试')
+            timeout = None if deadline is None else deadline - time.monotonic()
+            if timeout is not None and timeout <= 0:
+                raise _reject('deadline', f'{self.name} 服务排队超时，请稍后重试')
+            waiter = _Waiter(client)
+            self._waiting.setdefault(client, deque()).append(waiter)
+            self._queued += 1
+            self._update_gauges()
+
+        with timed('admission_wait', self.name):
+            waiter.event.wait(timeout)
+        with self._lock:
+            if waiter.granted:
+                return
+            # 超过截止时间仍未分到名额，退出排队
+            queue = self._waiting.get(client)
+            queue.remove(waiter)
+            if not queue:
+                del self._waiting[client]
+            self._queued -= 1
+            self._update_gauges()
+        raise _reject('deadline', f'{self.name} 服务排队超时，请稍后重试')
+
+    def release(self) -> None:
+        """
+        释放调用名额：有请求在排队时直接交给轮到的客户端
+        """
+        if self.limit <= 0:
+            return
+        with self._lock:
+            if self._waiting:
+                client, queue = next(iter(self._waiting.items()))
+                waiter = queue.popleft()
+                if queue:
+                    # 该客户端还有请求在排队，排到其他客户端之后
+                    self._waiting.move_to_end(client)
+                else:
+                    del self._waiting[client]
+                self._queued -= 1
+                waiter.granted = True
+                waiter.event.set()
+            else:
+                self._active -= 1
+            self._update_gauges()
+
+    def snapshot(self) -> Dict[str, int]:
+        """
+        当前的调用数和排队数
+        """
+        with self._lock:
+            return {'limit': self.limit, 'in_flight': self._active, 'queued': self._queued,
+                    'queued_clients': len(self._waiting)}
+
+
+def _reject(reason: str, message: str, status_code: int = 503, retry_after: float = 1.0) -> AdmissionRejected:
+    ADMISSION_REJECTED.labels(reason).inc()
+    return AdmissionRejected(message, status_code, retry_after)
+
+
+class AdmissionController:
+    """
+    准入控制器：请求开始时按会话和IP限流，调用服务商接口时获取该服务商的调用名额
+    """
+    def __init__(self, enabled: Optional[bool] = None, session_rate: Optional[float] = None,
+                 session_burst: Optional[int] = None, ip_rate: Optional[float] = None,
+                 ip_burst: Optional[int] = None, provider_limits: Optional[Dict[str, int]] = None,
+                 default_limit: Optional[int] = None, max_queue: Optional[int] = None,
+                 queue_timeout: Optional[float] = None, store: Optional[StateStore] = None):
+        """
+        初始化准入控制器，缺省参数使用配置值
+
+        :param enabled: 是否启用
+        :param session_rate: 每个会话每秒补充的请求数
+        :param session_burst: 每个会话允许的突发请求数
+        :param ip_rate: 每个IP每秒补充的请求数
+        :param ip_burst: 每个IP允许的突发请求数
+        :param provider_limits: 各服务商同时进行的调用数
+        :param default_limit: 未单独配置的服务商同时进行的调用数
+        :param max_queue: 每个服务商的最大排队数
+        :param queue_timeout: 每个请求排队的最长时间（秒）
+        :param store: 共享状态存储，提供时限流计数在多个进程之间共享
+        """
+        self.enabled = Config.ADMISSION_ENABLED if enabled is None else enabled
+        session_rate = Config.RATE_LIMIT_SESSION_RATE if session_rate is None else session_rate
+        session_burst = session_burst or Config.RATE_LIMIT_SESSION_BURST
+        ip_rate = Config.RATE_LIMIT_IP_RATE if ip_rate is None else ip_rate
+        ip_burst = ip_burst or Config.RATE_LIMIT_IP_BURST
+        if store is not None:
+            self.sessions = SharedRateLimiter(store, 'session', session_rate, session_burst)
+            self.ips = SharedRateLimiter(store, 'ip', ip_rate, ip_burst)
+        else:
+            self.sessions = RateLimiter(session_rate, session_burst)
+            self.ips = RateLimiter(ip_rate, ip_burst)
+        self.provider_limits = Config.PROVIDER_CONCURRENCY_LIMITS if provider_limits is None else provider_limits
+        self.default_limit = Config.PROVIDER_CONCURRENCY if default_limit is None else default_limit
+        self.max_queue = Config.ADMISSION_MAX_QUEUE if max_queue is None else max_queue
+        self.queue_timeout = queue_timeout or Config.ADMISSION_QUEUE_TIMEOUT
+        self._gates: Dict[str, ProviderGate] = {}
+        self._lock = threading.Lock()
+
+    def gate(self, provider: str) -> ProviderGate:
+        """
+        获取服务商的并发闸门（首次使用时创建）
+        """
+        gate = self._gates.get(provider)
+        if gate is None:
+            with self._lock:
+                gate = self._gates.get(provider)
+                if gate is None:
+                    limit = self.provider_limits.get(provider, self.default_limit)
+                    gate = self._gates[provider] = ProviderGate(provider, limit, self.max_queue)
+        return gate
+
+    def begin_request(self, session_id: Optional[str], ip: str) -> None:
+        """
+        请求开始时检查会话和IP的限流，并记录本请求的客户端标识和排队截止时间
+
+        :param session_id: 会话ID，未提供时按IP区分客户端
+        :param ip: 客户端IP
+        :raises AdmissionRejected: 超出限流（429）
+        """
+        if not self.enabled:
+            return
+        retry_after = self.ips.acquire(ip)
+        if not retry_after and session_id:
+            retry_after = self.sessions.acquire(session_id)
+        if retry_after:
+            raise _reject('rate_limited', '请求过于频繁，请稍后重试', 429, retry_after)
+        client = f'session:{session_id}' if session_id else f'ip:{ip}'
+        _current_request.set((client, time.monotonic() + self.queue_timeout))
+
+    def end_request(self) -> None:
+        """
+        请求结束时清除本请求的准入信息（线程会被后续请求复用）
+        """
+        _current_request.set(None)
+
+    def ensure_capacity(self, *providers: str) -> None:
+        """
+        快速检查服务商是否还能接受排队（用于流式响应开始之前）
+
+        :raises AdmissionRejected: 任一服务商的排队已满（503）
+        """
+        if not self.enabled:
+            return
+        for provider in providers:
+            snapshot = self.gate(provider).snapshot()
+            if snapshot['limit'] > 0 and snapshot['queued'] >= self.max_queue:
+                raise _reject('queue_full', f'{provider} 服务繁忙，请稍后重试')
+
+    @contextmanager
+    def slot(self, provider: str, wait: bool = True):
+        """
+        在服务商的调用名额内执行代码块
+
+        请求中使用本请求的客户端标识和截止时间排队；后台工作（没有请求信息）按后台客户端排队且不设截止时间。
+
+        :param provider: 服务商名称
+        :param wait: 没有空闲名额时是否排队，False用于可以放弃的工作（例如推测执行）
+        :raises AdmissionRejected: 没有分到名额（503）
+        """
+        if not self.enabled:
+            yield
+            return
+        client, deadline = _current_request.get() or (BACKGROUND_CLIENT, None)
+        gate = self.gate(provider)
+        gate.acquire(client, deadline, wait)
+        try:
+            yield
+        finally:
+            gate.release()
+
+    def bind(self, fn: Callable) -> Callable:
+        """
+        绑定当前请求的准入信息，使函数在其他线程中执行时仍按本请求排队
+
+        :param fn: 要在其他线程中执行的函数
+        :return: 包装后的函数
+        """
+        captured = _current_request.get()
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _current_request.set(captured)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_request.reset(token)
+        return wrapper
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """
+        各服务商当前的调用数和排队数
+        """
+        return {provider: gate.snapshot() for provider, gate in list(self._gates.items())}
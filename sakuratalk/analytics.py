@@ -0,0 +1,409 @@
+"""
+学习进度统计：每轮对话的输入、回复、评分、各阶段耗时和服务商异步写入按天分区的SQLite文件，
+并提供按学习者、按学习小组（cohort）的汇总查询
+
+对话请求只把记录放入内存队列（队列已满时丢弃记录），由后台线程批量写入，不会阻塞对话。
+每天一个数据库文件，查询只打开时间范围内的分区，过期的分区整个文件删除。
+"""
+import csv
+import io
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .config import Config
+from .metrics import ANALYTICS_EVENTS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# 记录的字段（顺序即表的列顺序）
+COLUMNS = (
+    'ts', 'learner', 'cohort', 'session', 'channel',
+    'user_input', 'reply', 'suggestion',
+    'pronunciation_score', 'user_pronunciation_score', 'weak_morae',
+    'provider', 'model', 'stt_ms', 'llm_ms', 'tts_ms', 'total_ms', 'error_stage'
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    ts REAL NOT NULL,
+    learner TEXT NOT NULL,
+    cohort TEXT NOT NULL DEFAULT '',
+    session TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    user_input TEXT NOT NULL DEFAULT '',
+    reply TEXT NOT NULL DEFAULT '',
+    suggestion TEXT NOT NULL DEFAULT '',
+    pronunciation_score INTEGER,
+    user_pronunciation_score INTEGER,
+    weak_morae TEXT NOT NULL DEFAULT '',
+    provider TEXT NOT NULL DEFAULT '',
+    model TEXT NOT NULL DEFAULT '',
+    stt_ms REAL,
+    llm_ms REAL,
+    tts_ms REAL,
+    total_ms REAL,
+    error_stage TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS turns_learner ON turns (learner);
+CREATE INDEX IF NOT EXISTS turns_cohort ON turns (cohort, learner);
+"""
+
+# 学习者输入和模型回复的原文，导出时默认不包含
+RAW_TEXT_COLUMNS = ('user_input', 'reply')
+
+# 缺省为空字符串的文本字段
+_TEXT_COLUMNS = frozenset(('learner', 'cohort', 'session', 'channel', 'user_input', 'reply', 'suggestion',
+                           'provider', 'model', 'error_stage'))
+
+_INSERT = f"INSERT INTO turns ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+_PARTITION_PATTERN = re.compile(r'^turns-(\d{4}-\d{2}-\d{2})\.sqlite3$')
+
+# 比较用户输入与建议句子时忽略的标点和空白
+_PHRASE_IGNORED = re.compile(r'[\s、。！？!?,.「」『』・…~〜ー]+')
+
+# 汇总中列出的薄弱拍数量
+TOP_WEAK_MORAE = 10
+
+# 汇总的耗时字段
+LATENCY_FIELDS = ('stt_ms', 'llm_ms', 'tts_ms', 'total_ms')
+
+
+def _normalize_phrase(text: str) -> str:
+    return _PHRASE_IGNORED.sub('', text or '')
+
+
+def _row(turn: Dict[str, Any]) -> Tuple[Any, ...]:
+    values = []
+    for column in COLUMNS:
+        value = turn.get(column)
+        if column == 'weak_morae':
+            value = json.dumps(value or [], ensure_ascii=False)
+        elif value is None and column in _TEXT_COLUMNS:
+            value = ''
+        values.append(value)
+    return tuple(values)
+
+
+class AnalyticsSink:
+    """
+    学习进度统计的异步写入和汇总查询
+    """
+    def __init__(self, data_dir: Optional[str] = None, batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None, queue_size: Optional[int] = None):
+        """
+        初始化统计存储，缺省参数使用配置值
+
+        :param data_dir: 分区文件所在目录
+        :param batch_size: 每次写入的最大记录数
+        :param flush_interval: 记录在内存中等待批量写入的最长时间（秒）
+        :param queue_size: 内存队列的容量，队列已满时丢弃新记录
+        """
+        self.data_dir = data_dir or Config.ANALYTICS_DIR
+        self.batch_size = batch_size or Config.ANALYTICS_BATCH_SIZE
+        self.flush_interval = Config.ANALYTICS_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self._queue: 'queue.Queue[Dict[str, Any]]' = queue.Queue(queue_size or Config.ANALYTICS_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._initialized_days = set()
+        self.dropped = 0
+
+    # ---------- 写入 ----------
+
+    def record(self, **turn) -> bool:
+        """
+        记录一轮对话（只放入内存队列，立即返回）
+
+        :param turn: 记录字段，见 COLUMNS；ts缺省为当前时间，weak_morae为薄弱拍列表
+        :return: 是否已放入队列（队列已满时丢弃记录并返回False）
+        """
+        if self._thread is None:
+            self._start()
+        turn.setdefault('ts', time.time())
+        try:
+            self._queue.put_nowait(turn)
+        except queue.Full:
+            self.dropped += 1
+            ANALYTICS_EVENTS.labels('dropped').inc()
+            return False
+        ANALYTICS_EVENTS.labels('queued').inc()
+        return True
+
+    def _start(self) -> None:
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer_loop, name='analytics-writer', daemon=True)
+                self._thread.start()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        等待队列中的记录全部写入（用于测试和退出前）
+
+        :param timeout: 最长等待时间（秒）
+        :return: 是否在超时前写完
+        """
+        if self._thread is None:
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _writer_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+                ANALYTICS_EVENTS.labels('written').inc(len(batch))
+            except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+                ANALYTICS_EVENTS.labels('failed').inc(len(batch))
+                logger.exception(f"学习统计写入失败，丢弃 {len(batch)} 条记录: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _partition_path(self, day: date) -> str:
+        return os.path.join(self.data_dir, f'turns-{day.isoformat()}.sqlite3')
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        """
+        按记录时间（UTC日期）分组写入各天的分区，每个分区一个事务
+        """
+        partitions: Dict[date, List[Tuple[Any, ...]]] = defaultdict(list)
+        for turn in batch:
+            partitions[datetime.fromtimestamp(turn['ts'], timezone.utc).date()].append(_row(turn))
+        for day, rows in partitions.items():
+            conn = self._connect(day)
+            try:
+                with conn:
+                    conn.executemany(_INSERT, rows)
+            finally:
+                conn.close()
+
+    def _connect(self, day: date) -> sqlite3.Connection:
+        path = self._partition_path(day)
+        if day not in self._initialized_days or not os.path.exists(path):
+            os.makedirs(self.data_dir, exist_ok=True)
+            conn = sqlite3.connect(path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            self._initialized_days.add(day)
+        else:
+            conn = sqlite3.connect(path, timeout=30)
+        # WAL模式下NORMAL同步级别不会损坏数据库，提交时无需等待fsync
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    # ---------- 分区管理 ----------
+
+    def partitions(self, since: Optional[date] = None, until: Optional[date] = None) -> List[Tuple[date, str]]:
+        """
+        列出时间范围内的分区
+
+        :param since: 开始日期（含）
+        :param until: 结束日期（含）
+        :return: [(日期, 文件路径)]，按日期排序
+        """
+        if not os.path.isdir(self.data_dir):
+            return []
+        result = []
+        for name in os.listdir(self.data_dir):
+            match = _PARTITION_PATTERN.match(name)
+            if not match:
+                continue
+            day = date.fromisoformat(match.group(1))
+            if (since is None or day >= since) and (until is None or day <= until):
+                result.append((day, os.path.join(self.data_dir, name)))
+        return sorted(result)
+
+    def purge(self, retention_days: float) -> int:
+        """
+        删除超过保留天数的分区
+
+        :param retention_days: 保留天数
+        :return: 删除的分区数
+        """
+        cutoff = datetime.now(timezone.utc).date() - timedelta(days=retention_days)
+        removed = 0
+        for day, path in self.partitions(until=cutoff - timedelta(days=1)):
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+            self._initialized_days.discard(day)
+            removed += 1
+        return removed
+
+    # ---------- 查询 ----------
+
+    def _query(self, days: int, sql: str, params: Tuple[Any, ...]) -> Iterator[Tuple[date, List[sqlite3.Row]]]:
+        until = datetime.now(timezone.utc).date()
+        for day, path in self.partitions(until - timedelta(days=days - 1), until):
+            conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=30)
+            conn.row_factory = sqlite3.Row
+            try:
+                yield day, conn.execute(sql, params).fetchall()
+            except sqlite3.OperationalError as e:
+                # 正在创建中的分区（还没有表）
+                logger.warning(f"读取学习统计分区失败: {path}: {str(e)}")
+            finally:
+                conn.close()
+
+    def _summarize(self, where: str, value: str, days: int) -> Dict[str, Any]:
+        """
+        汇总满足条件的记录：评分趋势（按天）、各阶段平均耗时、服务商分布、常见薄弱拍和建议句子的练习覆盖率
+        """
+        totals = Counter()
+        latency_sums = Counter()
+        latency_counts = Counter()
+        providers = Counter()
+        errors = Counter()
+        weak_morae = Counter()
+        learners = defaultdict(Counter)
+        suggested = set()
+        practiced = set()
+        trend = []
+        sql = f"SELECT * FROM turns WHERE {where} = ?"
+        for day, rows in self._query(days, sql, (value,)):
+            scores = [row['user_pronunciation_score'] for row in rows if row['user_pronunciation_score'] is not None]
+            trend.append({
+                'date': day.isoformat(),
+                'turns': len(rows),
+                'average_score': round(sum(scores) / len(scores), 1) if scores else None
+            })
+            for row in rows:
+                totals['turns'] += 1
+                learner = learners[row['learner']]
+                learner['turns'] += 1
+                if row['error_stage']:
+                    errors[row['error_stage']] += 1
+                    continue
+                if row['user_pronunciation_score'] is not None:
+                    totals['scored'] += 1
+                    totals['score_sum'] += row['user_pronunciation_score']
+                    learner['scored'] += 1
+                    learner['score_sum'] += row['user_pronunciation_score']
+                providers[f"{row['provider']}/{row['model']}" if row['model'] else row['provider']] += 1
+                for field in LATENCY_FIELDS:
+                    if row[field] is not None:
+                        latency_sums[field] += row[field]
+                        latency_counts[field] += 1
+                weak_morae.update(json.loads(row['weak_morae'] or '[]'))
+                if row['suggestion']:
+                    suggested.add(_normalize_phrase(row['suggestion']))
+                practiced.add(_normalize_phrase(row['user_input']))
+
+        covered = suggested & practiced
+        summary = {
+            'days': days,
+            'turns': totals['turns'],
+            'average_score': round(totals['score_sum'] / totals['scored'], 1) if totals['scored'] else None,
+            'score_trend': trend,
+            'latency_ms': {
+                field: round(latency_sums[field] / latency_counts[field], 1)
+                for field in LATENCY_FIELDS if latency_counts[field]
+            },
+            'providers': dict(providers.most_common()),
+            'errors': dict(errors.most_common()),
+            'weak_morae': [{'mora': mora, 'count': count} for mora, count in weak_morae.most_common(TOP_WEAK_MORAE)],
+            'phrase_coverage': {
+                'suggested': len(suggested),
+                'practiced': len(covered),
+                'ratio': round(len(covered) / len(suggested), 3) if suggested else None
+            }
+        }
+        if where == 'cohort':
+            summary['learners'] = [
+                {
+                    'learner': learner,
+                    'turns': counts['turns'],
+                    'average_score': round(counts['score_sum'] / counts['scored'], 1) if counts['scored'] else None
+                }
+                for learner, counts in sorted(learners.items())
+            ]
+        return summary
+
+    def learner_summary(self, learner: str, days: int = 30) -> Dict[str, Any]:
+        """
+        汇总一个学习者最近days天的记录
+
+        :param learner: 学习者ID
+        :param days: 天数（含今天）
+        :return: 汇总结果
+        """
+        return dict(self._summarize('learner', learner, days), learner=learner)
+
+    def cohort_summary(self, cohort: str, days: int = 30) -> Dict[str, Any]:
+        """
+        汇总一个学习小组最近days天的记录，并列出各学习者的轮数和平均分
+
+        :param cohort: 小组ID
+        :param days: 天数（含今天）
+        :return: 汇总结果
+        """
+        return dict(self._summarize('cohort', cohort, days), cohort=cohort)
+
+    # ---------- 导出 ----------
+
+    def export(self, day: date, fmt: str = 'csv', include_text: bool = False) -> bytes:
+        """
+        导出一天的记录
+
+        :param day: 日期（UTC）
+        :param fmt: csv，或安装了pyarrow时的parquet
+        :param include_text: 是否包含学习者输入和模型回复的原文（RAW_TEXT_COLUMNS）
+        :return: 文件数据
+        :raises KeyError: 没有该日期的分区
+        :raises ValueError: 不支持的格式
+        """
+        if fmt not in ('csv', 'parquet'):
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        if fmt == 'parquet' and pyarrow is None:
+            raise ValueError("导出Parquet需要安装pyarrow")
+        path = self._partition_path(day)
+        if not os.path.exists(path):
+            raise KeyError(day.isoformat())
+        columns = COLUMNS if include_text else tuple(column for column in COLUMNS if column not in RAW_TEXT_COLUMNS)
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=30)
+        try:
+            rows = conn.execute(f"SELECT {', '.join(columns)} FROM turns ORDER BY ts").fetchall()
+        finally:
+            conn.close()
+        if fmt == 'parquet':
+            table = pyarrow.table({column: [row[i] for row in rows] for i, column in enumerate(columns)})
+            buffer = pyarrow.BufferOutputStream()
+            pyarrow.parquet.write_table(table, buffer)
+            return buffer.getvalue().to_pybytes()
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        writer.writerows(rows)
+        return text.getvalue().encode('utf-8')
+
@@ -1,36 +1,587 @@
+import time
+_IMPORT_START = time.perf_counter()
+
 import os
 import sys
-from flask import Flask, request, jsonify, render_template
+import hashlib
+import hmac
+import tempfile
+import json
+import logging
+import math
+import threading
+import uuid
+from contextlib import contextmanager, ExitStack
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context, g, send_from_directory
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # 导入自定义模块
 from .config import Config
-from .conversation_history import ConversationHistory
-from .factory import ServiceFactory
+from .conversation_history import ConversationHistory, SharedConversationHistory
+from .shared_state import create_state_store
+from .factory import ServiceFactory, LazyService, LLMServiceRegistry, get_startup_report
+from .exceptions import ConfigurationError, AdmissionRejected, AudioProcessingError
+from .single_flight import SingleFlight
+from .admission import AdmissionController
+from .routing import classify_turn, OutcomeRecorder
+from .grammar_checker import GrammarChecker, split_sentences
+from .speculation import Speculator
+from .audio_cache import AudioCache, SharedAudioCache
+from .audio_server import AudioFileServer
+from .audio_upload import AudioUploadStore
+from .analytics import AnalyticsSink
+from .jobs import JobQueue, PRIORITY_HIGH, PRIORITY_LOW
+from .job_handlers import JobHandlers
+from .metrics import timed, render_latest, REQUEST_DURATION
+from .tracing import init_tracing, bind_context, span
+from .logging_config import setup_logging
+
+# 初始化共享的异步日志配置
+setup_logging()
+logger = logging.getLogger(__name__)
+from .services.pronunciation.pronunciation_scorer import PronunciationScorer, NO_VOICE_ERROR
+from .services.pronunciation.batch_scorer import score_batch, WEAK_MORA_SCORE
+from .services.tts.tts_base import TTSBaseService, SUPPORTED_FORMATS
 
 # 初始化服务工厂
 service_factory = ServiceFactory()
 
+# 共享状态存储（STATE_BACKEND=local时为None）：多个工作进程共享对话历史、缓存索引和限流计数，
+# 任一进程都可以处理任一请求；服务实例只持有客户端和配置，各进程独立创建
+state_store = create_state_store()
+
 # 初始化对话历史管理器
-conversation_history = ConversationHistory(max_history=10)
+if state_store is not None:
+    conversation_history = SharedConversationHistory(state_store, max_history=10)
+else:
+    conversation_history = ConversationHistory(max_history=10)
+
+# LLM服务注册表：每个（服务商, 模型）组合共享一个服务实例，供按请求选择模型
+llm_registry = LLMServiceRegistry()
+
+# 初始化服务（延迟创建：只导入所选服务商的SDK，首次使用或预热时才创建实例）
+ai_service = LazyService(llm_registry.get, 'llm')
+stt_service = LazyService(service_factory.create_stt_service, 'stt')
+tts_service = LazyService(service_factory.create_tts_service, 'tts')
+
+# 自动路由的结果记录，用于调整难度阈值
+routing_outcomes = OutcomeRecorder()
+
+# 应用创建完成的时间（相对于本模块开始导入）
+_app_created_seconds = None
+
+# 发音评分器（使用TTS合成参考发音）
+pronunciation_scorer = PronunciationScorer(tts_service)
+
+# 请求合并：相同内容的并发请求只调用一次服务商接口
+tts_flight = SingleFlight('tts_single_flight')
+stt_flight = SingleFlight('stt_single_flight')
+
+# 批量语法纠错（所有请求共享并发上限和结果缓存）
+grammar_checker = GrammarChecker(store=state_store)
+
+# 推测执行：按建议句子提前生成下一轮回复
+speculator = Speculator()
+
+# 预先合成的语音（推测执行和后台预合成），相同文本的合成请求直接使用
+if state_store is not None:
+    presynthesized_audio = SharedAudioCache(state_store, int(Config.AUDIO_RETENTION_HOURS * 3600))
+else:
+    presynthesized_audio = AudioCache()
+
+# 合成音频的下载（Range请求、ETag、内存缓存、交给前置服务器发送）
+audio_server = AudioFileServer(TTSBaseService.AUDIO_DIR)
+
+# 进行中的录音分片上传
+audio_uploads = AudioUploadStore()
+
+# 学习进度统计（每轮对话异步写入，不阻塞对话）
+analytics = AnalyticsSink() if Config.ANALYTICS_ENABLED else None
+
+# 后台任务队列（对话摘要、语音预合成、批量评分报告、文件清理）
+job_queue = JobQueue()
+
+# 准入控制：按会话/IP限流，按服务商限制同时进行的调用数
+admission = AdmissionController(store=state_store)
+
+# 会调用服务商接口、需要经过限流的接口
+ADMITTED_ENDPOINTS = {
+    'chat', 'grammar', 'speech_to_text', 'text_to_speech',
+    'pronunciation_score', 'pronunciation_batch', 'voice_turn'
+}
+
+# 学习统计的查询和导出接口（需要访问令牌）
+ANALYTICS_ENDPOINTS = {'learner_analytics', 'cohort_analytics', 'analytics_export'}
+
+# 语音对话流水线中各阶段并行执行所用的线程池
+pipeline_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='voice-turn')
+
+
+@contextmanager
+def _temp_audio_file(audio_bytes: bytes, suffix: str = '.wav'):
+    """
+    将上传的音频写入临时文件，使用结束后删除
+    
+    :param audio_bytes: 音频数据
+    :param suffix: 临时文件后缀
+    :return: 临时文件路径
+    """
+    fd, audio_file_path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(audio_bytes)
+        yield audio_file_path
+    finally:
+        os.remove(audio_file_path)
+
+
+def _recognize_audio_bytes(audio_bytes: bytes, suffix: str = '.wav'):
+    """
+    将上传的音频写入临时文件并调用STT服务识别
+    
+    :param audio_bytes: 音频数据
+    :param suffix: 临时文件后缀
+    :return: STT服务的识别结果
+    """
+    with _temp_audio_file(audio_bytes, suffix) as audio_file_path:
+        with admission.slot(stt_service.provider_name):
+            return stt_service.recognize_voice(audio_file_path)
+
+
+def _score_audio_bytes(audio_bytes: bytes, expected_text: str, expected_hiragana: str = None):
+    """
+    对上传的学习者录音进行发音评分
+    
+    :param audio_bytes: WAV音频数据
+    :param expected_text: 期望的日语文本
+    :param expected_hiragana: 期望文本的平假名
+    :return: 评分结果（失败时包含error字段）
+    """
+    try:
+        with span('pronunciation.score', expected_text=expected_text):
+            with _temp_audio_file(audio_bytes) as audio_file_path:
+                return pronunciation_scorer.score(audio_file_path, expected_text, expected_hiragana)
+    except Exception as e:
+        logger.exception(f"发音评分错误: {str(e)}")
+        return {'error': str(e)}
+
+
+def _format_history():
+    """
+    获取格式化的对话历史用于LLM
+    
+    :return: 格式化的对话历史
+    """
+    with timed('history_format'):
+        return conversation_history.get_history_for_llm()
+
+
+def _wants_auto_routing(options):
+    """
+    本轮对话是否按难度自动选择分级：请求指定tier=auto，或开启了LLM_AUTO_ROUTING且未指定provider、model、tier
+    
+    :param options: 请求参数（JSON或表单）
+    :return: 是否自动选择
+    """
+    tier = (options.get('tier') or '').lower()
+    if tier == 'auto':
+        return True
+    return Config.LLM_AUTO_ROUTING and not (tier or options.get('provider') or options.get('model'))
+
+
+def _select_llm_service(options):
+    """
+    根据请求参数选择LLM服务，provider、model、tier均未指定时使用默认服务
+    
+    :param options: 请求参数（JSON或表单）
+    :return: LLM服务实例
+    """
+    provider, model, tier = (str(options.get(key)) if options.get(key) else None for key in ('provider', 'model', 'tier'))
+    if not (provider or model or tier):
+        return ai_service
+    return llm_registry.get(provider, model, tier)
+
+
+def _session_id(options):
+    """
+    获取请求所属的会话ID（前端每个页面生成一个），缺省时所有请求属于同一会话
+    
+    :param options: 请求参数（JSON或表单）
+    :return: 会话ID
+    """
+    return str(options.get('session_id') or 'default')[:64]
+
+
+def _speculation_session(options):
+    """
+    获取用于推测执行的会话ID：请求没有提供会话ID时不做推测，避免不同客户端共用缺省会话而互相取消或取走推测结果
+    
+    :param options: 请求参数（JSON或表单）
+    :return: 会话ID，未提供时为None
+    """
+    return _session_id(options) if options.get('session_id') else None
+
+
+def _turn_record(channel: str, options, user_input: str = ''):
+    """
+    创建一轮对话的学习统计记录
+
+    :param channel: chat或voice
+    :param options: 请求参数（JSON或表单），learner_id缺省时使用会话ID，cohort为可选的学习小组
+    :param user_input: 用户输入
+    :return: 记录字段
+    """
+    session_id = _session_id(options)
+    return {
+        'learner': str(options.get('learner_id') or session_id)[:64],
+        'cohort': str(options.get('cohort') or '')[:64],
+        'session': session_id,
+        'channel': channel,
+        'user_input': user_input
+    }
+
+
+def _finish_turn_record(turn, result=None, pronunciation=None):
+    """
+    补充本轮的回复、评分和薄弱拍，并放入学习统计队列（不等待写入，失败不影响对话）
+
+    :param turn: _turn_record创建的记录
+    :param result: 对话结果
+    :param pronunciation: 发音评分结果
+    """
+    if analytics is None:
+        return
+    try:
+        if result and 'error' not in result:
+            turn.update(reply=result['message'], suggestion=result.get('next_suggestion') or '',
+                        pronunciation_score=result.get('pronunciation_score'),
+                        user_pronunciation_score=result.get('user_pronunciation_score'))
+        if pronunciation and 'mora_scores' in pronunciation:
+            turn['weak_morae'] = [mora['mora'] for mora in pronunciation['mora_scores'] if mora['score'] < WEAK_MORA_SCORE]
+        analytics.record(**turn)
+    except Exception as e:
+        logger.warning(f"记录学习统计失败: {str(e)}")
+
+
+def _analytics_days(args) -> int:
+    """
+    解析学习统计查询的天数
+
+    :param args: 查询参数，days缺省为30
+    :return: 天数
+    :raises ValueError: 天数不合法
+    """
+    days = args.get('days', '30')
+    if not days.isdigit() or not 1 <= int(days) <= Config.ANALYTICS_MAX_QUERY_DAYS:
+        raise ValueError(f'days必须是1到{Config.ANALYTICS_MAX_QUERY_DAYS}之间的整数')
+    return int(days)
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def _uploaded_audio(options):
+    """
+    取出分片上传的录音（请求参数upload_id，可选upload_chunks为前端发送的分片数）
+    
+    :param options: 请求参数（JSON或表单）
+    :return: WAV音频数据，未使用分片上传时返回None
+    :raises KeyError: 上传不存在或已过期
+    :raises AudioProcessingError: 分片不完整或录音为空
+    """
+    upload_id = options.get('upload_id')
+    if not upload_id:
+        return None
+    chunks = options.get('upload_chunks')
+    try:
+        chunks = int(chunks) if chunks not in (None, '') else None
+    except (TypeError, ValueError):
+        raise AudioProcessingError(f"无效的分片数: {chunks}")
+    return audio_uploads.finish(str(upload_id), _session_id(options), chunks)
+
+
+def _route_turn(user_message: str):
+    """
+    按本轮对话的难度选择模型分级，分级未配置时回退到默认服务
+    
+    :param user_message: 用户输入
+    :return: (LLM服务实例, 路由决定)
+    """
+    decision = classify_turn(user_message)
+    try:
+        service = llm_registry.get(tier=decision['tier'])
+    except ConfigurationError as e:
+        logger.warning(f"自动路由回退到默认服务: {str(e)}")
+        decision['fallback'] = True
+        service = ai_service
+    return service, decision
 
-# 初始化服务
-ai_service = service_factory.create_llm_service()
-stt_service = service_factory.create_stt_service()
-tts_service = service_factory.create_tts_service()
+
+def _run_chat_turn(user_message: str, history_for_llm=None, service=None, routing=None, session_id=None):
+    """
+    执行一轮对话：调用LLM服务并记录对话历史
+    
+    :param user_message: 用户输入
+    :param history_for_llm: 已格式化的对话历史，为None时现场生成
+    :param service: 使用的LLM服务，缺省时使用默认服务
+    :param routing: 自动路由的决定，提供时记录本轮的结果
+    :param session_id: 会话ID，提供时优先使用该会话按建议句子预先生成的回复
+    :return: LLM服务的响应（失败时包含error字段）
+    """
+    service = service or ai_service
+    if session_id is not None:
+        precomputed = speculator.take(session_id, user_message, conversation_history.revision,
+                                      (service.provider_name, service.model_name))
+        if precomputed is not None:
+            conversation_history.add_interaction(user_message, precomputed['message'])
+            job_handlers.schedule_history_summary()
+            precomputed['precomputed'] = True
+            return precomputed
+    
+    if history_for_llm is None:
+        history_for_llm = _format_history()
+    
+    # 调用选定的AI服务，传入对话历史
+    start = time.perf_counter()
+    with admission.slot(service.provider_name):
+        response = service.get_chat_response(user_message, history_for_llm)
+    if routing is not None:
+        routing_outcomes.record(routing, service, time.perf_counter() - start, response)
+    
+    if 'error' in response:
+        return response
+    
+    # 将当前交互添加到对话历史中（仅存储用户输入和AI的日语回复）
+    conversation_history.add_interaction(user_message, response['message'])
+    job_handlers.schedule_history_summary()
+    
+    return _build_chat_result(response)
+
+
+def _build_chat_result(response):
+    """
+    从LLM服务的响应中构建返回给前端的结果，确保包含所有字段
+    
+    :param response: LLM服务的响应
+    :return: 对话结果
+    """
+    return {
+        'message': response['message'],
+        'translation': response['translation'],
+        'hiragana': response['hiragana'],
+        'pronunciation_score': response['pronunciation_score'],
+        'user_pronunciation_score': response['user_pronunciation_score'],
+        'next_suggestion': response['next_suggestion'],
+        'suggestion_hiragana': response['suggestion_hiragana'],
+        'suggestion_translation': response['suggestion_translation']
+    }
+
+
+def _audio_format(options):
+    """
+    确定返回给客户端的音频格式：请求中的audio_format（客户端按自身支持的格式选择），缺省时使用TTS_AUDIO_FORMAT
+    
+    :param options: 请求参数（JSON或表单）
+    :return: 音频格式
+    """
+    audio_format = (options.get('audio_format') or '').lower()
+    return audio_format if audio_format in SUPPORTED_FORMATS else TTSBaseService._resolve_format(None)
+
+
+def _synthesize(text: str, wait: bool = True, audio_format: str = None):
+    """
+    调用TTS服务合成语音，相同文本和格式的并发请求共享一次合成结果；推测执行已合成的语音直接返回
+    
+    :param text: 要合成的文本
+    :param wait: 服务商没有空闲调用名额时是否排队
+    :param audio_format: 音频格式，缺省时使用TTS_AUDIO_FORMAT
+    :return: TTS服务的响应
+    """
+    audio_format = TTSBaseService._resolve_format(audio_format)
+    precomputed = presynthesized_audio.get(text, audio_format)
+    if precomputed is not None:
+        return precomputed
+    return tts_flight.do((text, audio_format), _synthesize_text, text, wait, audio_format)
+
+
+def _synthesize_text(text: str, wait: bool, audio_format: str):
+    with admission.slot(tts_service.provider_name, wait):
+        response = tts_service.synthesize_text(text, audio_format=audio_format)
+    if 'error' not in response:
+        # 合成的语音通常马上就会被下载，提前读入内存缓存
+        audio_server.preload(response['audio_path'])
+    return response
+
+
+def _speculate_next_turn(session_id: str, result, service, with_audio: bool, auto_routing: bool = False,
+                         audio_format: str = None):
+    """
+    回复发送后，在后台按建议句子生成下一轮的回复（及其语音），学习者照着建议句子说时可以立即返回
+    
+    :param session_id: 会话ID，为None时不做推测
+    :param result: 本轮的对话结果
+    :param service: 生成回复使用的LLM服务
+    :param with_audio: 是否同时合成回复语音
+    :param auto_routing: 本轮按难度自动选择了模型时，同样按建议句子的难度选择
+    :param audio_format: 回复语音的格式，缺省时使用TTS_AUDIO_FORMAT
+    """
+    audio_format = TTSBaseService._resolve_format(audio_format)
+    suggestion = result.get('next_suggestion')
+    if not Config.SPECULATION_ENABLED or not suggestion or session_id is None:
+        return
+    if auto_routing:
+        service = _route_turn(suggestion)[0]
+    # 先读取版本号再格式化历史：期间如有新的对话，推测结果会因版本号不一致而作废
+    revision = conversation_history.revision
+    history_for_llm = _format_history()
+    
+    # 推测执行只使用服务商的空闲调用名额，不与正在等待的请求排队
+    def synthesize(text, cancelled):
+        if cancelled.is_set():
+            return
+        try:
+            tts_response = _synthesize(text, wait=False, audio_format=audio_format)
+        except AdmissionRejected:
+            return
+        if 'error' not in tts_response:
+            presynthesized_audio.put(text, tts_response, audio_format)
+    
+    def compute(cancelled):
+        with span('speculation.chat', suggestion=suggestion), admission.slot(service.provider_name, wait=False):
+            response = service.get_chat_response(suggestion, history_for_llm)
+        if 'error' in response:
+            return response
+        speculative = _build_chat_result(response)
+        if with_audio:
+            # 语音合成不阻塞推测结果；合成进行中时，下一轮的相同文本合成请求会与之合并
+            for text in (speculative['message'], speculative['next_suggestion']):
+                if text:
+                    pipeline_executor.submit(bind_context(synthesize), text, cancelled)
+        return speculative
+    
+    speculator.schedule(session_id, suggestion, revision, (service.provider_name, service.model_name), compute)
+
+
+# 后台任务的处理函数
+job_handlers = JobHandlers(job_queue, conversation_history, ai_service, admission, _synthesize, presynthesized_audio,
+                           pronunciation_scorer, audio_server, analytics, state_store)
+job_handlers.register()
+
+
+def warm_up_services():
+    """
+    创建所有服务实例并预热LLM服务（例如预加载Ollama模型）
+    
+    可在应用启动后的后台线程中调用，也可以在多进程部署的worker启动钩子中显式调用
+    """
+    start = time.perf_counter()
+    for service in (ai_service, stt_service, tts_service):
+        try:
+            service.load()
+        except Exception as e:
+            logger.exception(f"服务创建失败: {str(e)}")
+    if ai_service.loaded:
+        ai_service.warm_up()
+    llm_registry.warm_up_tiers()
+    logger.info("服务预热完成", extra={'fields': {
+        'warm_up_seconds': round(time.perf_counter() - start, 3),
+        'startup': get_startup_report()
+    }})
+
+
+def _ndjson_event(event: str, **payload) -> str:
+    """
+    生成一行NDJSON格式的流式事件
+    
+    :param event: 事件类型
+    :return: 事件文本
+    """
+    return json.dumps({'event': event, **payload}, ensure_ascii=False) + '\n'
 
 def create_app():
     """
     创建Flask应用
     """
+    global _app_created_seconds
     app = Flask(__name__, 
                 template_folder=os.path.join(os.path.dirname(__file__), '..', 'templates'),
                 static_folder=os.path.join(os.path.dirname(__file__), '..', 'static'))
     
     # 加载配置
     app.config.from_object(Config)
+    app.config['USE_X_SENDFILE'] = Config.AUDIO_OFFLOAD == 'sendfile'
+    
+    # 部署在反向代理之后时，从代理追加的X-Forwarded-For中取客户端IP（用于按IP限流）
+    if Config.TRUSTED_PROXIES > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.TRUSTED_PROXIES)
+    
+    # 初始化链路追踪
+    init_tracing(app)
+    
+    # 在后台创建服务并预热（例如预加载Ollama模型），不阻塞应用启动；关闭时在首次使用时创建
+    if Config.SERVICE_WARM_UP:
+        threading.Thread(target=warm_up_services, name='service-warm-up', daemon=True).start()
+    
+    # 启动后台任务执行线程
+    job_queue.start()
+    
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+    
+    @app.before_request
+    def admit_request():
+        # 会调用服务商接口的请求先按会话和IP限流，超出时直接返回429
+        if request.endpoint in ADMITTED_ENDPOINTS:
+            options = request.get_json(silent=True)
+            if not isinstance(options, dict):
+                options = request.form
+            admission.begin_request(options.get('session_id'), request.remote_addr or '')
+    
+    @app.before_request
+    def authorize_analytics():
+        # 统计数据包含所有学习者的记录，只有持有访问令牌的请求可以查询；未配置令牌时接口不可用
+        if request.endpoint not in ANALYTICS_ENDPOINTS:
+            return None
+        if analytics is None or not Config.ANALYTICS_ADMIN_TOKEN:
+            return jsonify({'error': '学习统计查询未启用'}), 404
+        scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(supplied.strip().encode('utf-8'),
+                                                                   Config.ANALYTICS_ADMIN_TOKEN.encode('utf-8')):
+            return jsonify({'error': '需要有效的访问令牌'}), 401, {'WWW-Authenticate': 'Bearer'}
+        return None
+    
+    @app.teardown_request
+    def end_admission(error=None):
+        admission.end_request()
+    
+    @app.errorhandler(AdmissionRejected)
+    def admission_rejected(e):
+        response = jsonify({'error': str(e)})
+        response.status_code = e.status_code
+        response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+        return response
+    
+    @app.after_request
+    def record_request_duration(response):
+        # 流式响应只统计到响应头发出为止
+        if request.endpoint and 'request_start' in g:
+            REQUEST_DURATION.labels(request.endpoint, response.status_code).observe(time.perf_counter() - g.request_start)
+        return response
+    
+    @app.route('/metrics')
+    def metrics():
+        """
+        Prometheus指标
+        """
+        data, content_type = render_latest()
+        return Response(data, content_type=content_type)
     
     @app.route('/')
     def index():
@@ -39,54 +590,270 @@ def create_app():
         """
         return render_template('index.html')
     
+    @app.route('/sw.js')
+    def service_worker():
+        """
+        Service Worker脚本（从根路径提供，使其作用域覆盖 /api/text_to_speech 和 /audio/）
+        """
+        response = send_from_directory(app.static_folder, 'sw.js', mimetype='application/javascript', max_age=0)
+        # 每次加载页面时检查脚本更新
+        response.cache_control.no_cache = True
+        return response
+    
+    @app.route('/audio/<path:filename>')
+    def audio(filename):
+        """
+        合成音频的下载
+        """
+        return audio_server.serve(filename)
+    
+    @app.route('/api/ready')
+    def ready():
+        """
+        就绪检查，报告LLM模型是否已加载
+        """
+        try:
+            status = ai_service.get_status()
+        except Exception as e:
+            status = {'ready': False, 'error': str(e)}
+        status['provider'] = Config.LLM_PROVIDER
+        return jsonify(status), 200 if status['ready'] else 503
+    
+    @app.route('/api/startup')
+    def startup():
+        """
+        启动耗时报告：应用创建耗时，以及各服务的导入与创建耗时
+        """
+        return jsonify({
+            'app_created_seconds': _app_created_seconds,
+            'services_loaded': {
+                'llm': ai_service.loaded,
+                'stt': stt_service.loaded,
+                'tts': tts_service.loaded
+            },
+            'llm_services': llm_registry.loaded(),
+            'timings': get_startup_report()
+        })
+    
+    @app.route('/api/admission')
+    def admission_status():
+        """
+        各服务商当前的调用数和排队数
+        """
+        return jsonify(admission.snapshot())
+    
+    @app.route('/api/jobs')
+    def jobs():
+        """
+        后台任务队列中各状态的任务数量
+        """
+        return jsonify(job_queue.depth())
+    
+    @app.route('/api/jobs/<int:job_id>')
+    def job_status(job_id):
+        """
+        查询后台任务的状态和结果
+        """
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'error': '任务不存在'}), 404
+        return jsonify(job)
+    
+    @app.route('/api/analytics/learners/<learner_id>')
+    def learner_analytics(learner_id):
+        """
+        一个学习者最近days天（缺省30）的学习进度汇总：评分趋势、各阶段耗时、服务商、常见薄弱拍和建议句子的练习覆盖率
+        """
+        try:
+            days = _analytics_days(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(analytics.learner_summary(learner_id, days))
+    
+    @app.route('/api/analytics/cohorts/<cohort>')
+    def cohort_analytics(cohort):
+        """
+        一个学习小组最近days天（缺省30）的学习进度汇总，另外列出各学习者的轮数和平均分
+        """
+        try:
+            days = _analytics_days(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(analytics.cohort_summary(cohort, days))
+    
+    @app.route('/api/analytics/export')
+    def analytics_export():
+        """
+        导出一天（date=YYYY-MM-DD，UTC）的记录，format为csv（缺省）或parquet（需要安装pyarrow）；
+        学习者输入和模型回复的原文只在 ANALYTICS_EXPORT_TEXT=true 时导出
+        """
+        fmt = request.args.get('format', 'csv')
+        try:
+            day = date.fromisoformat(request.args.get('date', ''))
+            data = analytics.export(day, fmt, Config.ANALYTICS_EXPORT_TEXT)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except KeyError:
+            return jsonify({'error': '该日期没有记录'}), 404
+        mimetype = 'text/csv' if fmt == 'csv' else 'application/vnd.apache.parquet'
+        return Response(data, mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename=turns-{day.isoformat()}.{fmt}'
+        })
+    
     @app.route('/api/chat', methods=['POST'])
     def chat():
         """
         处理聊天请求
+        
+        可选参数tier（模型分级）或provider/model，用于为本轮对话选择模型；tier=auto时按对话难度自动选择
         """
         try:
-            global conversation_history
-            
             data = request.get_json()
             user_message = data.get('message', '')
+            session_id = _speculation_session(data)
+            routing = None
+            try:
+                if _wants_auto_routing(data):
+                    service, routing = _route_turn(user_message)
+                else:
+                    service = _select_llm_service(data)
+            except ConfigurationError as e:
+                return jsonify({'error': str(e)}), 400
             
-            # 获取格式化的对话历史用于LLM
-            history_for_llm = conversation_history.get_history_for_llm()
+            turn = _turn_record('chat', data, user_message)
+            turn.update(provider=service.provider_name, model=service.model_name)
+            start = time.perf_counter()
+            result = _run_chat_turn(user_message, service=service, routing=routing, session_id=session_id)
+            turn['llm_ms'] = turn['total_ms'] = _elapsed_ms(start)
             
-            # 调用配置的AI服务，传入对话历史
-            response = ai_service.get_chat_response(user_message, history_for_llm)
+            if 'error' in result:
+                turn['error_stage'] = 'llm'
+                _finish_turn_record(turn)
+                return jsonify({'error': result['error']}), 500
             
-            if 'error' in response:
-                return jsonify({'error': response['error']}), 500
-            
-            # 将当前交互添加到对话历史中（仅存储用户输入和AI的日语回复）
-            conversation_history.add_interaction(user_message, response['message'])
-            
-            # 构建返回结果，确保包含所有字段
-            result = {
-                'message': response['message'],
-                'translation': response['translation'],
-                'hiragana': response['hiragana'],
-                'pronunciation_score': response['pronunciation_score'],
-                'user_pronunciation_score': response['user_pronunciation_score'],
-                'next_suggestion': response['next_suggestion'],
-                'suggestion_hiragana': response['suggestion_hiragana'],
-                'suggestion_translation': response['suggestion_translation']
-            }
+            # 推测执行按客户端之后请求语音合成时使用的格式提前合成
+            _speculate_next_turn(session_id, result, service, Config.SPECULATION_TTS, routing is not None,
+                                 _audio_format(data))
             
+            result['provider'] = service.provider_name
+            result['model'] = service.model_name
+            if routing is not None:
+                result['routing'] = {'tier': routing['tier'], 'score': routing['score']}
+            _finish_turn_record(turn, result)
             return jsonify(result)
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            logger.exception(f"聊天处理错误: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/grammar', methods=['POST'])
+    def grammar():
+        """
+        批量语法纠错：sentences为句子列表，或text为整段文本（按句末标点和换行拆分）
+        
+        可选参数tier或provider/model用于选择模型，缺省时使用LLM_GRAMMAR_TIER分级（未配置时使用默认服务）
+        """
+        data = request.get_json(silent=True) or {}
+        sentences = data.get('sentences')
+        if sentences is None:
+            sentences = split_sentences(data.get('text') or '')
+        if not isinstance(sentences, list) or not all(isinstance(sentence, str) for sentence in sentences):
+            return jsonify({'error': 'sentences必须是字符串列表'}), 400
+        if not sentences:
+            return jsonify({'error': '缺少需要检查的句子'}), 400
+        if len(sentences) > Config.GRAMMAR_MAX_SENTENCES:
+            return jsonify({'error': f'句子数量超过上限 {Config.GRAMMAR_MAX_SENTENCES}'}), 400
+        
+        try:
+            if Config.LLM_GRAMMAR_TIER and not any(data.get(key) for key in ('provider', 'model', 'tier')):
+                service = llm_registry.get(tier=Config.LLM_GRAMMAR_TIER)
+            else:
+                service = _select_llm_service(data)
+        except ConfigurationError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            # 一次纠错请求占用一个调用名额，请求内部的并行由纠错器自身的并发上限控制
+            with admission.slot(service.provider_name):
+                report = grammar_checker.check(sentences, service)
+        except AdmissionRejected:
+            raise
         except Exception as e:
-            print(f"聊天处理错误: {str(e)}")
+            logger.exception(f"语法纠错错误: {str(e)}")
             return jsonify({'error': str(e)}), 500
+        
+        errors = [item['error'] for item in report['results'] if 'error' in item]
+        if errors and len(errors) == len(report['results']):
+            return jsonify({'error': errors[0]}), 500
+        report['provider'] = service.provider_name
+        report['model'] = service.model_name
+        return jsonify(report)
 
+    @app.route('/api/audio_upload', methods=['POST'])
+    def audio_upload_open():
+        """
+        开始一次录音的分片上传
+        
+        JSON参数：session_id、sample_rate（缺省16000）；之后按序号上传PCM16分片，
+        录音结束时在 /api/voice_turn 或 /api/speech_to_text 中以upload_id代替音频文件
+        """
+        data = request.get_json(silent=True) or {}
+        try:
+            upload_id = audio_uploads.open(_session_id(data), int(data.get('sample_rate') or 16000))
+        except (TypeError, ValueError, AudioProcessingError) as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'upload_id': upload_id}), 201
+    
+    @app.route('/api/audio_upload/<upload_id>/<int:seq>', methods=['PUT'])
+    def audio_upload_chunk(upload_id, seq):
+        """
+        上传一个录音分片（请求体为小端序16位PCM，单声道）
+        """
+        try:
+            received = audio_uploads.append(upload_id, seq, request.get_data(cache=False))
+        except KeyError:
+            return jsonify({'error': '上传不存在或已过期'}), 404
+        except AudioProcessingError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'received': received})
+    
+    @app.route('/api/audio_upload/<upload_id>', methods=['DELETE'])
+    def audio_upload_discard(upload_id):
+        """
+        放弃录音上传
+        """
+        audio_uploads.discard(upload_id)
+        return '', 204
+    
     @app.route('/api/speech_to_text', methods=['POST'])
     def speech_to_text():
         """
         语音转文本
+        
+        音频为上传的文件audio，或分片上传的录音upload_id
         """
         try:
-            # 调用配置的STT服务
-            response = stt_service.recognize_voice()
+            audio_file = request.files.get('audio')
+            try:
+                uploaded = _uploaded_audio(request.get_json(silent=True) or request.form)
+            except KeyError:
+                return jsonify({'error': '上传不存在或已过期'}), 404
+            except AudioProcessingError as e:
+                return jsonify({'error': str(e)}), 400
+            if uploaded:
+                key = hashlib.sha1(uploaded).hexdigest()
+                response = stt_flight.do(key, _recognize_audio_bytes, uploaded, '.wav')
+            elif audio_file:
+                # 相同音频的并发识别请求共享一次STT调用
+                audio_bytes = audio_file.read()
+                suffix = os.path.splitext(audio_file.filename or '')[1] or '.wav'
+                key = hashlib.sha1(audio_bytes).hexdigest()
+                response = stt_flight.do(key, _recognize_audio_bytes, audio_bytes, suffix)
+            else:
+                # 调用配置的STT服务
+                with admission.slot(stt_service.provider_name):
+                    response = stt_service.recognize_voice()
             
             if 'error' in response:
                 return jsonify({'error': response['error']}), 500
@@ -97,21 +864,25 @@ def create_app():
             }
             
             return jsonify(result)
+        except AdmissionRejected:
+            raise
         except Exception as e:
-            print(f"语音识别错误: {str(e)}")
+            logger.exception(f"语音识别错误: {str(e)}")
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/text_to_speech', methods=['POST'])
     def text_to_speech():
         """
         文本转语音
+        
+        可选参数audio_format（wav、mp3、opus）选择音频格式，缺省时使用TTS_AUDIO_FORMAT
         """
         try:
             data = request.get_json()
             text = data.get('text', '')
             
-            # 调用配置的TTS服务
-            response = tts_service.synthesize_text(text)
+            # 调用配置的TTS服务，相同文本的并发请求共享一次合成结果
+            response = _synthesize(text, audio_format=_audio_format(data))
             
             if 'error' in response:
                 return jsonify({'error': response['error']}), 500
@@ -122,8 +893,216 @@ def create_app():
             }
             
             return jsonify(result)
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            logger.exception(f"语音合成错误: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/pronunciation_score', methods=['POST'])
+    def pronunciation_score():
+        """
+        发音评分：上传学习者录音（WAV）和期望文本，返回总分与逐拍评分
+        """
+        audio_file = request.files.get('audio')
+        expected_text = request.form.get('expected_text', '').strip()
+        if not audio_file or not expected_text:
+            return jsonify({'error': '缺少音频或期望文本'}), 400
+        
+        result = _score_audio_bytes(audio_file.read(), expected_text,
+                                    request.form.get('expected_hiragana', '').strip() or None)
+        if 'error' in result:
+            # 没有说话声音是录音本身的问题，不是服务端错误
+            return jsonify({'error': result['error']}), 400 if result['error'] == NO_VOICE_ERROR else 500
+        return jsonify(result)
+    
+    @app.route('/api/pronunciation_batch', methods=['POST'])
+    def pronunciation_batch():
+        """
+        批量发音评分：上传多段录音audio及对应的expected_text（可选expected_hiragana），
+        按上传顺序返回逐句评分和汇总结果；async=true时提交后台任务，返回202和任务ID
+        """
+        audio_files = request.files.getlist('audio')
+        expected_texts = request.form.getlist('expected_text')
+        expected_hiraganas = request.form.getlist('expected_hiragana')
+        if not audio_files or len(audio_files) != len(expected_texts):
+            return jsonify({'error': '录音数量与期望文本数量不一致'}), 400
+        
+        if request.form.get('async', '').lower() == 'true':
+            upload_dir = os.path.join(Config.JOB_UPLOAD_DIR, uuid.uuid4().hex)
+            os.makedirs(upload_dir, exist_ok=True)
+            items = []
+            for i, (audio_file, expected_text) in enumerate(zip(audio_files, expected_texts)):
+                audio_path = os.path.join(upload_dir, f'{i}.wav')
+                audio_file.save(audio_path)
+                items.append({
+                    'audio_path': audio_path,
+                    'expected_text': expected_text,
+                    'expected_hiragana': expected_hiraganas[i] if i < len(expected_hiraganas) else None
+                })
+            job_id = job_queue.enqueue('pronunciation_report', {'items': items, 'upload_dir': upload_dir}, PRIORITY_HIGH)
+            return jsonify({'job_id': job_id, 'status_url': f'/api/jobs/{job_id}'}), 202
+        
+        try:
+            with ExitStack() as stack:
+                items = [
+                    {
+                        'audio_path': stack.enter_context(_temp_audio_file(audio_file.read())),
+                        'expected_text': expected_text,
+                        'expected_hiragana': expected_hiraganas[i] if i < len(expected_hiraganas) else None
+                    }
+                    for i, (audio_file, expected_text) in enumerate(zip(audio_files, expected_texts))
+                ]
+                report = score_batch(pronunciation_scorer, items)
+            return jsonify(report)
         except Exception as e:
-            print(f"语音合成错误: {str(e)}")
+            logger.exception(f"批量发音评分错误: {str(e)}")
             return jsonify({'error': str(e)}), 500
     
+    @app.route('/api/voice_turn', methods=['POST'])
+    def voice_turn():
+        """
+        一次往返完成一轮语音对话：语音识别 → AI回复 → 语音合成
+        
+        请求为multipart表单，包含音频文件audio、分片上传的录音upload_id或文本text；tts=false时跳过服务端语音合成；
+        同时提供expected_text（及expected_hiragana）时对录音进行发音评分；
+        可选的tier或provider/model用于选择本轮对话的模型（tier=auto时在识别出文本后按难度自动选择），
+        audio_format用于选择合成语音的格式。
+        响应为NDJSON流，依次推送 transcript、reply、pronunciation、audio、done 事件（出错时推送error事件）。
+        """
+        audio_file = request.files.get('audio')
+        audio_bytes = audio_file.read() if audio_file else None
+        suffix = (os.path.splitext(audio_file.filename or '')[1] or '.wav') if audio_file else '.wav'
+        try:
+            # 边录音边上传的录音在此时只差最后一个分片，识别可以立即开始
+            uploaded = _uploaded_audio(request.form)
+        except KeyError:
+            return jsonify({'error': '上传不存在或已过期'}), 404
+        except AudioProcessingError as e:
+            return jsonify({'error': str(e)}), 400
+        if uploaded:
+            audio_bytes, suffix = uploaded, '.wav'
+        text = request.form.get('text', '').strip()
+        with_tts = request.form.get('tts', 'true').lower() != 'false'
+        audio_format = _audio_format(request.form)
+        expected_text = request.form.get('expected_text', '').strip()
+        expected_hiragana = request.form.get('expected_hiragana', '').strip() or None
+        session_id = _speculation_session(request.form)
+        auto_routing = _wants_auto_routing(request.form)
+        try:
+            service = None if auto_routing else _select_llm_service(request.form)
+        except ConfigurationError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # 流式响应开始后无法再返回503，先确认本轮用到的服务商还能排队
+        providers = [stt_service.provider_name] if audio_bytes else []
+        providers += [service.provider_name] if service is not None else []
+        providers += [tts_service.provider_name] if with_tts else []
+        admission.ensure_capacity(*providers)
+        
+        # 学习统计记录：各阶段结束时补充字段，本轮结束（包括出错和客户端断开）时放入队列
+        turn = _turn_record('voice', request.form, text)
+        
+        def generate():
+            start = time.perf_counter()
+            pronunciation = None
+            try:
+                user_message = text
+                score_future = None
+                if audio_bytes and expected_text:
+                    # 发音评分与语音识别、AI回复并行进行
+                    score_future = pipeline_executor.submit(bind_context(_score_audio_bytes), audio_bytes, expected_text, expected_hiragana)
+                if audio_bytes:
+                    # 语音识别与对话历史格式化同时进行
+                    key = hashlib.sha1(audio_bytes).hexdigest()
+                    stt_future = pipeline_executor.submit(bind_context(admission.bind(stt_flight.do)), key, _recognize_audio_bytes, audio_bytes, suffix)
+                    history_for_llm = _format_history()
+                    stt_response = stt_future.result()
+                    turn['stt_ms'] = _elapsed_ms(start)
+                    if 'error' in stt_response:
+                        turn['error_stage'] = 'stt'
+                        yield _ndjson_event('error', stage='stt', error=stt_response['error'])
+                        return
+                    user_message = stt_response['result']
+                    turn['user_input'] = user_message
+                    yield _ndjson_event('transcript', text=user_message, confidence=stt_response['confidence'])
+                else:
+                    history_for_llm = None
+                
+                if not user_message:
+                    turn['error_stage'] = 'input'
+                    yield _ndjson_event('error', stage='input', error='缺少音频或文本')
+                    return
+                
+                routing = None
+                chat_service = service
+                if auto_routing:
+                    chat_service, routing = _route_turn(user_message)
+                turn.update(provider=chat_service.provider_name, model=chat_service.model_name)
+                chat_start = time.perf_counter()
+                with span('voice_turn.chat'):
+                    result = _run_chat_turn(user_message, history_for_llm, chat_service, routing, session_id)
+                turn['llm_ms'] = _elapsed_ms(chat_start)
+                if 'error' in result:
+                    turn['error_stage'] = 'llm'
+                    yield _ndjson_event('error', stage='llm', error=result['error'])
+                    return
+                if routing is not None:
+                    result['routing'] = {'tier': routing['tier'], 'score': routing['score']}
+                
+                pronunciation = score_future.result() if score_future else None
+                if pronunciation and 'error' not in pronunciation:
+                    result['user_pronunciation_score'] = pronunciation['score']
+                yield _ndjson_event('reply', **result)
+                if pronunciation:
+                    yield _ndjson_event('pronunciation', **pronunciation)
+                
+                suggestion = result.get('next_suggestion')
+                if with_tts:
+                    # 只在请求中合成回复语音；建议句子语音已预先合成时一并推送，否则交给后台任务
+                    tts_start = time.perf_counter()
+                    try:
+                        tts_response = _synthesize(result['message'], audio_format=audio_format)
+                    except AdmissionRejected as e:
+                        tts_response = {'error': str(e)}
+                    turn['tts_ms'] = _elapsed_ms(tts_start)
+                    if 'error' in tts_response:
+                        yield _ndjson_event('error', stage='tts', target='reply', error=tts_response['error'])
+                    else:
+                        yield _ndjson_event('audio', target='reply',
+                                            audio_url=tts_response['audio_url'], format=tts_response['format'])
+                    suggestion_audio = presynthesized_audio.get(suggestion, audio_format) if suggestion else None
+                    if suggestion_audio is not None:
+                        yield _ndjson_event('audio', target='suggestion',
+                                            audio_url=suggestion_audio['audio_url'], format=suggestion_audio['format'])
+                
+                turn['total_ms'] = _elapsed_ms(start)
+                _finish_turn_record(turn, result, pronunciation)
+                yield _ndjson_event('done')
+                
+                if with_tts and suggestion and suggestion_audio is None:
+                    job_queue.enqueue('synthesize_audio', {'text': suggestion, 'format': audio_format}, PRIORITY_LOW,
+                                      dedupe_key=f'tts:{audio_format}:' + hashlib.sha1(suggestion.encode('utf-8')).hexdigest())
+                
+                # 本轮响应已发送完毕，在后台为下一轮做推测执行
+                _speculate_next_turn(session_id, result, chat_service, with_tts and Config.SPECULATION_TTS, auto_routing,
+                                     audio_format)
+            except AdmissionRejected as e:
+                turn['error_stage'] = 'admission'
+                yield _ndjson_event('error', stage='admission', error=str(e), status=e.status_code,
+                                    retry_after=e.retry_after)
+            except Exception as e:
+                turn['error_stage'] = 'pipeline'
+                logger.exception(f"语音对话处理错误: {str(e)}")
+                yield _ndjson_event('error', stage='pipeline', error=str(e))
+            finally:
+                if 'total_ms' not in turn:
+                    turn['total_ms'] = _elapsed_ms(start)
+                    _finish_turn_record(turn, pronunciation=pronunciation)
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    _app_created_seconds = round(time.perf_counter() - _IMPORT_START, 4)
+    logger.info(f"应用创建完成，耗时 {_app_created_seconds} 秒")
+    
     return app
\ No newline at end of file
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .shared_state import StateStore
+
+
+class AudioCache:
+    """
+    预先合成的语音（推测执行、后台预合成）：(文本, 格式) → TTS服务的响应，供之后的语音合成请求直接使用
+    """
+    def __init__(self, max_size: int = 64):
+        """
+        初始化语音缓存
+
+        :param max_size: 缓存的最大条目数
+        """
+        self.max_size = max_size
+        self._entries: 'OrderedDict[Tuple[str, str], Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, text: str, tts_response: Dict[str, Any], audio_format: str) -> None:
+        """
+        保存合成的语音
+
+        :param text: 合成的文本
+        :param tts_response: TTS服务的响应
+        :param audio_format: 请求的音频格式
+        """
+        key = (text, audio_format)
+        with self._lock:
+            self._entries[key] = tts_response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, text: str, audio_format: str) -> Optional[Dict[str, Any]]:
+        """
+        查找为该文本合成的语音（音频文件已被清理时视为不存在）
+
+        :param text: 要合成的文本
+        :param audio_format: 请求的音频格式
+        :return: TTS服务的响应，没有时返回None
+        """
+        with self._lock:
+            tts_response = self._entries.get((text, audio_format))
+        if tts_response is None or not os.path.exists(tts_response.get('audio_path', '')):
+            return None
+        return tts_response
+
+
+
+class SharedAudioCache(AudioCache):
+    """
+    保存在共享状态存储中的预合成语音索引：一个进程预先合成的语音，其他进程也能直接使用
+    （要求各进程能访问同一个音频目录，例如同一台机器上的多个工作进程或共享存储卷）
+    """
+    def __init__(self, store: StateStore, ttl: int):
+        """
+        初始化共享的语音缓存
+
+        :param store: 共享状态存储
+        :param ttl: 索引的保留时间（秒），与音频文件的保留时间一致
+        """
+        self.store = store
+        self.ttl = max(1, int(ttl))
+
+    def _key(self, text: str, audio_format: str) -> str:
+        return self.store.key('tts', audio_format, hashlib.sha1(text.encode('utf-8')).hexdigest())
+
+    def put(self, text: str, tts_response: Dict[str, Any], audio_format: str) -> None:
+        self.store.execute('SET', self._key(text, audio_format), json.dumps(tts_response, ensure_ascii=False),
+                           'EX', self.ttl)
+
+    def get(self, text: str, audio_format: str) -> Optional[Dict[str, Any]]:
+        value = self.store.execute('GET', self._key(text, audio_format))
+        if value is None:
+            return None
+        tts_response = json.loads(value)
+        if not os.path.exists(tts_response.get('audio_path', '')):
+            return None
+        return tts_response
@@ -0,0 +1,180 @@
+"""
+合成音频的下载：支持Range请求，以内容哈希作为ETag并设置长期缓存，
+常用的短音频缓存在内存中，也可以交给前置的Nginx（X-Accel-Redirect）或支持X-Sendfile的服务器发送文件
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from flask import Response, abort, send_file
+from werkzeug.security import safe_join
+
+from .config import Config
+from .metrics import record_cache
+
+# 合成音频的文件名唯一、内容不会改变，可以长期缓存
+CACHE_MAX_AGE = 365 * 24 * 3600
+
+AUDIO_MIMETYPES = {
+    'wav': 'audio/wav',
+    'mp3': 'audio/mpeg',
+    'opus': 'audio/ogg',
+    'ogg': 'audio/ogg'
+}
+
+# 记录内容哈希的最大文件数
+MAX_ETAGS = 4096
+
+
+class AudioFileServer:
+    """
+    合成音频的下载服务
+    """
+    def __init__(self, directory: str, cache_bytes: Optional[int] = None, max_clip_bytes: Optional[int] = None,
+                 offload: Optional[str] = None, accel_prefix: Optional[str] = None):
+        """
+        初始化音频下载服务，缺省参数使用配置值
+
+        :param directory: 音频文件目录
+        :param cache_bytes: 内存缓存的总字节数，0表示不缓存
+        :param max_clip_bytes: 缓存的单个文件的最大字节数
+        :param offload: 交给前置服务器发送文件的方式：空字符串（由应用发送）、nginx、sendfile
+        :param accel_prefix: X-Accel-Redirect的内部路径前缀（offload为nginx时使用）
+        """
+        self.directory = os.path.abspath(directory)
+        self.cache_bytes = Config.AUDIO_CACHE_BYTES if cache_bytes is None else cache_bytes
+        self.max_clip_bytes = Config.AUDIO_CACHE_MAX_CLIP if max_clip_bytes is None else max_clip_bytes
+        self.offload = Config.AUDIO_OFFLOAD if offload is None else offload
+        self.accel_prefix = (Config.AUDIO_ACCEL_PREFIX if accel_prefix is None else accel_prefix).rstrip('/')
+        # 文件名 -> 音频数据（按最近使用排序）
+        self._cache: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._cached_size = 0
+        # (文件名, 修改时间, 大小) -> 内容哈希
+        self._etags: 'OrderedDict[Tuple[str, float, int], str]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, filename: str) -> Optional[str]:
+        path = safe_join(self.directory, filename)
+        if path is None or not os.path.isfile(path):
+            return None
+        return path
+
+    def _cache_get(self, filename: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._cache.get(filename)
+            if data is not None:
+                self._cache.move_to_end(filename)
+        record_cache('audio_bytes', data is not None)
+        return data
+
+    def _cache_put(self, filename: str, data: bytes) -> None:
+        if len(data) > self.max_clip_bytes or len(data) > self.cache_bytes:
+            return
+        with self._lock:
+            previous = self._cache.pop(filename, None)
+            if previous is not None:
+                self._cached_size -= len(previous)
+            self._cache[filename] = data
+            self._cached_size += len(data)
+            while self._cached_size > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_size -= len(evicted)
+
+    def _etag(self, filename: str, stat: os.stat_result, data: Optional[bytes] = None) -> str:
+        """
+        获取文件内容的哈希（同一文件只计算一次）
+        """
+        key = (filename, stat.st_mtime, stat.st_size)
+        with self._lock:
+            etag = self._etags.get(key)
+        if etag is not None:
+            return etag
+        digest = hashlib.sha1()
+        if data is not None:
+            digest.update(data)
+        else:
+            with open(os.path.join(self.directory, filename), 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    digest.update(chunk)
+        etag = digest.hexdigest()
+        with self._lock:
+            self._etags[key] = etag
+            while len(self._etags) > MAX_ETAGS:
+                self._etags.popitem(last=False)
+        return etag
+
+    def preload(self, audio_path: str) -> None:
+        """
+        合成完成后立即读入缓存并计算哈希，使随后的下载请求不再读取磁盘
+
+        :param audio_path: 合成音频的路径
+        """
+        filename = os.path.basename(audio_path)
+        path = self._path(filename)
+        if path is None:
+            return
+        stat = os.stat(path)
+        if self.cache_bytes <= 0 or stat.st_size > self.max_clip_bytes or self.offload:
+            self._etag(filename, stat)
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        self._cache_put(filename, data)
+        self._etag(filename, stat, data)
+
+    def clear(self) -> None:
+        """
+        清空内存缓存（例如清理过期的音频文件之后）
+        """
+        with self._lock:
+            self._cache.clear()
+            self._cached_size = 0
+            self._etags.clear()
+
+    def serve(self, filename: str) -> Response:
+        """
+        发送音频文件：支持Range和条件请求（If-None-Match），带长期缓存头
+
+        :param filename: 音频文件名
+        :return: Flask响应
+        """
+        path = self._path(filename)
+        if path is None:
+            abort(404)
+        stat = os.stat(path)
+        mimetype = AUDIO_MIMETYPES.get(os.path.splitext(filename)[1].lstrip('.').lower(), 'application/octet-stream')
+
+        if self.offload == 'nginx':
+            # 由Nginx发送文件（Range、条件请求等由Nginx处理），应用只返回响应头
+            response = Response(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = f'{self.accel_prefix}/{filename}'
+            response.set_etag(self._etag(filename, stat))
+            response.cache_control.public = True
+            response.cache_control.max_age = CACHE_MAX_AGE
+            response.cache_control.immutable = True
+            return response
+
+        data = self._cache_get(filename) if not self.offload else None
+        if data is None and not self.offload and stat.st_size <= self.max_clip_bytes and self.cache_bytes > 0:
+            with open(path, 'rb') as f:
+                data = f.read()
+            self._cache_put(filename, data)
+        etag = self._etag(filename, stat, data)
+
+        # 没有缓存时直接发送文件（可使用服务器的sendfile，offload为sendfile时由应用配置USE_X_SENDFILE交给前置服务器）
+        source = io.BytesIO(data) if data is not None else path
+        response = send_file(source, mimetype=mimetype, conditional=True, etag=etag,
+                             last_modified=stat.st_mtime, max_age=CACHE_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    def stats(self) -> Dict[str, int]:
+        """
+        内存缓存的文件数和字节数
+        """
+        with self._lock:
+            return {'files': len(self._cache), 'bytes': self._cached_size}
@@ -0,0 +1,173 @@
+"""
+录音的分片上传：前端边录音边上传16kHz单声道PCM16分片，录音结束时只剩最后一个分片，
+服务端拼接为WAV后交给语音识别服务（STTBaseService.recognize_voice）
+"""
+import io
+import threading
+import time
+import uuid
+import wave
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from .config import Config
+from .exceptions import AudioProcessingError
+
+# 接受的采样率范围
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+
+# 每个样本的字节数（PCM16）
+SAMPLE_WIDTH = 2
+
+
+def pcm16_to_wav(pcm: bytes, sample_rate: int, channels: int = 1) -> bytes:
+    """
+    为PCM16数据加上WAV文件头
+
+    :param pcm: 小端序的16位PCM数据
+    :param sample_rate: 采样率
+    :param channels: 声道数
+    :return: WAV文件数据
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+
+class AudioUpload:
+    """
+    一次录音的上传：按序号拼接分片，乱序到达的分片暂存到前面的分片到达为止
+    """
+    __slots__ = ('upload_id', 'session_id', 'sample_rate', 'data', 'next_seq', 'pending', 'size', 'updated_at')
+
+    def __init__(self, upload_id: str, session_id: str, sample_rate: int):
+        self.upload_id = upload_id
+        self.session_id = session_id
+        self.sample_rate = sample_rate
+        self.data = bytearray()
+        self.next_seq = 0
+        self.pending: Dict[int, bytes] = {}
+        self.size = 0
+        self.updated_at = time.monotonic()
+
+
+class AudioUploadStore:
+    """
+    进行中的录音上传（保存在内存中，完成或过期后删除）
+    """
+    def __init__(self, max_bytes: Optional[int] = None, ttl: Optional[float] = None,
+                 max_streams: Optional[int] = None):
+        """
+        初始化上传存储，缺省参数使用配置值
+
+        :param max_bytes: 单次录音的最大字节数
+        :param ttl: 未完成的上传在最后一个分片之后保留的时间（秒）
+        :param max_streams: 同时进行的上传数，超出时删除最久没有收到分片的上传
+        """
+        self.max_bytes = max_bytes or Config.AUDIO_UPLOAD_MAX_BYTES
+        self.ttl = ttl or Config.AUDIO_UPLOAD_TTL
+        self.max_streams = max_streams or Config.AUDIO_UPLOAD_MAX_STREAMS
+        # 上传ID -> 上传（按最近收到分片的时间排序）
+        self._uploads: 'OrderedDict[str, AudioUpload]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        while self._uploads:
+            upload = next(iter(self._uploads.values()))
+            if now - upload.updated_at <= self.ttl and len(self._uploads) <= self.max_streams:
+                break
+            del self._uploads[upload.upload_id]
+
+    def open(self, session_id: str, sample_rate: int = 16000) -> str:
+        """
+        开始一次录音上传
+
+        :param session_id: 会话ID，完成上传时校验
+        :param sample_rate: 分片的采样率
+        :return: 上传ID
+        :raises AudioProcessingError: 不支持的采样率
+        """
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise AudioProcessingError(f"不支持的采样率: {sample_rate}")
+        upload = AudioUpload(uuid.uuid4().hex, session_id, sample_rate)
+        now = time.monotonic()
+        with self._lock:
+            self._uploads[upload.upload_id] = upload
+            self._expire(now)
+        return upload.upload_id
+
+    def _get(self, upload_id: str) -> AudioUpload:
+        upload = self._uploads.get(upload_id)
+        if upload is None:
+            raise KeyError(upload_id)
+        return upload
+
+    def append(self, upload_id: str, seq: int, chunk: bytes) -> int:
+        """
+        接收一个分片（重复的分片会被忽略，便于前端重试）
+
+        :param upload_id: 上传ID
+        :param seq: 分片序号，从0开始
+        :param chunk: PCM16数据
+        :return: 已连续收到的字节数
+        :raises KeyError: 上传不存在或已过期
+        :raises AudioProcessingError: 分片不完整（奇数字节）或超过最大长度
+        """
+        if len(chunk) % SAMPLE_WIDTH:
+            raise AudioProcessingError("音频分片长度不是完整的PCM16样本")
+        with self._lock:
+            upload = self._get(upload_id)
+            if seq < upload.next_seq or seq in upload.pending:
+                return len(upload.data)
+            if upload.size + len(chunk) > self.max_bytes:
+                del self._uploads[upload_id]
+                raise AudioProcessingError("录音超过最大长度")
+            upload.size += len(chunk)
+            upload.pending[seq] = chunk
+            while upload.next_seq in upload.pending:
+                upload.data += upload.pending.pop(upload.next_seq)
+                upload.next_seq += 1
+            upload.updated_at = time.monotonic()
+            self._uploads.move_to_end(upload_id)
+            return len(upload.data)
+
+    def finish(self, upload_id: str, session_id: str, chunks: Optional[int] = None) -> bytes:
+        """
+        结束上传，返回拼接好的WAV数据
+
+        :param upload_id: 上传ID
+        :param session_id: 会话ID，与开始上传时不同时视为不存在
+        :param chunks: 前端发送的分片数，提供时校验是否全部收到
+        :return: WAV文件数据
+        :raises KeyError: 上传不存在或已过期
+        :raises AudioProcessingError: 有分片缺失或没有音频
+        """
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is None or upload.session_id != session_id:
+                raise KeyError(upload_id)
+            del self._uploads[upload_id]
+        if upload.pending or (chunks is not None and upload.next_seq != chunks):
+            raise AudioProcessingError(f"录音分片不完整：收到{upload.next_seq}个连续分片")
+        if not upload.data:
+            raise AudioProcessingError("录音为空")
+        return pcm16_to_wav(bytes(upload.data), upload.sample_rate)
+
+    def discard(self, upload_id: str) -> None:
+        """
+        放弃上传（例如前端取消录音）
+        """
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        进行中的上传数和已接收的字节数
+        """
+        with self._lock:
+            return {'uploads': len(self._uploads), 'bytes': sum(u.size for u in self._uploads.values())}
@@ -12,23 +12,163 @@ class Config:
 
     # DashScope配置
     DASHSCOPE_API_KEY = os.environ.get('DASHSCOPE_API_KEY') or 'YOUR_DASHSCOPE_API_KEY'
+    DASHSCOPE_MODEL = os.environ.get('DASHSCOPE_MODEL') or 'qwen-plus'
 
     # OpenAI配置
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY') or 'YOUR_OPENAI_API_KEY'
     OPENAI_API_BASE = os.environ.get('OPENAI_API_BASE') or 'https://api.openai.com/v1'
+    OPENAI_MODEL = os.environ.get('OPENAI_MODEL') or 'gpt-3.5-turbo'
 
     # Gemini配置
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY') or 'YOUR_GEMINI_API_KEY'
+    GEMINI_MODEL = os.environ.get('GEMINI_MODEL') or 'gemini-2.5-flash'
+    GEMINI_API_BASE = os.environ.get('GEMINI_API_BASE') or ''  # 自定义接口地址（例如压测用的模拟服务），为空时使用官方地址
 
     # Ollama配置
     OLLAMA_API_BASE = os.environ.get('OLLAMA_API_BASE') or 'http://localhost:11434/api'
+    OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL') or 'gemma3:12b'
+    OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE') or '30m'  # 模型在内存中的保留时间，-1表示常驻
+    OLLAMA_PRELOAD = os.environ.get('OLLAMA_PRELOAD', 'true').lower() == 'true'  # 应用启动时预加载模型
+    OLLAMA_PRELOAD_TIMEOUT = float(os.environ.get('OLLAMA_PRELOAD_TIMEOUT', '120'))  # 预加载/保活请求的超时时间（秒），包括从磁盘加载模型的时间
+    OLLAMA_KEEPALIVE_INTERVAL = int(os.environ.get('OLLAMA_KEEPALIVE_INTERVAL', '300'))  # 保活请求间隔（秒），0表示关闭
+    OLLAMA_NUM_CTX = int(os.environ.get('OLLAMA_NUM_CTX', '4096'))
+    OLLAMA_NUM_THREAD = int(os.environ.get('OLLAMA_NUM_THREAD', '0'))  # 0表示由Ollama自动决定
 
     # 选择使用的API
     LLM_PROVIDER = os.environ.get('LLM_PROVIDER') or 'dashscope'  # 可选: dashscope, openai, gemini, ollama
+
+    # 模型分级：LLM_TIER_<名称>=服务商:模型，例如 LLM_TIER_FAST=ollama:qwen2.5:3b、LLM_TIER_LARGE=dashscope:qwen-max
+    # 请求中可以通过tier参数选择分级，未配置的服务商/模型使用上面的默认值
+    LLM_TIERS = {
+        key[len('LLM_TIER_'):].lower(): value
+        for key, value in os.environ.items()
+        if key.startswith('LLM_TIER_') and value
+    }
+
+    # 请求中可以通过provider/model直接选择的模型，逗号分隔的 服务商:模型（只写服务商表示其默认模型），
+    # 例如 LLM_ALLOWED_MODELS=openai:gpt-4o-mini,ollama；默认服务商和已配置的分级始终可用，其他组合返回400
+    LLM_ALLOWED_MODELS = [item.strip() for item in (os.environ.get('LLM_ALLOWED_MODELS') or '').split(',') if item.strip()]
+
+    # 按对话难度自动选择分级：难度分低于阈值的对话使用小模型分级，否则使用大模型分级
+    LLM_AUTO_ROUTING = os.environ.get('LLM_AUTO_ROUTING', 'false').lower() == 'true'  # 未指定分级的请求也自动选择（请求中也可传tier=auto）
+    ROUTING_FAST_TIER = (os.environ.get('ROUTING_FAST_TIER') or 'fast').lower()
+    ROUTING_LARGE_TIER = (os.environ.get('ROUTING_LARGE_TIER') or 'large').lower()
+    ROUTING_THRESHOLD = float(os.environ.get('ROUTING_THRESHOLD', '0.35'))
+    ROUTING_OUTCOME_FILE = os.environ.get('ROUTING_OUTCOME_FILE', os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'routing', 'outcomes.jsonl'))  # 路由结果记录，空字符串表示不记录
     
+    # 服务启动配置
+    SERVICE_WARM_UP = os.environ.get('SERVICE_WARM_UP', 'true').lower() == 'true'  # 启动后在后台创建服务并预热，false表示首次使用时才创建
+
     # 语音服务配置
     STT_PROVIDER = os.environ.get('STT_PROVIDER') or 'dashscope'  # 可选: dashscope, openai, gemini, local
     TTS_PROVIDER = os.environ.get('TTS_PROVIDER') or 'dashscope'  # 可选: dashscope, openai, gemini, local
+    TTS_AUDIO_FORMAT = (os.environ.get('TTS_AUDIO_FORMAT') or 'wav').lower()  # 请求未指定格式时的合成音频格式: wav, mp3, opus
+    TTS_OPUS_BITRATE = os.environ.get('TTS_OPUS_BITRATE') or '24k'  # 本地转换为Opus时的码率
+    TTS_MP3_BITRATE = os.environ.get('TTS_MP3_BITRATE') or '48k'  # 本地转换为MP3时的码率
+    FFMPEG_PATH = os.environ.get('FFMPEG_PATH') or 'ffmpeg'  # 服务商不支持的格式通过ffmpeg在本地转换
+
+    # 发音评分配置
+    PRONUNCIATION_CACHE_DIR = os.environ.get('PRONUNCIATION_CACHE_DIR') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'pronunciation')
+    PRONUNCIATION_CACHE_SIZE = int(os.environ.get('PRONUNCIATION_CACHE_SIZE', '256'))  # 内存中缓存的参考特征数量
+    PRONUNCIATION_GOOD_DISTANCE = float(os.environ.get('PRONUNCIATION_GOOD_DISTANCE', '2.5'))  # 不高于该距离记满分
+    PRONUNCIATION_BAD_DISTANCE = float(os.environ.get('PRONUNCIATION_BAD_DISTANCE', '6.0'))  # 不低于该距离记0分
+    PRONUNCIATION_BATCH_WORKERS = int(os.environ.get('PRONUNCIATION_BATCH_WORKERS', '0'))  # 批量评分进程数，0表示CPU核数
+
+    # 推测执行配置：回复发送后按建议句子提前生成下一轮回复及其语音
+    # 每轮会多一次模型调用（开启SPECULATION_TTS时还有语音合成），学习者没有照着建议句子说时这些调用被浪费，因此默认关闭
+    SPECULATION_ENABLED = os.environ.get('SPECULATION_ENABLED', 'false').lower() == 'true'
+    SPECULATION_TTS = os.environ.get('SPECULATION_TTS', 'false').lower() == 'true'  # 同时提前合成回复语音
+    SPECULATION_BUDGET = int(os.environ.get('SPECULATION_BUDGET', '30'))  # 每个会话在时间窗口内的最大推测次数
+    SPECULATION_WINDOW = int(os.environ.get('SPECULATION_WINDOW', '3600'))  # 推测预算的时间窗口（秒）
+    SPECULATION_MATCH_RATIO = float(os.environ.get('SPECULATION_MATCH_RATIO', '0.9'))  # 学习者输入与建议句子的最低相似度
+    SPECULATION_MAX_WORKERS = int(os.environ.get('SPECULATION_MAX_WORKERS', '2'))  # 同时进行的推测任务数
+
+    # 后台任务配置
+    JOB_QUEUE_DB = os.environ.get('JOB_QUEUE_DB') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'jobs.sqlite3')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))  # 执行后台任务的线程数，0表示不在本进程执行
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+    JOB_RETRY_DELAY = float(os.environ.get('JOB_RETRY_DELAY', '5'))  # 首次重试的等待时间（秒），之后每次翻倍
+    JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', '60'))  # 执行中任务的租约时长（秒），进程退出后任务在租约过期时由其他进程重新执行
+    JOB_RETENTION_DAYS = float(os.environ.get('JOB_RETENTION_DAYS', '7'))  # 已结束任务的保留天数
+    JOB_UPLOAD_DIR = os.environ.get('JOB_UPLOAD_DIR') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'job_uploads')  # 后台任务使用的上传文件
+    HISTORY_SUMMARY_BATCH = int(os.environ.get('HISTORY_SUMMARY_BATCH', '5'))  # 移出历史的对话达到该轮数时在后台生成摘要，0表示关闭
+    HISTORY_SUMMARY_LOCK_TTL = float(os.environ.get('HISTORY_SUMMARY_LOCK_TTL', '120'))  # 多进程部署时合并摘要的锁的过期时间（秒），应大于一次模型调用的耗时
+    HISTORY_COMPACT_IDLE = int(os.environ.get('HISTORY_COMPACT_IDLE', '600'))  # 对话历史空闲超过该时间（秒）后压缩保存，0表示关闭
+    AUDIO_RETENTION_HOURS = float(os.environ.get('AUDIO_RETENTION_HOURS', '24'))  # 合成音频文件的保留时间（小时）
+    AUDIO_CLEANUP_INTERVAL = int(os.environ.get('AUDIO_CLEANUP_INTERVAL', '3600'))  # 清理音频文件和过期任务的间隔（秒）
+
+    # 学习进度统计配置
+    ANALYTICS_ENABLED = os.environ.get('ANALYTICS_ENABLED', 'true').lower() == 'true'  # 记录每轮对话用于学习进度统计
+    ANALYTICS_DIR = os.environ.get('ANALYTICS_DIR') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'analytics')  # 按天分区的统计数据库所在目录
+    ANALYTICS_BATCH_SIZE = int(os.environ.get('ANALYTICS_BATCH_SIZE', '200'))  # 每次写入的最大记录数
+    ANALYTICS_FLUSH_INTERVAL = float(os.environ.get('ANALYTICS_FLUSH_INTERVAL', '2'))  # 记录等待批量写入的最长时间（秒）
+    ANALYTICS_QUEUE_SIZE = int(os.environ.get('ANALYTICS_QUEUE_SIZE', '10000'))  # 等待写入的记录数上限，超出时丢弃新记录
+    ANALYTICS_RETENTION_DAYS = float(os.environ.get('ANALYTICS_RETENTION_DAYS', '180'))  # 分区的保留天数
+    ANALYTICS_MAX_QUERY_DAYS = int(os.environ.get('ANALYTICS_MAX_QUERY_DAYS', '366'))  # 汇总查询的最大天数
+    ANALYTICS_ADMIN_TOKEN = os.environ.get('ANALYTICS_ADMIN_TOKEN') or ''  # 查询和导出接口的访问令牌（Authorization: Bearer <令牌>），为空时这些接口不可用
+    ANALYTICS_EXPORT_TEXT = os.environ.get('ANALYTICS_EXPORT_TEXT', 'false').lower() == 'true'  # 导出时包含学习者输入和模型回复的原文
+
+    # 合成音频下载配置
+    AUDIO_CACHE_BYTES = int(os.environ.get('AUDIO_CACHE_BYTES', str(32 * 1024 * 1024)))  # 内存中缓存的音频总字节数，0表示不缓存
+    AUDIO_CACHE_MAX_CLIP = int(os.environ.get('AUDIO_CACHE_MAX_CLIP', str(2 * 1024 * 1024)))  # 缓存的单个音频文件的最大字节数
+    AUDIO_OFFLOAD = (os.environ.get('AUDIO_OFFLOAD') or '').lower()  # 交给前置服务器发送音频文件: 空（由应用发送）、nginx（X-Accel-Redirect）、sendfile（X-Sendfile）
+    AUDIO_ACCEL_PREFIX = os.environ.get('AUDIO_ACCEL_PREFIX') or '/_audio'  # X-Accel-Redirect使用的Nginx内部路径前缀
+
+    # 录音分片上传配置：前端边录音边上传16kHz单声道PCM16分片，录音结束时服务端已收到绝大部分音频
+    AUDIO_UPLOAD_MAX_BYTES = int(os.environ.get('AUDIO_UPLOAD_MAX_BYTES', str(16000 * 2 * 120)))  # 单次录音的最大字节数（16kHz PCM16约2分钟）
+    AUDIO_UPLOAD_TTL = float(os.environ.get('AUDIO_UPLOAD_TTL', '120'))  # 未完成的上传在最后一个分片之后保留的时间（秒）
+    AUDIO_UPLOAD_MAX_STREAMS = int(os.environ.get('AUDIO_UPLOAD_MAX_STREAMS', '1000'))  # 同时进行的上传数
+
+    # 语法纠错配置
+    LLM_GRAMMAR_TIER = (os.environ.get('LLM_GRAMMAR_TIER') or '').lower()  # 语法纠错默认使用的模型分级，为空时使用默认服务
+    GRAMMAR_BATCH_SIZE = int(os.environ.get('GRAMMAR_BATCH_SIZE', '8'))  # 一次请求中检查的最大句子数，1表示逐句请求
+    GRAMMAR_BATCH_MAX_CHARS = int(os.environ.get('GRAMMAR_BATCH_MAX_CHARS', '400'))  # 一次请求中句子的最大总字数，更长的句子单独请求
+    GRAMMAR_MAX_CONCURRENCY = int(os.environ.get('GRAMMAR_MAX_CONCURRENCY', '4'))  # 同时进行的纠错请求数（所有请求共享）
+    GRAMMAR_CACHE_SIZE = int(os.environ.get('GRAMMAR_CACHE_SIZE', '2048'))  # 内存中缓存的纠错结果数量
+    GRAMMAR_MAX_SENTENCES = int(os.environ.get('GRAMMAR_MAX_SENTENCES', '500'))  # 单次请求的最大句子数
+
+    # 准入控制配置：按会话/IP限流，按服务商限制并发，超出时快速返回429/503
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_SESSION_RATE = float(os.environ.get('RATE_LIMIT_SESSION_RATE', '1'))  # 每个会话每秒补充的请求数，0表示不限流
+    RATE_LIMIT_SESSION_BURST = int(os.environ.get('RATE_LIMIT_SESSION_BURST', '10'))  # 每个会话允许的突发请求数
+    RATE_LIMIT_IP_RATE = float(os.environ.get('RATE_LIMIT_IP_RATE', '5'))  # 每个IP每秒补充的请求数，0表示不限流
+    RATE_LIMIT_IP_BURST = int(os.environ.get('RATE_LIMIT_IP_BURST', '50'))  # 每个IP允许的突发请求数
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', '0'))  # 应用前面的反向代理层数，按X-Forwarded-For取客户端IP，0表示直接使用连接地址
+    PROVIDER_CONCURRENCY = int(os.environ.get('PROVIDER_CONCURRENCY', '8'))  # 每个服务商同时进行的调用数（LLM、语音识别和语音合成共享），0表示不限制
+    # 单独设置某个服务商的并发数：PROVIDER_CONCURRENCY_<服务商>=数量，例如 PROVIDER_CONCURRENCY_OLLAMA=2
+    PROVIDER_CONCURRENCY_LIMITS = {
+        key[len('PROVIDER_CONCURRENCY_'):].lower(): int(value)
+        for key, value in os.environ.items()
+        if key.startswith('PROVIDER_CONCURRENCY_') and value
+    }
+    ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE', '32'))  # 每个服务商的最大排队数，排满时立即返回503
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '5'))  # 每个请求等待调用名额的最长时间（秒），超过时返回503
+
+    # 共享状态配置：多个工作进程共享对话历史、缓存索引和限流计数
+    STATE_BACKEND = (os.environ.get('STATE_BACKEND') or 'local').lower()  # 可选: local（各进程独立）, memory（进程内的共享状态实现，用于开发测试）, redis
+    STATE_REDIS_URL = os.environ.get('STATE_REDIS_URL') or 'redis://localhost:6379/0'
+    STATE_KEY_PREFIX = os.environ.get('STATE_KEY_PREFIX', 'sakuratalk:')  # 所有键的前缀
+    STATE_POOL_SIZE = int(os.environ.get('STATE_POOL_SIZE', '16'))  # 连接池中保留的空闲连接数
+    STATE_TIMEOUT = float(os.environ.get('STATE_TIMEOUT', '2'))  # 连接和读写超时（秒）
+    STATE_CACHE_TTL = int(os.environ.get('STATE_CACHE_TTL', '86400'))  # 共享的语法纠错缓存的保留时间（秒）
+
+    # 日志配置
+    LOG_LEVEL = (os.environ.get('LOG_LEVEL') or 'INFO').upper()
+    LOG_FORMAT = (os.environ.get('LOG_FORMAT') or 'json').lower()  # 可选: json, text
+    LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', '0.01'))  # 记录完整请求/响应内容的比例
+    LOG_PAYLOAD_MAX_CHARS = int(os.environ.get('LOG_PAYLOAD_MAX_CHARS', '500'))  # 记录内容的最大长度
+
+    # 链路追踪配置
+    TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', 'none').lower()  # 可选: none, file, otlp, console
+    TRACING_FILE = os.environ.get('TRACING_FILE') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'traces', 'spans.jsonl')
+    OTLP_ENDPOINT = os.environ.get('OTLP_ENDPOINT') or 'http://localhost:4318/v1/traces'
+    TRACING_SERVICE_NAME = os.environ.get('TRACING_SERVICE_NAME') or 'sakuratalk'
 
     # HTTPS配置
     USE_HTTPS = os.environ.get('USE_HTTPS', 'false').lower() == 'true'
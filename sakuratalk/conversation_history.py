@@ -1,12 +1,103 @@
 import json
+import threading
+import time
+import zlib
 from collections import deque
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
+from .shared_state import StateStore
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 历史提示（LLM消息的第一条）
+HISTORY_HEADER = '以下是你与用户的历史对话记录，按时间顺序排列（较早的记录在前）：'
+
+
+def _header_messages(summary: str) -> List[Dict[str, str]]:
+    messages = [{'role': 'system', 'content': HISTORY_HEADER}]
+    if summary:
+        messages.append({'role': 'system', 'content': f'更早的对话摘要：{summary}'})
+    return messages
+
+
+def _interaction_messages(user: str, ai: str) -> List[Dict[str, str]]:
+    # 时间戳不发给模型（曾经的格式：f"[时间: {timestamp}] {user}"）
+    return [
+        {'role': 'user', 'content': f"{user}"},
+        {'role': 'assistant', 'content': f" {ai}"}
+    ]
+
+
+def format_history_for_llm(history, summary: str) -> List[Dict[str, str]]:
+    """
+    将交互记录格式化为LLM对话消息
+    
+    :param history: 交互记录（按时间顺序）
+    :param summary: 更早对话的摘要
+    :return: 格式化的对话历史列表，适用于LLM API
+    """
+    if not history:
+        return []
+        
+    formatted_history = _header_messages(summary)
+    for interaction in history:
+        formatted_history.extend(_interaction_messages(interaction['user'], interaction['ai']))
+    return formatted_history
+
+
+def _pack(records: List[list]) -> Tuple[str, bytes]:
+    """
+    压缩交互记录，有zstandard时使用zstd，否则使用zlib
+    
+    :return: (压缩算法, 压缩后的数据)
+    """
+    data = json.dumps(records, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor().compress(data)
+    return 'zlib', zlib.compress(data)
+
+
+def _unpack(codec: str, data: bytes) -> List[list]:
+    if codec == 'zstd':
+        data = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        data = zlib.decompress(data)
+    return json.loads(data)
+
+
+class Interaction:
+    """
+    一次用户与AI的交互记录（时间戳为Unix时间）
+    """
+    __slots__ = ('timestamp', 'user', 'ai')
+
+    def __init__(self, user: str, ai: str, timestamp: Optional[float] = None):
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.user = user
+        self.ai = ai
+
+    def to_dict(self) -> Dict[str, str]:
+        """
+        转换为字典（时间戳为ISO格式，与之前的记录格式相同）
+        """
+        return {
+            'timestamp': datetime.fromtimestamp(self.timestamp).isoformat(),
+            'user': self.user,
+            'ai': self.ai
+        }
+
 
 class ConversationHistory:
     """
     对话历史管理类，用于存储和管理用户与AI助手的对话记录
+    
+    交互记录使用紧凑的 Interaction 对象保存；LLM格式的消息列表在第一次读取时生成并缓存，
+    之后只随新增的交互增量更新。一段时间没有访问的历史可以压缩保存（compress_if_idle），
+    下次访问时自动解压。
     """
     def __init__(self, max_history: int = 10):
         """
@@ -16,6 +107,25 @@ class ConversationHistory:
         """
         self.max_history = max_history
         self.history = deque(maxlen=max_history)
+        # 历史版本号，每次修改时递增，用于判断基于旧历史生成的结果是否仍然有效
+        self.revision = 0
+        # 超出最大历史记录数而移出的交互记录（等待后台生成摘要），以及更早对话的摘要
+        self.evicted = []
+        self.summary = ''
+        # 缓存的LLM格式消息列表（None表示需要重新生成）
+        self._messages: Optional[List[Dict[str, str]]] = None
+        # 压缩保存的交互记录：(压缩算法, 数据, 记录数)
+        self._packed: Optional[Tuple[str, bytes, int]] = None
+        self._last_access = time.monotonic()
+        self._lock = threading.RLock()
+    
+    def _load(self) -> None:
+        # 调用方持有锁：记录访问时间，解压被压缩的交互记录
+        self._last_access = time.monotonic()
+        if self._packed is not None:
+            codec, data, _ = self._packed
+            self.history.extend(Interaction(user, ai, timestamp) for timestamp, user, ai in _unpack(codec, data))
+            self._packed = None
     
     def add_interaction(self, user_input: str, ai_response: str) -> None:
         """
@@ -24,12 +134,19 @@ class ConversationHistory:
         :param user_input: 用户输入
         :param ai_response: AI回复（仅包含日语回复）
         """
-        interaction = {
-            'timestamp': datetime.now().isoformat(),
-            'user': user_input,
-            'ai': ai_response
-        }
-        self.history.append(interaction)
+        interaction = Interaction(user_input, ai_response)
+        with self._lock:
+            self._load()
+            if len(self.history) == self.max_history:
+                self.evicted.append(self.history[0].to_dict())
+                if self._messages is not None:
+                    # 移出最早一轮对应的两条消息（位于历史提示和摘要之后）
+                    start = 2 if self.summary else 1
+                    del self._messages[start:start + 2]
+            self.history.append(interaction)
+            if self._messages is not None:
+                self._messages.extend(_interaction_messages(user_input, ai_response))
+            self.revision += 1
     
     def get_history(self) -> List[Dict[str, str]]:
         """
@@ -37,52 +154,203 @@ class ConversationHistory:
         
         :return: 对话历史列表
         """
-        return list(self.history)
+        with self._lock:
+            self._load()
+            return [interaction.to_dict() for interaction in self.history]
+    
+    def take_evicted(self, min_count: int = 1) -> List[Dict[str, Any]]:
+        """
+        取出已移出的交互记录（用于生成摘要）
+        
+        :param min_count: 移出的记录少于该数量时不取出
+        :return: 交互记录列表
+        """
+        with self._lock:
+            if len(self.evicted) < min_count:
+                return []
+            evicted, self.evicted = self.evicted, []
+            return evicted
+    
+    def set_summary(self, summary: str) -> None:
+        """
+        更新更早对话的摘要，之后的LLM请求会带上该摘要
+        
+        :param summary: 摘要
+        """
+        with self._lock:
+            if self._messages is not None:
+                start = 2 if self.summary else 1
+                self._messages[:start] = _header_messages(summary)
+            self.summary = summary
     
     def get_history_for_llm(self) -> List[Dict[str, str]]:
         """
         获取用于LLM对话的格式化历史记录
         
+        返回的列表是新的，但其中的消息字典是缓存共享的，调用方不能修改。
+        
         :return: 格式化的对话历史列表，适用于LLM API
         """
-        if not self.history:
-            return []
-            
-        formatted_history = []
-        formatted_history.append({
-            'role': 'system',
-            'content': '以下是你与用户的历史对话记录，按时间顺序排列（较早的记录在前）：'
-        })
-        
-        for interaction in self.history:
-            # 添加用户消息
-            formatted_history.append({
-                'role': 'user',
-                'content': f"{interaction['user']}"
-            })
-            #'content': f"[时间: {interaction['timestamp']}] {interaction['user']}"
-            # 添加AI助手消息
-            formatted_history.append({
-                'role': 'assistant',
-                'content': f" {interaction['ai']}"
-            })
-            # 'content': f"[时间: {interaction['timestamp']}] {interaction['ai']}"
-        return formatted_history
+        with self._lock:
+            self._load()
+            if not self.history:
+                return []
+            if self._messages is None:
+                messages = _header_messages(self.summary)
+                for interaction in self.history:
+                    messages.extend(_interaction_messages(interaction.user, interaction.ai))
+                self._messages = messages
+            return list(self._messages)
     
     def clear_history(self) -> None:
         """
         清空对话历史
         """
-        self.history.clear()
+        with self._lock:
+            self.history.clear()
+            self.evicted = []
+            self.summary = ''
+            self._messages = None
+            self._packed = None
+            self._last_access = time.monotonic()
+            self.revision += 1
+    
+    @property
+    def compacted(self) -> bool:
+        """
+        交互记录当前是否处于压缩状态
+        """
+        return self._packed is not None
+    
+    def compact(self) -> int:
+        """
+        压缩保存交互记录并丢弃缓存的LLM消息，下次访问时自动解压
+        
+        :return: 压缩后的字节数，没有可压缩的记录时为0
+        """
+        with self._lock:
+            if self._packed is not None:
+                return len(self._packed[1])
+            if not self.history:
+                return 0
+            records = [[interaction.timestamp, interaction.user, interaction.ai] for interaction in self.history]
+            codec, data = _pack(records)
+            self._packed = (codec, data, len(records))
+            self.history.clear()
+            self._messages = None
+            return len(data)
+    
+    def compress_if_idle(self, idle_seconds: float) -> bool:
+        """
+        历史在指定时间内没有被访问时压缩保存
+        
+        :param idle_seconds: 空闲时间（秒）
+        :return: 是否进行了压缩
+        """
+        with self._lock:
+            if self._packed is not None or time.monotonic() - self._last_access < idle_seconds:
+                return False
+            return self.compact() > 0
     
     def __len__(self) -> int:
         """
         返回当前历史记录数量
         """
+        packed = self._packed
+        if packed is not None:
+            return packed[2]
         return len(self.history)
     
     def __str__(self) -> str:
         """
         字符串表示
         """
-        return json.dumps(list(self.history), ensure_ascii=False, indent=2)
\ No newline at end of file
+        return json.dumps(self.get_history(), ensure_ascii=False, indent=2)
+
+
+class SharedConversationHistory(ConversationHistory):
+    """
+    保存在共享状态存储中的对话历史：多个工作进程读写同一份历史，请求可以由任一进程处理
+    
+    交互记录为JSON列表，追加、截断和版本号递增在一个事务中完成，读取历史和摘要在一次往返中完成。
+    """
+    def __init__(self, store: StateStore, max_history: int = 10, namespace: str = 'history'):
+        """
+        初始化共享的对话历史
+        
+        :param store: 共享状态存储
+        :param max_history: 最大历史记录数
+        :param namespace: 键的命名空间
+        """
+        self.store = store
+        self.max_history = max_history
+        self._items_key = store.key(namespace, 'items')
+        self._evicted_key = store.key(namespace, 'evicted')
+        self._summary_key = store.key(namespace, 'summary')
+        self._revision_key = store.key(namespace, 'revision')
+    
+    @property
+    def revision(self) -> int:
+        return int(self.store.execute('GET', self._revision_key) or 0)
+    
+    @property
+    def summary(self) -> str:
+        return self.store.execute('GET', self._summary_key) or ''
+    
+    def add_interaction(self, user_input: str, ai_response: str) -> None:
+        interaction = json.dumps({
+            'timestamp': datetime.now().isoformat(),
+            'user': user_input,
+            'ai': ai_response
+        }, ensure_ascii=False)
+        _, evicted, _, _ = self.store.pipeline([
+            ('RPUSH', self._items_key, interaction),
+            ('LRANGE', self._items_key, 0, -(self.max_history + 1)),
+            ('LTRIM', self._items_key, -self.max_history, -1),
+            ('INCR', self._revision_key)
+        ], transaction=True)
+        if evicted:
+            # 截断与读取在同一事务中，每条移出的记录只会被一个进程取到
+            self.store.execute('RPUSH', self._evicted_key, *evicted)
+    
+    def get_history(self) -> List[Dict[str, str]]:
+        return [json.loads(item) for item in self.store.execute('LRANGE', self._items_key, 0, -1)]
+    
+    def take_evicted(self, min_count: int = 1) -> List[Dict[str, Any]]:
+        if self.store.execute('LLEN', self._evicted_key) < min_count:
+            return []
+        evicted, _ = self.store.pipeline([
+            ('LRANGE', self._evicted_key, 0, -1),
+            ('DEL', self._evicted_key)
+        ], transaction=True)
+        return [json.loads(item) for item in evicted]
+    
+    def set_summary(self, summary: str) -> None:
+        self.store.execute('SET', self._summary_key, summary)
+    
+    def get_history_for_llm(self) -> List[Dict[str, str]]:
+        items, summary = self.store.pipeline([
+            ('LRANGE', self._items_key, 0, -1),
+            ('GET', self._summary_key)
+        ])
+        return format_history_for_llm([json.loads(item) for item in items], summary or '')
+    
+    def clear_history(self) -> None:
+        self.store.pipeline([
+            ('DEL', self._items_key, self._evicted_key, self._summary_key),
+            ('INCR', self._revision_key)
+        ], transaction=True)
+    
+    @property
+    def compacted(self) -> bool:
+        return False
+    
+    def compact(self) -> int:
+        # 历史保存在共享存储中，进程内没有需要压缩的数据
+        return 0
+    
+    def compress_if_idle(self, idle_seconds: float) -> bool:
+        return False
+    
+    def __len__(self) -> int:
+        return self.store.execute('LLEN', self._items_key)
\ No newline at end of file
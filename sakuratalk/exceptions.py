@@ -16,4 +16,14 @@ class ConfigurationError(SakuraTalkException):
 
 class AudioProcessingError(SakuraTalkException):
     """音频处理异常"""
-    pass
\ No newline at end of file
+    pass
+class AdmissionRejected(SakuraTalkException):
+    """请求未通过准入控制（限流或服务商繁忙）"""
+    def __init__(self, message: str, status_code: int = 503, retry_after: float = 1.0):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class StateError(SakuraTalkException):
+    """共享状态存储（Redis等）访问异常"""
+    pass
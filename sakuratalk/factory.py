@@ -1,69 +1,262 @@
+import importlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
 from .config import Config
-from .exceptions import ServiceInitializationError
+from .exceptions import ConfigurationError, ServiceInitializationError
+
+logger = logging.getLogger(__name__)
+
+# 服务注册表：服务商名称 → "模块:类名"（模块相对于sakuratalk包）
+# 只有被选用的服务商才会导入对应模块及其SDK，未安装的可选SDK不会影响应用启动
 
 # LLM服务
-from .services.llm.dashscope_service import DashScopeService
-from .services.llm.openai_service import OpenAIService
-from .services.llm.gemini_service import GeminiService
-from .services.llm.ollama_service import OllamaService
+LLM_PROVIDERS = {
+    'dashscope': '.services.llm.dashscope_service:DashScopeService',
+    'openai': '.services.llm.openai_service:OpenAIService',
+    'gemini': '.services.llm.gemini_service:GeminiService',
+    'ollama': '.services.llm.ollama_service:OllamaService'
+}
 
 # STT服务
-from .services.stt.aliyun_stt_service import AliyunSTTService
-from .services.stt.local_stt_service import LocalSTTService
+STT_PROVIDERS = {
+    'dashscope': '.services.stt.aliyun_stt_service:AliyunSTTService',
+    'local': '.services.stt.local_stt_service:LocalSTTService'
+}
 
 # TTS服务
-from .services.tts.aliyun_tts_service import AliyunTTSService
-from .services.tts.local_tts_service import LocalTTSService
+TTS_PROVIDERS = {
+    'dashscope': '.services.tts.aliyun_tts_service:AliyunTTSService',
+    'local': '.services.tts.local_tts_service:LocalTTSService'
+}
+
+DEFAULT_PROVIDER = 'dashscope'
+
+# 启动耗时记录：每次导入和创建服务的耗时
+_startup_timings: List[Dict[str, Any]] = []
+_startup_lock = threading.Lock()
+
+
+def _record_timing(entry: Dict[str, Any]) -> None:
+    with _startup_lock:
+        _startup_timings.append(entry)
+
+
+def load_service_class(kind: str, provider: str, registry: Dict[str, str]):
+    """
+    按注册表导入服务类
+
+    :param kind: 服务类型（llm、stt、tts）
+    :param provider: 服务商名称，未注册时使用默认服务商
+    :param registry: 服务注册表
+    :return: 服务类
+    """
+    spec = registry.get(provider)
+    if spec is None:
+        logger.warning(f"未知的{kind}服务商 {provider}，使用默认服务商 {DEFAULT_PROVIDER}")
+        provider, spec = DEFAULT_PROVIDER, registry[DEFAULT_PROVIDER]
+    module_name, class_name = spec.split(':')
+    start = time.perf_counter()
+    try:
+        module = importlib.import_module(module_name, __package__)
+    except ImportError as e:
+        raise ServiceInitializationError(f"无法加载{kind}服务 {provider}，请确认已安装对应的SDK: {str(e)}") from e
+    _record_timing({
+        'kind': kind,
+        'provider': provider,
+        'stage': 'import',
+        'target': module.__name__,
+        'seconds': round(time.perf_counter() - start, 4)
+    })
+    return getattr(module, class_name)
+
+
+def _create_service(kind: str, provider: str, registry: Dict[str, str], **kwargs):
+    """
+    导入并创建服务实例，记录耗时
+    """
+    service_class = load_service_class(kind, provider, registry)
+    start = time.perf_counter()
+    service = service_class(**kwargs)
+    _record_timing({
+        'kind': kind,
+        'provider': provider,
+        'stage': 'construct',
+        'target': service_class.__name__,
+        'model': getattr(service, 'model_name', ''),
+        'seconds': round(time.perf_counter() - start, 4)
+    })
+    logger.info(f"已创建{kind}服务: {service_class.__name__} {getattr(service, 'model_name', '')}")
+    return service
+
+
+def get_startup_report() -> List[Dict[str, Any]]:
+    """
+    获取服务导入与创建的耗时记录
+
+    :return: 耗时记录列表
+    """
+    with _startup_lock:
+        return list(_startup_timings)
+
+
+class LazyService:
+    """
+    服务的延迟创建代理：首次访问服务的属性（或调用 load）时才导入并创建服务实例，
+    之后所有属性访问都转发给该实例
+    """
+    def __init__(self, create: Callable[[], Any], kind: str):
+        """
+        初始化延迟创建代理
+
+        :param create: 创建服务实例的函数
+        :param kind: 服务类型（llm、stt、tts）
+        """
+        self._create = create
+        self._kind = kind
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        获取服务实例，尚未创建时创建（线程安全，只创建一次）
+
+        :return: 服务实例
+        """
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._create()
+                instance = self._instance
+        return instance
+
+    @property
+    def loaded(self) -> bool:
+        """
+        服务实例是否已创建
+        """
+        return self._instance is not None
+
+    def __getattr__(self, name: str):
+        # 代理自身的属性和特殊方法不转发，避免在代理初始化完成前（例如复制时）无限递归
+        if name.startswith('__') or name in ('_create', '_kind', '_instance', '_lock'):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+
+class LLMServiceRegistry:
+    """
+    LLM服务注册表：每个（服务商, 模型）组合只创建一个服务实例（及其客户端），供所有请求共享
+    """
+    def __init__(self):
+        """
+        初始化LLM服务注册表
+        """
+        self._services: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, provider: Optional[str] = None, model: Optional[str] = None,
+                tier: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """
+        解析请求选择的服务商和模型
+
+        :param provider: 服务商名称，缺省时使用配置的默认服务商
+        :param model: 模型名称，缺省时使用服务商的默认模型
+        :param tier: 模型分级名称（LLM_TIER_<名称>），指定时优先于provider和model
+        :return: (服务商, 模型)
+        :raises ConfigurationError: 分级未配置，或服务商和模型不在允许使用的范围内
+        """
+        if tier:
+            spec = Config.LLM_TIERS.get(tier.lower())
+            if not spec:
+                raise ConfigurationError(f"未配置的模型分级: {tier}")
+            provider, _, model = spec.partition(':')
+        elif provider or model:
+            # 每个组合都会创建并常驻一个服务实例，只接受配置中列出的组合
+            provider = provider or Config.LLM_PROVIDER
+            if not self.allowed(provider, model):
+                raise ConfigurationError(f"不允许使用的模型: {provider}:{model or '默认模型'}")
+        # 未注册的服务商由 load_service_class 在创建实例时改用默认服务商
+        return provider or Config.LLM_PROVIDER, model or None
+
+    @staticmethod
+    def allowed(provider: str, model: Optional[str] = None) -> bool:
+        """
+        请求是否可以直接选择该服务商和模型：默认服务商的默认模型、已配置的分级和 LLM_ALLOWED_MODELS 中的组合
+
+        :param provider: 服务商名称
+        :param model: 模型名称，缺省表示服务商的默认模型
+        :return: 是否允许
+        """
+        specs = {Config.LLM_PROVIDER, *Config.LLM_TIERS.values(), *Config.LLM_ALLOWED_MODELS}
+        return (f'{provider}:{model}' if model else provider) in specs
+
+    def get(self, provider: Optional[str] = None, model: Optional[str] = None, tier: Optional[str] = None):
+        """
+        获取（必要时创建）服务实例
+
+        :param provider: 服务商名称
+        :param model: 模型名称
+        :param tier: 模型分级名称
+        :return: LLM服务实例
+        """
+        provider, model = self.resolve(provider, model, tier)
+        key = (provider, model or '')
+        service = self._services.get(key)
+        if service is None:
+            with self._lock:
+                service = self._services.get(key)
+                if service is None:
+                    service = _create_service('llm', provider, LLM_PROVIDERS, model_name=model)
+                    self._services[key] = service
+                    # 以实际模型名再登记一次，显式指定默认模型时也复用同一实例
+                    self._services.setdefault((provider, service.model_name), service)
+        return service
+
+    def warm_up_tiers(self) -> None:
+        """
+        创建并预热所有已配置分级的服务实例
+        """
+        for tier in Config.LLM_TIERS:
+            try:
+                self.get(tier=tier).warm_up()
+            except Exception as e:
+                logger.exception(f"模型分级 {tier} 预热失败: {str(e)}")
+
+    def loaded(self) -> List[Dict[str, str]]:
+        """
+        已创建的服务实例列表
+        """
+        with self._lock:
+            services = {id(service): service for service in self._services.values()}
+        return [{'provider': service.provider_name, 'model': service.model_name} for service in services.values()]
 
 
 class ServiceFactory:
     """
     服务工厂类，用于创建各种服务实例
     """
-    
+
     @staticmethod
     def create_llm_service():
         """
         创建LLM服务实例
         """
-        provider = Config.LLM_PROVIDER
+        return _create_service('llm', Config.LLM_PROVIDER, LLM_PROVIDERS)
 
-        service_map = {
-            'dashscope': DashScopeService,
-            'openai': OpenAIService,
-            'gemini': GeminiService,
-            'ollama': OllamaService
-        }
-
-        service_class = service_map.get(provider, DashScopeService)
-        return service_class()
-    
     @staticmethod
     def create_stt_service():
         """
         创建STT服务实例
         """
-        provider = Config.STT_PROVIDER
-
-        service_map = {
-            'dashscope': AliyunSTTService,
-            'local': LocalSTTService
-        }
+        return _create_service('stt', Config.STT_PROVIDER, STT_PROVIDERS)
 
-        service_class = service_map.get(provider, AliyunSTTService)
-        return service_class()
-    
     @staticmethod
     def create_tts_service():
         """
         创建TTS服务实例
         """
-        provider = Config.TTS_PROVIDER
-        
-        if provider == 'dashscope':
-            return AliyunTTSService()
-        elif provider == 'local':
-            return LocalTTSService()
-        else:
-            # 默认使用阿里云
-            return AliyunTTSService()
\ No newline at end of file
+        return _create_service('tts', Config.TTS_PROVIDER, TTS_PROVIDERS)
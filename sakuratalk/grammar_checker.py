@@ -0,0 +1,214 @@
+"""
+批量语法纠错：整段文本拆分成句子后，多个短句合并到一次模型请求中，其余请求在有限并发下并行执行，
+结果按规范化后的句子缓存
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import Config
+from .metrics import record_cache, timed
+from .shared_state import StateStore
+from .single_flight import SingleFlight
+from .tracing import bind_context
+
+logger = logging.getLogger(__name__)
+
+# 句子：到句末标点（或换行）为止
+_SENTENCE_PATTERN = re.compile(r'[^。！？!?\n]+[。！？!?]*')
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    将整段文本（例如对话记录）拆分成句子
+
+    :param text: 文本
+    :return: 句子列表（不含空句）
+    """
+    return [sentence.strip() for sentence in _SENTENCE_PATTERN.findall(text) if sentence.strip()]
+
+
+def clean_sentence(text: str) -> str:
+    """
+    去掉句子首尾空白，并将连续空白（含换行）合并为一个空格
+
+    :param text: 句子
+    :return: 发送给模型的句子
+    """
+    return ' '.join(text.split())
+
+
+def normalize_sentence(text: str) -> str:
+    """
+    规范化句子作为缓存键：统一全角/半角字符（NFKC）并合并空白
+
+    :param text: 句子
+    :return: 规范化后的句子
+    """
+    return clean_sentence(unicodedata.normalize('NFKC', text))
+
+
+class GrammarChecker:
+    """
+    批量语法纠错器（所有请求共享同一个线程池，限制同时进行的模型请求数）
+    """
+    def __init__(self, batch_size: Optional[int] = None, batch_max_chars: Optional[int] = None,
+                 max_concurrency: Optional[int] = None, cache_size: Optional[int] = None,
+                 store: Optional[StateStore] = None):
+        """
+        初始化批量语法纠错器
+
+        :param batch_size: 一次请求中检查的最大句子数
+        :param batch_max_chars: 一次请求中句子的最大总字数
+        :param max_concurrency: 同时进行的模型请求数
+        :param cache_size: 内存中缓存的纠错结果数量
+        :param store: 共享状态存储，提供时纠错结果缓存在其中（多个进程共享），否则缓存在本进程内存中
+        """
+        self.batch_size = max(1, batch_size or Config.GRAMMAR_BATCH_SIZE)
+        self.batch_max_chars = batch_max_chars or Config.GRAMMAR_BATCH_MAX_CHARS
+        self.cache_size = cache_size or Config.GRAMMAR_CACHE_SIZE
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency or Config.GRAMMAR_MAX_CONCURRENCY,
+                                            thread_name_prefix='grammar')
+        self.store = store
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # 相同句子的并发纠错请求只调用一次模型
+        self._flight = SingleFlight('grammar_single_flight')
+
+    def _store_key(self, key: Tuple[str, str, str]) -> str:
+        provider, model, sentence = key
+        return self.store.key('grammar', provider, model, hashlib.sha1(sentence.encode('utf-8')).hexdigest())
+
+    def _cache_get_many(self, keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], Dict[str, Any]]:
+        """
+        批量查询缓存（共享存储时一次MGET）
+
+        :return: 命中的键 -> 纠错结果
+        """
+        if self.store is not None:
+            values = self.store.execute('MGET', *[self._store_key(key) for key in keys]) if keys else []
+            found = {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+        else:
+            found = {}
+            with self._lock:
+                for key in keys:
+                    result = self._cache.get(key)
+                    if result is not None:
+                        self._cache.move_to_end(key)
+                        found[key] = result
+        for key in keys:
+            record_cache('grammar', key in found)
+        return found
+
+    def _cache_put_many(self, results: Dict[Tuple[str, str, str], Dict[str, Any]]) -> None:
+        """
+        批量写入缓存（共享存储时通过管道一次往返）
+        """
+        if self.store is not None:
+            self.store.pipeline([
+                ('SET', self._store_key(key), json.dumps(result, ensure_ascii=False), 'EX', Config.STATE_CACHE_TTL)
+                for key, result in results.items()
+            ])
+            return
+        with self._lock:
+            for key, result in results.items():
+                self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _pack(self, sentences: List[str]) -> List[List[str]]:
+        """
+        将句子按数量和总字数合并成批，超过字数上限的句子单独成批
+        """
+        batches, current, chars = [], [], 0
+        for sentence in sentences:
+            if current and (len(current) >= self.batch_size or chars + len(sentence) > self.batch_max_chars):
+                batches.append(current)
+                current, chars = [], 0
+            current.append(sentence)
+            chars += len(sentence)
+        if current:
+            batches.append(current)
+        return batches
+
+    def _correct_one(self, service, sentence: str) -> Dict[str, Any]:
+        key = (service.provider_name, service.model_name, normalize_sentence(sentence))
+        return self._flight.do(key, service.correct_grammar, sentence)
+
+    def _correct_batch(self, service, batch: List[str]) -> List[Dict[str, Any]]:
+        """
+        检查一批句子；批量结果不可用时返回None，由调用方改为逐句检查
+        """
+        if len(batch) == 1:
+            return [self._correct_one(service, batch[0])]
+        response = service.correct_grammar_batch(batch)
+        if 'error' in response:
+            return None
+        return response['results']
+
+    def check(self, sentences: List[str], service) -> Dict[str, Any]:
+        """
+        检查多个句子的语法
+
+        :param sentences: 句子列表
+        :param service: 使用的LLM服务
+        :return: 与输入顺序一致的逐句结果，以及缓存命中和模型请求次数的统计
+        """
+        cleaned = [clean_sentence(sentence) for sentence in sentences]
+        keys = [(service.provider_name, service.model_name, normalize_sentence(sentence)) for sentence in cleaned]
+
+        unique: Dict[Tuple[str, str, str], str] = {}
+        for key, sentence in zip(keys, cleaned):
+            if key[2] and key not in unique:
+                unique[key] = sentence
+        results = self._cache_get_many(list(unique))
+        cached_keys = set(results)
+        pending = {key: sentence for key, sentence in unique.items() if key not in results}
+
+        key_by_sentence = {sentence: key for key, sentence in pending.items()}
+        model_requests = 0
+        with timed('grammar_check', service.provider_name, service.model_name):
+            futures = {}
+            for batch in self._pack(list(pending.values())):
+                futures[self._executor.submit(bind_context(self._correct_batch), service, batch)] = batch
+                model_requests += 1
+            retry_sentences = []
+            for future in as_completed(futures):
+                batch = futures[future]
+                batch_results = future.result()
+                if batch_results is None:
+                    # 批量结果与输入不一致时逐句重试，保证每句结果都对应正确的句子
+                    retry_sentences.extend(batch)
+                    continue
+                for sentence, result in zip(batch, batch_results):
+                    results[key_by_sentence[sentence]] = result
+
+            retry_futures = {
+                self._executor.submit(bind_context(self._correct_one), service, sentence): sentence
+                for sentence in retry_sentences
+            }
+            model_requests += len(retry_futures)
+            for future in as_completed(retry_futures):
+                results[key_by_sentence[retry_futures[future]]] = future.result()
+
+        self._cache_put_many({key: results[key] for key in pending if 'error' not in results[key]})
+
+        items = []
+        for sentence, key in zip(sentences, keys):
+            result = results.get(key, {'corrected_text': '', 'errors': [], 'suggestions': []})
+            items.append({'text': sentence, **result, 'cached': key in cached_keys})
+        return {
+            'results': items,
+            'stats': {
+                'sentences': len(sentences),
+                'unique': len(results),
+                'cache_hits': len(cached_keys),
+                'model_requests': model_requests
+            }
+        }
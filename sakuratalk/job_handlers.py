@@ -0,0 +1,187 @@
+"""
+后台任务的处理函数：对话历史摘要、语音预合成、批量发音评分报告，以及周期执行的文件清理和对话历史压缩
+
+处理函数需要的服务和状态在创建时传入，由 register 注册到任务队列（见 jobs.py）。
+处理函数抛出异常时任务按指数退避重试。
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from .config import Config
+from .jobs import JobQueue, PRIORITY_NORMAL
+from .services.pronunciation.batch_scorer import score_batch
+from .services.tts.tts_base import TTSBaseService
+
+logger = logging.getLogger(__name__)
+
+
+def remove_older_than(directory: str, max_age: float) -> int:
+    """
+    删除目录中修改时间早于max_age秒之前的文件和子目录
+
+    :param directory: 目录
+    :param max_age: 保留时间（秒）
+    :return: 删除的数量
+    """
+    if not os.path.isdir(directory):
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for entry in os.scandir(directory):
+        try:
+            if entry.stat().st_mtime >= cutoff:
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
+            removed += 1
+        except OSError as e:
+            logger.warning(f"清理文件失败: {entry.path}: {str(e)}")
+    return removed
+
+
+class JobHandlers:
+    """
+    后台任务的处理函数及其依赖的服务和状态
+    """
+    def __init__(self, job_queue: JobQueue, conversation_history, ai_service, admission,
+                 synthesize: Callable[..., Dict[str, Any]], presynthesized_audio, pronunciation_scorer,
+                 audio_server, analytics=None, state_store=None):
+        """
+        初始化后台任务的处理函数
+
+        :param job_queue: 任务队列
+        :param conversation_history: 对话历史
+        :param ai_service: 生成对话摘要的LLM服务
+        :param admission: 准入控制，调用服务商接口前获取调用名额
+        :param synthesize: 合成语音的函数（参数为文本和audio_format）
+        :param presynthesized_audio: 预合成语音的索引
+        :param pronunciation_scorer: 发音评分器
+        :param audio_server: 合成音频的文件服务（清理后清空其缓存）
+        :param analytics: 学习统计，未启用时为None
+        :param state_store: 共享状态存储，各进程独立保存状态时为None
+        """
+        self.job_queue = job_queue
+        self.conversation_history = conversation_history
+        self.ai_service = ai_service
+        self.admission = admission
+        self.synthesize = synthesize
+        self.presynthesized_audio = presynthesized_audio
+        self.pronunciation_scorer = pronunciation_scorer
+        self.audio_server = audio_server
+        self.analytics = analytics
+        self.state_store = state_store
+        # 本进程的对话历史标识：重启后，上一个进程留下的摘要任务不会写入新的对话历史
+        self._history_instance = uuid.uuid4().hex
+        self._summary_lock = threading.Lock()
+
+    def register(self) -> None:
+        """
+        注册处理函数和周期任务
+        """
+        self.job_queue.register('summarize_history', self.summarize_history)
+        self.job_queue.register('synthesize_audio', self.synthesize_audio)
+        self.job_queue.register('pronunciation_report', self.pronunciation_report)
+        self.job_queue.register('cleanup', self.cleanup)
+        self.job_queue.register('compact_history', self.compact_history)
+        self.job_queue.every('cleanup', Config.AUDIO_CLEANUP_INTERVAL)
+        if Config.HISTORY_COMPACT_IDLE > 0 and self.state_store is None:
+            self.job_queue.every('compact_history', Config.HISTORY_COMPACT_IDLE)
+
+    def history_id(self) -> str:
+        """
+        对话历史的标识：本进程内的历史在重启后重置，使用本进程的标识；
+        共享的历史不随进程重启而重置，所有进程使用第一个进程写入的标识
+        """
+        if self.state_store is None:
+            return self._history_instance
+        key = self.state_store.key('history', 'instance')
+        return self.state_store.pipeline([('SET', key, self._history_instance, 'NX'), ('GET', key)])[1]
+
+    def summary_guard(self):
+        """
+        合并对话摘要时持有的锁：本进程内的历史使用进程内的锁，共享的历史使用共享存储中的锁
+        """
+        if self.state_store is None:
+            return self._summary_lock
+        return self.state_store.lock('history:summary', ttl=Config.HISTORY_SUMMARY_LOCK_TTL)
+
+    def schedule_history_summary(self) -> None:
+        """
+        移出对话历史的交互达到一定轮数时，提交后台任务将其并入摘要
+        """
+        if Config.HISTORY_SUMMARY_BATCH <= 0:
+            return
+        evicted = self.conversation_history.take_evicted(Config.HISTORY_SUMMARY_BATCH)
+        if evicted:
+            self.job_queue.enqueue('summarize_history', {
+                'instance': self.history_id(),
+                'interactions': [{'user': item['user'], 'ai': item['ai']} for item in evicted]
+            }, PRIORITY_NORMAL)
+
+    def summarize_history(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        后台任务：将移出对话历史的交互与之前的摘要合并成新的摘要
+        """
+        if payload.get('instance') != self.history_id():
+            return {'skipped': '对话历史已重置'}
+        # 依次合并，避免并发的摘要任务互相覆盖；共享的历史由所有进程的任务共用一把锁
+        with self.summary_guard():
+            previous = self.conversation_history.summary
+            with self.admission.slot(self.ai_service.provider_name):
+                result = self.ai_service.summarize(previous, payload['interactions'])
+            if 'error' in result:
+                raise RuntimeError(result['error'])
+            if self.conversation_history.summary != previous:
+                # 模型调用超过锁的过期时间、期间摘要已被其他任务更新：重试时基于新的摘要合并
+                raise RuntimeError('对话摘要已被其他任务更新')
+            self.conversation_history.set_summary(result['summary'])
+        return {'summary': result['summary']}
+
+    def synthesize_audio(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        后台任务：预先合成语音（例如建议句子），之后相同文本的合成请求直接使用
+        """
+        text, audio_format = payload['text'], TTSBaseService._resolve_format(payload.get('format'))
+        cached = self.presynthesized_audio.get(text, audio_format)
+        if cached is None:
+            cached = self.synthesize(text, audio_format=audio_format)
+            if 'error' in cached:
+                raise RuntimeError(cached['error'])
+            self.presynthesized_audio.put(text, cached, audio_format)
+        return {'audio_url': cached['audio_url'], 'format': cached['format']}
+
+    def pronunciation_report(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        后台任务：批量发音评分报告，完成后删除上传的录音
+        """
+        report = score_batch(self.pronunciation_scorer, payload['items'])
+        shutil.rmtree(payload['upload_dir'], ignore_errors=True)
+        return report
+
+    def cleanup(self, payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        周期任务：清理过期的合成音频、后台任务的上传文件、已结束的任务记录和过期的学习统计分区
+        """
+        retention = Config.AUDIO_RETENTION_HOURS * 3600
+        audio_files = remove_older_than(TTSBaseService.AUDIO_DIR, retention)
+        if audio_files:
+            self.audio_server.clear()
+        return {
+            'audio_files': audio_files,
+            'upload_dirs': remove_older_than(Config.JOB_UPLOAD_DIR, retention),
+            'jobs': self.job_queue.purge(Config.JOB_RETENTION_DAYS * 86400),
+            'analytics_partitions': self.analytics.purge(Config.ANALYTICS_RETENTION_DAYS) if self.analytics is not None else 0
+        }
+
+    def compact_history(self, payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        周期任务：压缩长时间没有访问的对话历史
+        """
+        return {'compacted': self.conversation_history.compress_if_idle(Config.HISTORY_COMPACT_IDLE)}
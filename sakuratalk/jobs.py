@@ -0,0 +1,361 @@
+"""
+进程内的后台任务队列：任务持久化在SQLite中，由后台线程按优先级执行，失败后按指数退避重试
+
+用于不需要在请求中完成的工作（对话历史摘要、建议句子的语音预合成、批量发音评分报告、音频文件清理），
+交互请求的延迟不包含这些工作。应用重启后，未完成的任务会继续执行。
+
+多个进程可以共用同一个数据库：取出任务的进程持有一段时间的租约并定期续期，
+只有租约过期（进程退出或卡住）的执行中任务才会被其他进程重新执行。
+"""
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import Config
+from .metrics import JOBS, JOB_QUEUE_DEPTH, timed
+
+logger = logging.getLogger(__name__)
+
+# 任务优先级：数值越大越先执行
+PRIORITY_HIGH = 10  # 有用户在等待结果（例如批量评分报告）
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 0  # 预合成、清理等可以推迟的工作
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    dedupe_key TEXT,
+    owner TEXT,
+    lease_until REAL,
+    result TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority DESC, run_after, id);
+CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key, status);
+"""
+
+# 旧版本数据库中没有的列
+_MIGRATIONS = {
+    'owner': 'ALTER TABLE jobs ADD COLUMN owner TEXT',
+    'lease_until': 'ALTER TABLE jobs ADD COLUMN lease_until REAL'
+}
+
+
+class JobQueue:
+    """
+    基于SQLite的后台任务队列
+    """
+    def __init__(self, db_path: Optional[str] = None, workers: Optional[int] = None,
+                 max_attempts: Optional[int] = None, retry_delay: Optional[float] = None,
+                 poll_interval: float = 1.0, lease: Optional[float] = None):
+        """
+        初始化任务队列
+
+        :param db_path: SQLite数据库文件路径
+        :param workers: 执行任务的线程数
+        :param max_attempts: 任务的默认最大尝试次数
+        :param retry_delay: 首次重试的等待时间（秒），之后每次翻倍
+        :param poll_interval: 空闲时检查延迟任务的间隔（秒）
+        :param lease: 执行中任务的租约时长（秒），执行期间定期续期
+        """
+        self.db_path = db_path or Config.JOB_QUEUE_DB
+        self.workers = Config.JOB_WORKERS if workers is None else workers
+        self.max_attempts = max_attempts or Config.JOB_MAX_ATTEMPTS
+        self.retry_delay = Config.JOB_RETRY_DELAY if retry_delay is None else retry_delay
+        self.poll_interval = poll_interval
+        self.lease = lease or Config.JOB_LEASE_SECONDS
+        # 本进程的标识，记录在取出的任务上
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._periodic: List[Dict[str, Any]] = []
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    # ---------- 存储 ----------
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        获取当前线程的数据库连接（首次使用时创建表）
+        """
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+                    conn = sqlite3.connect(self.db_path, timeout=30)
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.executescript(_SCHEMA)
+                    columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+                    for column, statement in _MIGRATIONS.items():
+                        if column not in columns:
+                            conn.execute(statement)
+                    conn.commit()
+                    conn.close()
+                    self._initialized = True
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            # WAL模式下NORMAL同步级别不会损坏数据库，提交时无需等待fsync
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # ---------- 注册与提交 ----------
+
+    def register(self, kind: str, handler: Callable[[Dict[str, Any]], Any]) -> None:
+        """
+        注册任务处理函数
+
+        :param kind: 任务类型
+        :param handler: 处理函数，参数为任务数据，返回值（可JSON序列化）作为任务结果；抛出异常时重试
+        """
+        self._handlers[kind] = handler
+
+    def every(self, kind: str, interval: float, payload: Optional[Dict[str, Any]] = None,
+              priority: int = PRIORITY_LOW) -> None:
+        """
+        注册周期任务：启动时及之后每隔interval秒提交一次（上一次尚未完成时不重复提交）
+
+        :param kind: 任务类型
+        :param interval: 间隔（秒）
+        :param payload: 任务数据
+        :param priority: 优先级
+        """
+        self._periodic.append({'kind': kind, 'interval': interval, 'payload': payload or {},
+                               'priority': priority, 'next_run': 0.0})
+
+    def enqueue(self, kind: str, payload: Optional[Dict[str, Any]] = None, priority: int = PRIORITY_NORMAL,
+                delay: float = 0, max_attempts: Optional[int] = None, dedupe_key: Optional[str] = None) -> int:
+        """
+        提交任务
+
+        :param kind: 任务类型
+        :param payload: 任务数据（可JSON序列化）
+        :param priority: 优先级，数值越大越先执行
+        :param delay: 延迟执行的时间（秒）
+        :param max_attempts: 最大尝试次数，缺省时使用默认值
+        :param dedupe_key: 去重键，相同键的任务尚未完成时不重复提交，返回已有任务的ID
+        :return: 任务ID
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if dedupe_key:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE dedupe_key = ? AND status IN ('queued', 'running')", (dedupe_key,)
+                ).fetchone()
+                if row:
+                    conn.execute('COMMIT')
+                    return row['id']
+            cursor = conn.execute(
+                'INSERT INTO jobs (kind, payload, priority, max_attempts, run_after, dedupe_key, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (kind, json.dumps(payload or {}, ensure_ascii=False), priority, max_attempts or self.max_attempts,
+                 now + delay, dedupe_key, now, now)
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        JOBS.labels(kind, 'queued').inc()
+        with self._wakeup:
+            self._wakeup.notify()
+        return cursor.lastrowid
+
+    # ---------- 查询 ----------
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """
+        查询任务状态
+
+        :param job_id: 任务ID
+        :return: 任务信息（status为queued、running、done或failed），不存在时返回None
+        """
+        row = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'priority': row['priority'],
+            'attempts': row['attempts'],
+            'max_attempts': row['max_attempts'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['last_error'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        }
+
+    def depth(self) -> Dict[str, int]:
+        """
+        各状态的任务数量
+        """
+        rows = self._connection().execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status').fetchall()
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        counts.update({row['status']: row['n'] for row in rows})
+        for status, count in counts.items():
+            JOB_QUEUE_DEPTH.labels(status).set(count)
+        return counts
+
+    def purge(self, older_than: float) -> int:
+        """
+        删除已结束（完成或失败）且超过保留时间的任务
+
+        :param older_than: 保留时间（秒）
+        :return: 删除的任务数
+        """
+        cursor = self._connection().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (time.time() - older_than,)
+        )
+        return cursor.rowcount
+
+    # ---------- 执行 ----------
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """
+        取出一个可执行的任务（排队中的任务，或租约已过期的执行中任务）并标记为由本进程执行
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE (status = 'queued' AND run_after <= ?) "
+                "OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?)) "
+                "ORDER BY priority DESC, id LIMIT 1", (now, now)
+            ).fetchone()
+            if row is not None:
+                if row['status'] == 'running':
+                    logger.warning(f"后台任务 {row['kind']}#{row['id']} 的租约已过期（{row['owner']}），重新执行")
+                conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, owner = ?, lease_until = ?, "
+                             "updated_at = ? WHERE id = ?", (self.owner, now + self.lease, now, row['id']))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return row
+
+    def _finish(self, job_id: int, status: str, result: Any = None, error: Optional[str] = None,
+                run_after: Optional[float] = None) -> None:
+        now = time.time()
+        # 租约过期后任务可能已由其他进程重新取出，此时不覆盖其状态
+        cursor = self._connection().execute(
+            'UPDATE jobs SET status = ?, result = ?, last_error = ?, run_after = COALESCE(?, run_after), '
+            'owner = NULL, lease_until = NULL, updated_at = ? '
+            "WHERE id = ? AND status = 'running' AND owner = ?",
+            (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, run_after, now,
+             job_id, self.owner)
+        )
+        if not cursor.rowcount:
+            logger.warning(f"后台任务#{job_id} 已由其他进程接管，丢弃本次执行结果")
+
+    def _renew_leases(self) -> None:
+        """
+        为本进程执行中的任务续期
+        """
+        now = time.time()
+        self._connection().execute(
+            "UPDATE jobs SET lease_until = ? WHERE status = 'running' AND owner = ?", (now + self.lease, self.owner)
+        )
+
+    def run_once(self) -> bool:
+        """
+        执行一个可执行的任务
+
+        :return: 是否执行了任务
+        """
+        row = self._claim()
+        if row is None:
+            return False
+        kind, attempts = row['kind'], row['attempts'] + 1
+        handler = self._handlers.get(kind)
+        try:
+            if handler is None:
+                raise LookupError(f"未注册的任务类型: {kind}")
+            with timed(f'job_{kind}'):
+                result = handler(json.loads(row['payload']))
+            self._finish(row['id'], 'done', result)
+            JOBS.labels(kind, 'done').inc()
+        except Exception as e:
+            if attempts < row['max_attempts']:
+                delay = self.retry_delay * (2 ** (attempts - 1))
+                logger.warning(f"后台任务 {kind}#{row['id']} 第{attempts}次执行失败，{delay:.0f}秒后重试: {str(e)}")
+                self._finish(row['id'], 'queued', error=str(e), run_after=time.time() + delay)
+                JOBS.labels(kind, 'retried').inc()
+            else:
+                logger.error(f"后台任务 {kind}#{row['id']} 执行失败: {str(e)}")
+                self._finish(row['id'], 'failed', error=str(e))
+                JOBS.labels(kind, 'failed').inc()
+        return True
+
+    def _worker_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except sqlite3.Error as e:
+                logger.exception(f"后台任务队列读写失败: {str(e)}")
+            with self._wakeup:
+                self._wakeup.wait(self.poll_interval)
+
+    def _scheduler_loop(self) -> None:
+        while not self._stop.is_set():
+            now = time.time()
+            try:
+                for periodic in self._periodic:
+                    if now >= periodic['next_run']:
+                        self.enqueue(periodic['kind'], periodic['payload'], periodic['priority'],
+                                     dedupe_key=f"periodic:{periodic['kind']}")
+                        periodic['next_run'] = now + periodic['interval']
+                self._renew_leases()
+                self.depth()
+            except sqlite3.Error as e:
+                logger.exception(f"后台任务队列读写失败: {str(e)}")
+            # 续期间隔远小于租约时长
+            self._stop.wait(min(self.poll_interval * 5, self.lease / 3))
+
+    def start(self) -> None:
+        """
+        启动执行线程和周期任务线程；上次退出时执行中的任务在租约过期后重新执行
+        """
+        if self._threads or self.workers <= 0:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True))
+        self._threads.append(threading.Thread(target=self._scheduler_loop, name='job-scheduler', daemon=True))
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"后台任务队列已启动: {self.workers} 个执行线程，数据库 {self.db_path}")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        停止执行线程（正在执行的任务会执行完）
+        """
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
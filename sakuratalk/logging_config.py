@@ -0,0 +1,106 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+from opentelemetry import trace
+
+from .config import Config
+
+# 所有模块的logger都挂在该logger之下（logging.getLogger(__name__)）
+ROOT_LOGGER_NAME = 'sakuratalk'
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    结构化JSON日志格式，每条日志一行；通过 extra={'fields': {...}} 传入的字段会合并到记录中
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        trace_id = getattr(record, 'trace_id', None)
+        if trace_id:
+            entry['trace_id'] = trace_id
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    文本日志格式，附加的结构化字段以 key=value 形式追加在消息后
+    """
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            message += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return message
+
+
+class TraceContextQueueHandler(QueueHandler):
+    """
+    非阻塞的队列日志处理器：在调用线程中只记录当前trace_id并入队，格式化和输出由后台线程完成
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        span_context = trace.get_current_span().get_span_context()
+        if span_context.is_valid:
+            record.trace_id = format(span_context.trace_id, '032x')
+        # 提前合并消息参数，避免在后台线程中访问可能已变化的对象
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging() -> None:
+    """
+    初始化共享的日志配置（可重复调用，只生效一次）
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    root_logger = logging.getLogger(ROOT_LOGGER_NAME)
+    root_logger.setLevel(Config.LOG_LEVEL)
+    root_logger.propagate = False
+
+    output_handler = logging.StreamHandler(sys.stderr)
+    output_handler.setFormatter(JsonFormatter() if Config.LOG_FORMAT == 'json' else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    root_logger.handlers = [TraceContextQueueHandler(log_queue)]
+    _listener = QueueListener(log_queue, output_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def sample_payload(payload: Any) -> Optional[str]:
+    """
+    按配置的采样率决定是否记录完整请求/响应内容，并截断过长的内容
+
+    :param payload: 请求或响应内容
+    :return: 截断后的内容文本，未被采样时返回None
+    """
+    if Config.LOG_PAYLOAD_SAMPLE_RATE <= 0 or random.random() >= Config.LOG_PAYLOAD_SAMPLE_RATE:
+        return None
+    text = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False, default=str)
+    if len(text) > Config.LOG_PAYLOAD_MAX_CHARS:
+        return text[:Config.LOG_PAYLOAD_MAX_CHARS] + f'...({len(text)} chars)'
+    return text
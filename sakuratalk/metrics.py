@@ -0,0 +1,132 @@
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# 覆盖从毫秒级本地处理到数十秒模型调用的延迟分桶
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_DURATION = Histogram(
+    'sakuratalk_stage_duration_seconds',
+    '各处理阶段的耗时（历史格式化、模型调用、JSON解析、语音合成、文件写入、语音识别等）',
+    ['stage', 'provider', 'model'],
+    buckets=LATENCY_BUCKETS
+)
+
+REQUEST_DURATION = Histogram(
+    'sakuratalk_request_duration_seconds',
+    'HTTP请求的总耗时',
+    ['endpoint', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+
+LLM_TOKENS = Counter(
+    'sakuratalk_llm_tokens_total',
+    'LLM调用消耗的token数量',
+    ['provider', 'model', 'type']
+)
+
+CACHE_REQUESTS = Counter(
+    'sakuratalk_cache_requests_total',
+    '缓存（及请求合并）的查询次数，按命中与否统计',
+    ['cache', 'result']
+)
+
+SPECULATION_RESULTS = Counter(
+    'sakuratalk_speculation_total',
+    '推测执行（按建议句子提前生成下一轮回复）的次数，按结果统计',
+    ['result']
+)
+
+JOBS = Counter(
+    'sakuratalk_jobs_total',
+    '后台任务的提交与执行次数，按任务类型和结果统计',
+    ['kind', 'status']
+)
+
+JOB_QUEUE_DEPTH = Gauge(
+    'sakuratalk_job_queue_depth',
+    '后台任务队列中各状态的任务数量',
+    ['status']
+)
+
+ROUTING_DECISIONS = Counter(
+    'sakuratalk_routing_decisions_total',
+    '按对话难度自动选择模型分级的次数',
+    ['tier']
+)
+
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    'sakuratalk_admission_queue_depth',
+    '等待服务商调用名额的请求数',
+    ['provider']
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    'sakuratalk_admission_in_flight',
+    '正在进行的服务商调用数',
+    ['provider']
+)
+
+ADMISSION_REJECTED = Counter(
+    'sakuratalk_admission_rejected_total',
+    '未通过准入控制的请求数，按原因统计（rate_limited、queue_full、deadline、busy）',
+    ['reason']
+)
+
+ANALYTICS_EVENTS = Counter(
+    'sakuratalk_analytics_records_total',
+    '学习统计记录数，按结果统计（queued、dropped、written、failed）',
+    ['result']
+)
+
+
+@contextmanager
+def timed(stage: str, provider: str = '', model: str = ''):
+    """
+    记录代码块耗时的上下文管理器
+
+    :param stage: 阶段名称
+    :param provider: 服务商
+    :param model: 模型名称
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.labels(stage, provider, model).observe(time.perf_counter() - start)
+
+
+def record_tokens(provider: str, model: str, prompt_tokens, completion_tokens) -> None:
+    """
+    记录一次LLM调用的token用量
+
+    :param provider: 服务商
+    :param model: 模型名称
+    :param prompt_tokens: 输入token数（未知时为None）
+    :param completion_tokens: 输出token数（未知时为None）
+    """
+    if prompt_tokens:
+        LLM_TOKENS.labels(provider, model, 'prompt').inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(provider, model, 'completion').inc(completion_tokens)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """
+    记录一次缓存查询
+
+    :param cache: 缓存名称
+    :param hit: 是否命中
+    """
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def render_latest():
+    """
+    生成Prometheus文本格式的指标数据
+
+    :return: (指标文本, Content-Type)
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -65,4 +65,114 @@ class PromptManager:
   "suggestion_hiragana": "練習文のひらがな表記",
   "suggestion_chinese": "練習文の中国語訳"
 }
+'''
+
+
+    # 聊天回复的JSON Schema，用于各模型的结构化输出（JSON模式）
+    CHAT_RESPONSE_SCHEMA = {
+        'type': 'object',
+        'properties': {
+            'japanese': {'type': 'string'},
+            'hiragana': {'type': 'string'},
+            'chinese': {'type': 'string'},
+            'pronunciation_score': {'type': 'integer'},
+            'next_suggestion': {'type': 'string'},
+            'suggestion_hiragana': {'type': 'string'},
+            'suggestion_chinese': {'type': 'string'}
+        },
+        'required': [
+            'japanese',
+            'hiragana',
+            'chinese',
+            'pronunciation_score',
+            'next_suggestion',
+            'suggestion_hiragana',
+            'suggestion_chinese'
+        ]
+    }
+
+    # 语法纠错提示词（单句），{text}为待检查的句子
+    JAPANESE_GRAMMAR_CORRECTION = '''
+请检查下面这句日语的语法，并严格按照以下规则回答：
+
+0. 请直接给最终答案，不要展示思考过程
+1. 只修改语法、助词、活用和用词错误，保持原意和语气；没有错误时原样返回句子
+2. 每处错误给出原文片段、修改后的片段和简短的中文说明
+3. 输出必须是有效的 JSON 对象，不允许包含任何注释、解释或额外文字
+
+输出格式如下，请严格遵守：
+{{
+  "corrected_text": "修改后的句子",
+  "errors": [
+    {{"original": "错误片段", "correction": "修改后的片段", "explanation": "中文说明"}}
+  ]
+}}
+
+句子：{text}
+'''
+
+    # 语法纠错提示词（单句，日语）
+    JAPANESE_GRAMMAR_CORRECTION_JA = '''
+次の日本語の文の文法をチェックし、以下のルールを必ず守って回答してください：
+
+0. 最終的な回答のみを直接提供し、思考過程は表示しないこと
+1. 文法・助詞・活用・語彙の誤りだけを直し、意味と口調は変えないこと。誤りがない場合は元の文をそのまま返すこと
+2. 誤りごとに、元の部分・訂正後の部分・簡単な中国語の説明を付けること
+3. 出力は**有効な JSON オブジェクト**のみであり、コメント・説明・余計なテキストは含めないこと
+
+出力フォーマットは以下の通りです。必ず厳守してください：
+{{
+  "corrected_text": "訂正後の文",
+  "errors": [
+    {{"original": "誤りの部分", "correction": "訂正後の部分", "explanation": "中国語の説明"}}
+  ]
+}}
+
+文：{text}
+'''
+
+    # 批量语法纠错提示词：{count}为句子数，{sentences}为每行一个、以[编号]开头的句子
+    JAPANESE_GRAMMAR_CORRECTION_BATCH = '''
+下面有 {count} 个互相独立的日语句子，每行以 [编号] 开头。请逐句检查语法，并严格按照以下规则回答：
+
+0. 请直接给最终答案，不要展示思考过程
+1. 每个句子单独判断，不要合并、拆分句子，也不要参考其他句子的内容
+2. 只修改语法、助词、活用和用词错误，保持原意和语气；没有错误时原样返回句子
+3. 每处错误给出原文片段、修改后的片段和简短的中文说明
+4. results 必须恰好包含 {count} 项，index 与句子编号一一对应
+5. 输出必须是有效的 JSON 对象，不允许包含任何注释、解释或额外文字
+
+输出格式如下，请严格遵守：
+{{
+  "results": [
+    {{
+      "index": 0,
+      "corrected_text": "修改后的句子",
+      "errors": [
+        {{"original": "错误片段", "correction": "修改后的片段", "explanation": "中文说明"}}
+      ]
+    }}
+  ]
+}}
+
+句子：
+{sentences}
+'''
+
+    # 对话摘要提示词：{summary}为之前的摘要，{dialogue}为需要并入摘要的对话
+    CONVERSATION_SUMMARY = '''
+下面是日语学习者与学习助手之间较早的对话。请把它与之前的摘要合并成一段新的中文摘要，严格按照以下规则回答：
+
+0. 请直接给最终答案，不要展示思考过程
+1. 保留对话中的话题、学习者提到的个人信息和偏好，以及学习者反复出现的语法或用词问题
+2. 摘要不超过200字
+3. 输出必须是有效的 JSON 对象，不允许包含任何注释、解释或额外文字
+
+输出格式如下，请严格遵守：
+{{"summary": "新的摘要"}}
+
+之前的摘要：{summary}
+
+对话：
+{dialogue}
 '''
@@ -0,0 +1,98 @@
+import json
+import re
+from typing import Any, Dict, Optional
+
+
+# 匹配Markdown代码块标记，例如 ```json ... ```
+_CODE_FENCE_PATTERN = re.compile(r'^```[a-zA-Z]*\s*|\s*```$')
+# 匹配对象或数组结尾前多余的逗号
+_TRAILING_COMMA_PATTERN = re.compile(r',\s*([}\]])')
+# 常见的全角/弯引号，模型偶尔会用它们包裹键名
+_QUOTE_TRANSLATION = str.maketrans({'“': '"', '”': '"', '＂': '"'})
+
+
+def parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """
+    解析模型返回的JSON对象，必要时进行本地修复
+
+    :param text: 模型返回的原始文本
+    :return: 解析得到的字典，无法修复时返回None
+    """
+    if not text:
+        return None
+
+    candidate = _CODE_FENCE_PATTERN.sub('', text.strip())
+
+    # 首先尝试直接解析（结构化输出模式下绝大多数情况会命中）
+    parsed = _loads(candidate)
+    if parsed is not None:
+        return parsed
+
+    # 截取第一个 { 之后的内容，去掉JSON前后的多余文字
+    start = candidate.find('{')
+    if start == -1:
+        return None
+    end = candidate.rfind('}')
+    candidate = candidate[start:end + 1] if end > start else candidate[start:]
+
+    parsed = _loads(candidate)
+    if parsed is not None:
+        return parsed
+
+    return _loads(repair_json(candidate))
+
+
+def repair_json(text: str) -> str:
+    """
+    修复几乎有效的JSON文本：替换弯引号、去除多余逗号、补全未闭合的字符串和括号
+
+    :param text: 待修复的JSON文本
+    :return: 修复后的JSON文本
+    """
+    text = text.translate(_QUOTE_TRANSLATION)
+    text = _TRAILING_COMMA_PATTERN.sub(r'\1', text)
+
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]' and stack:
+            stack.pop()
+
+    if in_string:
+        text += '"'
+
+    if stack:
+        # 输出被截断时，去掉末尾不完整的键值对再补全括号
+        text = text.rstrip().rstrip(',')
+        if text.endswith(':'):
+            text += ' null'
+        text += ''.join(reversed(stack))
+
+    return _TRAILING_COMMA_PATTERN.sub(r'\1', text)
+
+
+def _loads(text: str) -> Optional[Dict[str, Any]]:
+    """
+    尝试将文本解析为JSON对象
+
+    :param text: JSON文本
+    :return: 解析结果，失败或结果不是对象时返回None
+    """
+    try:
+        # strict=False 允许字符串中出现未转义的换行符
+        parsed = json.loads(text, strict=False)
+    except (json.JSONDecodeError, ValueError):
+        return None
+    return parsed if isinstance(parsed, dict) else None
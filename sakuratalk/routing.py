@@ -0,0 +1,237 @@
+"""
+按对话难度自动选择模型分级
+
+调用LLM之前根据输入长度、汉字密度和语法标记估算本轮对话的难度：简单的输入（问候、短句）
+交给小模型（例如本地Ollama），复杂的输入交给大模型。每轮的特征、选择和结果记录到JSON Lines文件，
+用于调整阈值：
+
+    python -m sakuratalk.routing cache/routing/outcomes.jsonl
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from .config import Config
+from .metrics import ROUTING_DECISIONS
+
+logger = logging.getLogger(__name__)
+
+KANJI_PATTERN = re.compile(r'[一-鿿㐀-䶿]')
+KANA_PATTERN = re.compile(r'[ぁ-ゟ゠-ヿ]')
+LATIN_PATTERN = re.compile(r'[A-Za-z]')
+SENTENCE_END_PATTERN = re.compile(r'[。！？!?]+')
+
+# 初级以上的语法标记（条件、推量、敬语、授受、使役/被动、体貌等）
+GRAMMAR_MARKERS = (
+    'ければ', 'たら', 'なら', 'ても', 'のに', 'ながら', 'ように', 'ために',
+    'そうです', 'らしい', 'みたい', 'はず', 'わけ', 'べき', 'かもしれ', 'でしょう',
+    'させ', 'られ', 'いただ', 'ござい', 'おり', '申し', '存じ', 'いらっしゃ', 'なさ',
+    'ばかり', 'ところ', 'ことがある', 'ことにする', 'ことになる', 'てしまう', 'ちゃう',
+    'ておく', 'てある', 'てみる', 'ていく', 'てくる', 'ほうがいい', 'について', 'によって'
+)
+
+
+def extract_features(text: str) -> Dict[str, Any]:
+    """
+    提取用于估算难度的输入特征
+
+    :param text: 用户输入
+    :return: 特征
+    """
+    text = text.strip()
+    kanji = len(KANJI_PATTERN.findall(text))
+    kana = len(KANA_PATTERN.findall(text))
+    markers = [marker for marker in GRAMMAR_MARKERS if marker in text]
+    return {
+        'chars': len(text),
+        'kanji': kanji,
+        'kana': kana,
+        'kanji_density': round(kanji / (kanji + kana), 3) if kanji + kana else 0.0,
+        'latin': len(LATIN_PATTERN.findall(text)),
+        'sentences': max(1, len([s for s in SENTENCE_END_PATTERN.split(text) if s.strip()])),
+        'grammar_markers': len(markers),
+        # 只有汉字没有假名：通常是用中文提问（例如"这个用日语怎么说"），需要更强的模型
+        'no_kana': kana == 0 and kanji > 0
+    }
+
+
+def complexity_score(features: Dict[str, Any]) -> float:
+    """
+    将特征加权为0–1的难度分
+
+    :param features: extract_features 的结果
+    :return: 难度分
+    """
+    score = (
+        0.35 * min(features['chars'] / 60.0, 1.0)
+        + 0.25 * features['kanji_density']
+        + 0.30 * min(features['grammar_markers'] / 3.0, 1.0)
+        + 0.10 * min((features['sentences'] - 1) / 3.0, 1.0)
+    )
+    if features['no_kana']:
+        score += 0.2
+    return round(min(score, 1.0), 3)
+
+
+def classify_turn(text: str, threshold: Optional[float] = None) -> Dict[str, Any]:
+    """
+    估算本轮对话的难度并选择模型分级
+
+    :param text: 用户输入
+    :param threshold: 难度阈值，缺省时使用配置值；难度分不低于阈值时使用大模型分级
+    :return: 包含tier、score和features的路由决定
+    """
+    threshold = Config.ROUTING_THRESHOLD if threshold is None else threshold
+    features = extract_features(text)
+    score = complexity_score(features)
+    tier = Config.ROUTING_LARGE_TIER if score >= threshold else Config.ROUTING_FAST_TIER
+    ROUTING_DECISIONS.labels(tier).inc()
+    return {'tier': tier, 'score': score, 'threshold': threshold, 'features': features}
+
+
+class OutcomeRecorder:
+    """
+    将路由决定及其结果异步追加到JSON Lines文件（写入在后台线程完成，不阻塞请求）
+    """
+    def __init__(self, file_path: Optional[str] = None):
+        """
+        初始化结果记录器
+
+        :param file_path: 记录文件路径，为空字符串时不记录
+        """
+        self.file_path = Config.ROUTING_OUTCOME_FILE if file_path is None else file_path
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def record(self, decision: Dict[str, Any], service, latency_seconds: float, result: Dict[str, Any]) -> None:
+        """
+        记录一轮对话的路由结果
+
+        :param decision: classify_turn 的路由决定
+        :param service: 实际使用的LLM服务
+        :param latency_seconds: LLM调用耗时（秒）
+        :param result: 对话结果（失败时包含error字段）
+        """
+        if not self.file_path:
+            return
+        self._queue.put({
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'tier': decision['tier'],
+            'fallback': decision.get('fallback', False),
+            'score': decision['score'],
+            'threshold': decision['threshold'],
+            'features': decision['features'],
+            'provider': service.provider_name,
+            'model': service.model_name,
+            'latency_ms': round(latency_seconds * 1000, 1),
+            'ok': 'error' not in result,
+            'error': result.get('error'),
+            'reply_chars': len(result.get('message') or '')
+        })
+        self._ensure_writer()
+
+    def _ensure_writer(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name='routing-outcomes', daemon=True)
+                self._thread.start()
+
+    def _write_loop(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.file_path)), exist_ok=True)
+        while True:
+            entries = [self._queue.get()]
+            # 合并积压的记录，一次写入
+            while not self._queue.empty():
+                entries.append(self._queue.get_nowait())
+            try:
+                with open(self.file_path, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+            except OSError as e:
+                logger.warning(f"路由结果写入失败: {str(e)}")
+
+
+def load_outcomes(file_path: str) -> List[Dict[str, Any]]:
+    """
+    读取路由结果记录
+    """
+    with open(file_path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize_outcomes(outcomes: List[Dict[str, Any]], bucket_width: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    按难度分区间和模型分级汇总路由结果
+
+    :param outcomes: 路由结果记录
+    :param bucket_width: 难度分区间宽度
+    :return: 每个（区间, 分级）的请求数、错误率和延迟中位数
+    """
+    groups = defaultdict(list)
+    for outcome in outcomes:
+        bucket = round(int(outcome['score'] / bucket_width) * bucket_width, 3)
+        groups[(bucket, outcome['tier'])].append(outcome)
+
+    rows = []
+    for (bucket, tier), entries in sorted(groups.items()):
+        latencies = [entry['latency_ms'] for entry in entries if entry['ok']]
+        rows.append({
+            'score_from': bucket,
+            'score_to': round(bucket + bucket_width, 3),
+            'tier': tier,
+            'count': len(entries),
+            'error_rate': round(sum(not entry['ok'] for entry in entries) / len(entries), 3),
+            'p50_latency_ms': round(statistics.median(latencies), 1) if latencies else None
+        })
+    return rows
+
+
+def suggest_threshold(rows: List[Dict[str, Any]], max_error_rate: float) -> Optional[float]:
+    """
+    建议阈值：小模型分级在难度分区间内的错误率首次超过上限处
+
+    :param rows: summarize_outcomes 的结果
+    :param max_error_rate: 小模型可接受的错误率
+    :return: 建议的阈值，小模型各区间的错误率均未超过上限时返回None
+    """
+    for row in rows:
+        if row['tier'] == Config.ROUTING_FAST_TIER and row['error_rate'] > max_error_rate:
+            return row['score_from']
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='根据路由结果记录调整难度阈值')
+    parser.add_argument('outcomes', nargs='?', default=Config.ROUTING_OUTCOME_FILE, help='路由结果记录文件')
+    parser.add_argument('--bucket-width', type=float, default=0.1, help='难度分区间宽度')
+    parser.add_argument('--max-error-rate', type=float, default=0.05, help='小模型可接受的错误率')
+    args = parser.parse_args(argv)
+
+    outcomes = load_outcomes(args.outcomes)
+    rows = summarize_outcomes(outcomes, args.bucket_width)
+    print(f"{'难度分':<12} {'分级':<8} {'请求数':>6} {'错误率':>7} {'延迟中位数(ms)':>14}")
+    for row in rows:
+        latency = '-' if row['p50_latency_ms'] is None else f"{row['p50_latency_ms']:.1f}"
+        print(f"{row['score_from']:.2f}–{row['score_to']:.2f}   {row['tier']:<8} {row['count']:>6} "
+              f"{row['error_rate']:>7.1%} {latency:>14}")
+
+    threshold = suggest_threshold(rows, args.max_error_rate)
+    print(f"\n共 {len(outcomes)} 轮，当前阈值 {Config.ROUTING_THRESHOLD}")
+    if threshold is not None:
+        print(f"小模型在难度分 {threshold:.2f} 以上的错误率超过 {args.max_error_rate:.0%}，建议将 ROUTING_THRESHOLD 调整为 {threshold:.2f}")
+    else:
+        print(f"小模型各区间的错误率均未超过 {args.max_error_rate:.0%}，可以保持或尝试提高阈值")
+
+
+if __name__ == '__main__':
+    main()
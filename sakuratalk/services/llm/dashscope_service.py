@@ -1,7 +1,5 @@
 import sys
 import os
-import json
-import re
 import logging
 
 # 添加项目根目录到Python路径
@@ -11,34 +9,63 @@ import dashscope
 from dashscope import Generation
 from http import HTTPStatus
 from tenacity import retry, stop_after_attempt, wait_exponential
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from ...config import Config
 from ...exceptions import ServiceCallError
 from ...prompts import PromptManager
 from .llm_base import LLMBaseService
 
-# 配置日志
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
 
 class DashScopeService(LLMBaseService):
     """
     通义千问服务接口（日语学习助手）
     """
-    def __init__(self):
+    provider_name = 'dashscope'
+    
+    # 语法纠错使用日语提示词
+    grammar_system_prompt = 'あなたはプロの日本語文法訂正アシスタントです。'
+    grammar_prompt = PromptManager.JAPANESE_GRAMMAR_CORRECTION_JA
+    
+    def __init__(self, model_name: Optional[str] = None):
         """
         初始化DashScope服务
+        :param model_name: 模型名称，缺省时使用配置的默认模型
         """
         super().__init__()
+        self.model_name = model_name or Config.DASHSCOPE_MODEL
         # 初始化DashScope API密钥
         dashscope.api_key = Config.DASHSCOPE_API_KEY
     
+    def _build_messages(self, user_input: str, conversation_history: List[Dict[str, str]] = None) -> List[Dict[str, str]]:
+        """
+        构建发送给模型的消息列表
+        :param user_input: 用户输入
+        :param conversation_history: 对话历史
+        :return: 消息列表
+        """
+        # 使用集中管理的系统提示词
+        system_prompt = PromptManager.JAPANESE_LEARNING_ASSISTANT
+
+        messages = [
+            {
+                'role': 'system',
+                'content': system_prompt
+            }
+        ]
+        
+        # 添加对话历史（如果有的话）
+        if conversation_history:
+            messages.extend(conversation_history)
+        
+        # 添加当前用户输入
+        messages.append({
+            'role': 'user',
+            'content': user_input
+        })
+        return messages
+    
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     def get_chat_response(self, user_input: str, conversation_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
         """
@@ -48,75 +75,31 @@ class DashScopeService(LLMBaseService):
         :return: AI响应
         """
         try:
-            # 使用集中管理的系统提示词
-            system_prompt = PromptManager.JAPANESE_LEARNING_ASSISTANT
-
-            messages = [
-                {
-                    'role': 'system',
-                    'content': system_prompt
-                }
-            ]
-            
-            # 添加对话历史（如果有的话）
-            if conversation_history:
-                messages.extend(conversation_history)
-            
-            # 添加当前用户输入
-            messages.append({
-                'role': 'user',
-                'content': user_input
-            })
+            messages = self._build_messages(user_input, conversation_history)
             
             # 记录发送给模型的请求
             self._log_request(messages)
             
             # 调用通义千问API
-            response = Generation.call(
-                model='qwen-plus',
-                messages=messages,
-                result_format='message'  # 设置结果格式为message
-            )
+            with self._timed('llm_provider_call'):
+                response = Generation.call(
+                    model=self.model_name,
+                    messages=messages,
+                    result_format='message',  # 设置结果格式为message
+                    response_format={'type': 'json_object'}  # 启用JSON模式，保证输出为合法JSON
+                )
             
             if response.status_code == HTTPStatus.OK:
+                self._record_usage(response.usage.input_tokens, response.usage.output_tokens)
+                
                 # 提取AI回复
                 ai_response = response.output.choices[0].message.content
                 
                 # 记录模型的响应
                 self._log_response(ai_response)
                 
-                # 尝试解析JSON格式的回复
-                try:
-                    json_match = re.search(r'\{.*\}', ai_response, re.DOTALL)
-                    if json_match:
-                        json_text = json_match.group(0)
-                        parsed_response = json.loads(json_text)
-                    else:
-                        parsed_response = json.loads(ai_response)
-                except json.JSONDecodeError:
-                    parsed_response = {
-                        'japanese': ai_response,
-                        'hiragana': '暂无平假名',
-                        'chinese': '暂无翻译',
-                        'pronunciation_score': 85,
-                        'improvement_tips': '暂无改进建议',
-                        'next_suggestion': 'お元気ですか？',
-                        'suggestion_hiragana': 'おげんきですか？',
-                        'suggestion_chinese': '你好吗？'
-                    }
-                
-                # 确保所有字段都有默认值
-                return {
-                    'message': parsed_response.get('japanese'),
-                    'translation': parsed_response.get('chinese', '暂无翻译'),
-                    'hiragana': parsed_response.get('hiragana', '暂无平假名'),
-                    'pronunciation_score': parsed_response.get('pronunciation_score', 85),
-                    'user_pronunciation_score': 80,  # 默认用户发音评分
-                    'improvement_tips': parsed_response.get('improvement_tips', '暂无改进建议'),
-                    'next_suggestion': parsed_response.get('next_suggestion', 'お元気ですか？'),
-                    'suggestion_hiragana': parsed_response.get('suggestion_hiragana', 'おげんきですか？'),
-                    'suggestion_translation': parsed_response.get('suggestion_chinese', '你好吗？')
-                }
+                # 解析JSON格式的回复（必要时进行本地修复）
+                return self._parse_chat_response(ai_response)
             else:
                 error_msg = f"API调用失败: {response.message}"
                 self.logger.error(error_msg)
@@ -128,45 +111,36 @@ class DashScopeService(LLMBaseService):
                 'error': str(e)
             }
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def correct_grammar(self, text: str) -> Dict[str, Any]:
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10), reraise=True)
+    def _complete(self, system_prompt: str, prompt: str, stage: str = 'llm_grammar_call') -> str:
         """
-        语法纠错
-        :param text: 需要纠错的文本
-        :return: 纠错结果
+        发送单轮请求并返回模型输出的文本
+        :param system_prompt: 系统提示词
+        :param prompt: 用户提示词
+        :param stage: 耗时指标的阶段名称
+        :return: 模型输出的文本
         """
-        try:
-            prompt = PromptManager.JAPANESE_GRAMMAR_CORRECTION_JA.format(text=text)
-            
-            messages = [
-                {'role': 'system', 'content': 'あなたはプロの日本語文法訂正アシスタントです。'},
-                {'role': 'user', 'content': prompt}
-            ]
-            
-            self._log_request(messages)
-            
+        messages = [
+            {'role': 'system', 'content': system_prompt},
+            {'role': 'user', 'content': prompt}
+        ]
+        
+        self._log_request(messages)
+        
+        with self._timed(stage):
             response = Generation.call(
-                model='qwen-plus',
+                model=self.model_name,
                 messages=messages,
-                result_format='message'
+                result_format='message',
+                response_format={'type': 'json_object'}
             )
-            
-            if response.status_code == HTTPStatus.OK:
-                correction_result = response.output.choices[0].message.content
-                self._log_response(correction_result)
-                
-                return {
-                    'corrected_text': correction_result,
-                    'errors': [],
-                    'suggestions': []
-                }
-            else:
-                error_msg = f"语法纠错API调用失败: {response.message}"
-                self.logger.error(error_msg)
-                raise ServiceCallError(error_msg)
-                
-        except Exception as e:
-            self.logger.error(f"语法纠错时出错: {str(e)}")
-            return {
-                'error': str(e)
-            }
\ No newline at end of file
+        
+        if response.status_code != HTTPStatus.OK:
+            error_msg = f"API调用失败: {response.message}"
+            self.logger.error(error_msg)
+            raise ServiceCallError(error_msg)
+        
+        self._record_usage(response.usage.input_tokens, response.usage.output_tokens)
+        result = response.output.choices[0].message.content
+        self._log_response(result)
+        return result
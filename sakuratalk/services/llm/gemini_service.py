@@ -1,39 +1,94 @@
 import sys
 import os
-import json
-import re
 import logging
 import google.generativeai as genai
 from http import HTTPStatus
 from tenacity import retry, stop_after_attempt, wait_exponential
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from ...config import Config
 from ...exceptions import ServiceCallError
 from ...prompts import PromptManager
 from .llm_base import LLMBaseService
 
-# 配置日志
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
 
 class GeminiService(LLMBaseService):
     """
     Gemini服务接口
     """
-    def __init__(self):
+    provider_name = 'gemini'
+    
+    def __init__(self, model_name: Optional[str] = None):
         """
         初始化Gemini服务
+        :param model_name: 模型名称，缺省时使用配置的默认模型
         """
         super().__init__()
         # 初始化Gemini API密钥
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        if Config.GEMINI_API_BASE:
+            # 自定义接口地址只支持REST协议
+            genai.configure(api_key=Config.GEMINI_API_KEY, transport='rest',
+                            client_options={'api_endpoint': Config.GEMINI_API_BASE})
+        else:
+            genai.configure(api_key=Config.GEMINI_API_KEY)
+        self.model_name = model_name or Config.GEMINI_MODEL
+        self.model = genai.GenerativeModel(self.model_name)
+    
+    def _record_response_usage(self, response) -> None:
+        """
+        记录Gemini响应中的token用量
+        
+        :param response: Gemini响应
+        """
+        usage = getattr(response, 'usage_metadata', None)
+        if usage:
+            self._record_usage(usage.prompt_token_count, usage.candidates_token_count)
+    
+    def _build_prompt(self, user_input: str, conversation_history: List[Dict[str, str]] = None) -> str:
+        """
+        构建发送给模型的完整提示（Gemini不区分系统消息，历史记录以文本形式拼接）
+        :param user_input: 用户输入
+        :param conversation_history: 对话历史
+        :return: 完整提示
+        """
+        # 使用集中管理的系统提示词
+        system_prompt = PromptManager.JAPANESE_LEARNING_ASSISTANT
+
+        # 构建消息列表
+        messages = []
+        
+        # 添加系统提示
+        messages.append({
+            'role': 'system',
+            'content': system_prompt
+        })
+        
+        # 添加对话历史提示
+        if conversation_history and len(conversation_history) > 1:  # 确保有历史记录（除了系统提示）
+            messages.append({
+                'role': 'system',
+                'content': '以下是你与用户的历史对话记录，按时间顺序排列（较早的记录在前）：'
+            })
+            # 添加实际的历史记录（跳过初始的系统提示）
+            messages.extend(conversation_history[1:])
+        
+        # 构建完整的提示
+        full_prompt = system_prompt
+        
+        # 添加历史记录说明和内容
+        if len(messages) > 1:
+            full_prompt += "\n\n以下是你与用户的历史对话记录，按时间顺序排列（较早的记录在前）："
+            for msg in messages[2:]:  # 跳过系统提示和历史记录说明
+                if msg['role'] == 'user':
+                    full_prompt += f"\n用户: {msg['content']}"
+                elif msg['role'] == 'assistant':
+                    full_prompt += f"\n助手: {msg['content']}"
+                elif msg['role'] == 'system':
+                    full_prompt += f"\n{msg['content']}"
+        
+        full_prompt += f"\n\n当前用户输入: {user_input}\n请根据以上对话历史进行回复。"
+        return full_prompt
     
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     def get_chat_response(self, user_input: str, conversation_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
@@ -44,46 +99,21 @@ class GeminiService(LLMBaseService):
         :return: AI响应
         """
         try:
-            # 使用集中管理的系统提示词
-            system_prompt = PromptManager.JAPANESE_LEARNING_ASSISTANT
-
-            # 构建消息列表
-            messages = []
-            
-            # 添加系统提示
-            messages.append({
-                'role': 'system',
-                'content': system_prompt
-            })
-            
-            # 添加对话历史提示
-            if conversation_history and len(conversation_history) > 1:  # 确保有历史记录（除了系统提示）
-                messages.append({
-                    'role': 'system',
-                    'content': '以下是你与用户的历史对话记录，按时间顺序排列（较早的记录在前）：'
-                })
-                # 添加实际的历史记录（跳过初始的系统提示）
-                messages.extend(conversation_history[1:])
-            
-            # 构建完整的提示
-            full_prompt = system_prompt
-            
-            # 添加历史记录说明和内容
-            if len(messages) > 1:
-                full_prompt += "\n\n以下是你与用户的历史对话记录，按时间顺序排列（较早的记录在前）："
-                for msg in messages[2:]:  # 跳过系统提示和历史记录说明
-                    if msg['role'] == 'user':
-                        full_prompt += f"\n用户: {msg['content']}"
-                    elif msg['role'] == 'assistant':
-                        full_prompt += f"\n助手: {msg['content']}"
-            
-            full_prompt += f"\n\n当前用户输入: {user_input}\n请根据以上对话历史进行回复。"
+            full_prompt = self._build_prompt(user_input, conversation_history)
             
             # 记录发送给模型的请求
             self._log_request([{'role': 'user', 'content': full_prompt}])
             
             # 调用Gemini API
-            response = self.model.generate_content(full_prompt)
+            with self._timed('llm_provider_call'):
+                response = self.model.generate_content(
+                    full_prompt,
+                    generation_config={
+                        'response_mime_type': 'application/json',
+                        'response_schema': PromptManager.CHAT_RESPONSE_SCHEMA
+                    }
+                )
+            self._record_response_usage(response)
             
             # 提取AI回复
             ai_response = response.text
@@ -91,39 +121,8 @@ class GeminiService(LLMBaseService):
             # 记录模型的响应
             self._log_response(ai_response)
             
-            # 尝试解析JSON格式的回复
-            try:
-                # 如果AI在JSON前后添加了其他内容，尝试提取JSON部分
-                json_match = re.search(r'\{.*\}', ai_response, re.DOTALL)
-                if json_match:
-                    json_text = json_match.group(0)
-                    parsed_response = json.loads(json_text)
-                else:
-                    # 直接尝试解析整个回复
-                    parsed_response = json.loads(ai_response)
-            except json.JSONDecodeError:
-                # 如果JSON解析失败，使用原始响应作为message字段
-                parsed_response = {
-                    'japanese': ai_response,
-                    'hiragana': '暂无平假名',
-                    'chinese': '暂无翻译',
-                    'pronunciation_score': 85,
-                    'next_suggestion': 'お元気ですか？',
-                    'suggestion_hiragana': 'おげんきですか？',
-                    'suggestion_chinese': '你好吗？'
-                }
-            
-            # 确保所有字段都有默认值
-            return {
-                'message': parsed_response.get('japanese'),
-                'translation': parsed_response.get('chinese', '暂无翻译'),
-                'hiragana': parsed_response.get('hiragana', '暂无平假名'),
-                'pronunciation_score': parsed_response.get('pronunciation_score', 85),
-                'user_pronunciation_score': 80,  # 默认用户发音评分
-                'next_suggestion': parsed_response.get('next_suggestion', 'お元気ですか？'),
-                'suggestion_hiragana': parsed_response.get('suggestion_hiragana', 'おげんきですか？'),
-                'suggestion_translation': parsed_response.get('suggestion_chinese', '你好吗？')
-            }
+            # 解析JSON格式的回复（必要时进行本地修复）
+            return self._parse_chat_response(ai_response)
                 
         except Exception as e:
             self.logger.error(f"调用Gemini API时出错: {str(e)}")
@@ -132,38 +131,29 @@ class GeminiService(LLMBaseService):
                 'error': str(e)
             }
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def correct_grammar(self, text: str) -> Dict[str, Any]:
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10), reraise=True)
+    def _complete(self, system_prompt: str, prompt: str, stage: str = 'llm_grammar_call') -> str:
         """
-        语法纠错
-        :param text: 需要纠错的文本
-        :return: 纠错结果
+        发送单轮请求并返回模型输出的文本（Gemini不区分系统消息，系统提示词拼接在提示词之前）
+        :param system_prompt: 系统提示词
+        :param prompt: 用户提示词
+        :param stage: 耗时指标的阶段名称
+        :return: 模型输出的文本
         """
-        try:
-            # 使用集中管理的语法纠错提示词
-            prompt = PromptManager.JAPANESE_GRAMMAR_CORRECTION.format(text=text)
-            
-            full_prompt = "你是一个专业的日语语法纠正助手。" + prompt
-            
-            # 记录发送给模型的请求
-            self._log_request([{'role': 'user', 'content': full_prompt}])
-            
-            # 调用Gemini API进行语法纠错
-            response = self.model.generate_content(full_prompt)
-            
-            correction_result = response.text
-            
-            # 记录模型的响应
-            self._log_response(correction_result)
-            
-            return {
-                'corrected_text': correction_result,
-                'errors': [],  # 在实际应用中可以解析错误详情
-                'suggestions': []
-            }
-                
-        except Exception as e:
-            self.logger.error(f"语法纠错时出错: {str(e)}")
-            return {
-                'error': str(e)
-            }
\ No newline at end of file
+        full_prompt = system_prompt + prompt
+        
+        # 记录发送给模型的请求
+        self._log_request([{'role': 'user', 'content': full_prompt}])
+        
+        with self._timed(stage):
+            response = self.model.generate_content(
+                full_prompt,
+                generation_config={'response_mime_type': 'application/json'}
+            )
+        self._record_response_usage(response)
+        
+        result = response.text
+        
+        # 记录模型的响应
+        self._log_response(result)
+        return result
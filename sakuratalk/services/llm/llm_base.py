@@ -1,27 +1,46 @@
 from abc import ABC, abstractmethod
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+from ...prompts import PromptManager
+from ...tracing import trace_methods
+from ...metrics import timed, record_tokens
+from ...response_parser import parse_json_object
+from ...logging_config import sample_payload
 
-# 配置日志
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
 
 
 class LLMBaseService(ABC):
     """
     LLM服务基类
     """
+    # 服务商名称，用于指标标签
+    provider_name = ''
+    
+    # 模型回复中缺少pronunciation_score时使用的默认值
+    default_pronunciation_score = 85
+    
+    # 语法纠错使用的系统提示词和提示词
+    grammar_system_prompt = '你是一个专业的日语语法纠正助手。'
+    grammar_prompt = PromptManager.JAPANESE_GRAMMAR_CORRECTION
+    
+    # 对话摘要使用的系统提示词
+    summary_system_prompt = '你是一个负责整理对话记录的助手。'
+    
+    def __init_subclass__(cls, **kwargs):
+        """
+        为子类实现的服务调用自动添加追踪span
+        """
+        super().__init_subclass__(**kwargs)
+        trace_methods(cls, 'llm', ('get_chat_response', 'correct_grammar', 'correct_grammar_batch', 'summarize'))
     
     def __init__(self):
         """
         初始化LLM服务
         """
         self.logger = logger
+        self.model_name = ''
     
     @abstractmethod
     def get_chat_response(self, user_input: str, conversation_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
@@ -35,6 +54,17 @@ class LLMBaseService(ABC):
         pass
     
     @abstractmethod
+    def _complete(self, system_prompt: str, prompt: str, stage: str = 'llm_grammar_call') -> str:
+        """
+        发送单轮请求并返回模型输出的文本（要求模型输出JSON），失败时抛出异常
+        
+        :param system_prompt: 系统提示词
+        :param prompt: 用户提示词
+        :param stage: 耗时指标的阶段名称
+        :return: 模型输出的文本
+        """
+        pass
+    
     def correct_grammar(self, text: str) -> Dict[str, Any]:
         """
         语法纠错
@@ -42,21 +72,176 @@ class LLMBaseService(ABC):
         :param text: 需要纠错的文本
         :return: 纠错结果
         """
+        try:
+            correction_result = self._complete(self.grammar_system_prompt, self.grammar_prompt.format(text=text))
+            return self._parse_grammar_result(parse_json_object(correction_result), correction_result)
+        except Exception as e:
+            self.logger.error(f"语法纠错时出错: {str(e)}")
+            return {
+                'error': str(e)
+            }
+    
+    def correct_grammar_batch(self, texts: List[str]) -> Dict[str, Any]:
+        """
+        批量语法纠错：多个句子在一次请求中检查
+        
+        模型返回的结果数量或编号与输入不一致时返回error，由调用方改为逐句纠错
+        
+        :param texts: 需要纠错的句子（不能包含换行）
+        :return: 包含results列表（与texts顺序一致）的纠错结果
+        """
+        try:
+            prompt = PromptManager.JAPANESE_GRAMMAR_CORRECTION_BATCH.format(
+                count=len(texts),
+                sentences='\n'.join(f'[{index}] {text}' for index, text in enumerate(texts))
+            )
+            correction_result = self._complete(self.grammar_system_prompt, prompt, 'llm_grammar_batch_call')
+            parsed = parse_json_object(correction_result) or {}
+            items = parsed.get('results')
+            if not isinstance(items, list) or len(items) != len(texts):
+                raise ValueError(f"批量语法纠错结果数量不一致: 期望 {len(texts)} 项")
+            by_index = {item.get('index'): item for item in items if isinstance(item, dict)}
+            if set(by_index) != set(range(len(texts))):
+                raise ValueError("批量语法纠错结果的编号与输入不一致")
+            return {
+                'results': [self._parse_grammar_result(by_index[index]) for index in range(len(texts))]
+            }
+        except Exception as e:
+            self.logger.warning(f"批量语法纠错失败: {str(e)}")
+            return {
+                'error': str(e)
+            }
+    
+    def warm_up(self) -> None:
+        """
+        预热服务（例如预加载模型），默认不做任何操作
+        """
         pass
     
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取服务的就绪状态
+        
+        :return: 状态信息，ready表示服务是否可以立即处理请求
+        """
+        return {'ready': True}
+    
+    def summarize(self, summary: str, interactions: List[Dict[str, str]]) -> Dict[str, Any]:
+        """
+        将较早的对话与之前的摘要合并成新的摘要
+        
+        :param summary: 之前的摘要，没有时为空字符串
+        :param interactions: 需要并入摘要的交互，每项包含user和ai
+        :return: 包含summary的结果，失败时包含error
+        """
+        try:
+            dialogue = '\n'.join(f"用户: {item['user']}\n助手: {item['ai']}" for item in interactions)
+            prompt = PromptManager.CONVERSATION_SUMMARY.format(summary=summary or '无', dialogue=dialogue)
+            output = self._complete(self.summary_system_prompt, prompt, 'llm_summary_call')
+            new_summary = (parse_json_object(output) or {}).get('summary')
+            if not isinstance(new_summary, str) or not new_summary.strip():
+                raise ValueError('无法解析对话摘要')
+            return {'summary': new_summary.strip()}
+        except Exception as e:
+            self.logger.warning(f"生成对话摘要失败: {str(e)}")
+            return {
+                'error': str(e)
+            }
+    
+    def _parse_chat_response(self, ai_response: str) -> Dict[str, Any]:
+        """
+        解析模型返回的JSON回复并转换为标准化的响应格式
+        
+        :param ai_response: 模型返回的原始文本
+        :return: 标准化的AI响应
+        """
+        with self._timed('llm_json_parse'):
+            parsed_response = parse_json_object(ai_response)
+        if parsed_response is None:
+            # 本地修复也失败时，使用原始响应作为message字段，避免重新生成
+            self.logger.warning("无法解析模型返回的JSON内容，使用原始回复")
+            parsed_response = {'japanese': ai_response}
+        
+        # 确保所有字段都有默认值
+        return {
+            'message': parsed_response.get('japanese'),
+            'translation': parsed_response.get('chinese', '暂无翻译'),
+            'hiragana': parsed_response.get('hiragana', '暂无平假名'),
+            'pronunciation_score': parsed_response.get('pronunciation_score', self.default_pronunciation_score),
+            'user_pronunciation_score': 80,  # 默认用户发音评分
+            'next_suggestion': parsed_response.get('next_suggestion', 'お元気ですか？'),
+            'suggestion_hiragana': parsed_response.get('suggestion_hiragana', 'おげんきですか？'),
+            'suggestion_translation': parsed_response.get('suggestion_chinese', '你好吗？')
+        }
+    
+    def _parse_grammar_result(self, parsed: Optional[Dict[str, Any]], raw_text: str = '') -> Dict[str, Any]:
+        """
+        将模型返回的纠错结果转换为标准化的格式
+        
+        :param parsed: 解析得到的JSON对象
+        :param raw_text: 模型返回的原始文本，JSON无法解析时作为纠错结果
+        :return: 标准化的纠错结果
+        """
+        if not parsed or not isinstance(parsed.get('corrected_text'), str):
+            self.logger.warning("无法解析模型返回的语法纠错结果，使用原始回复")
+            return {'corrected_text': raw_text.strip(), 'errors': [], 'suggestions': []}
+        errors = [error for error in parsed.get('errors') or [] if isinstance(error, dict)]
+        return {
+            'corrected_text': parsed['corrected_text'],
+            'errors': errors,
+            'suggestions': [error['explanation'] for error in errors if error.get('explanation')]
+        }
+    
+    def _timed(self, stage: str):
+        """
+        记录阶段耗时，自动带上服务商和模型标签
+        
+        :param stage: 阶段名称
+        """
+        return timed(stage, self.provider_name, self.model_name)
+    
+    def _record_usage(self, prompt_tokens, completion_tokens) -> None:
+        """
+        记录模型调用的token用量
+        
+        :param prompt_tokens: 输入token数
+        :param completion_tokens: 输出token数
+        """
+        record_tokens(self.provider_name, self.model_name, prompt_tokens, completion_tokens)
+    
     def _log_request(self, messages: List[Dict[str, str]]) -> None:
         """
-        记录发送给模型的请求
+        记录发送给模型的请求（默认只记录摘要，完整内容按采样率截断记录）
         
         :param messages: 发送给模型的消息
         """
-        self.logger.info(f"Sending request to LLM API")
-        self.logger.info(f"Messages: {messages}")
+        fields = {
+            'provider': self.provider_name,
+            'model': self.model_name,
+            'message_count': len(messages),
+            'chars': sum(len(m.get('content', '')) for m in messages)
+        }
+        payload = sample_payload(messages)
+        if payload is not None:
+            fields['payload'] = payload
+        self.logger.info("Sending request to LLM API", extra={'fields': fields})
     
     def _log_response(self, response_text: str) -> None:
         """
-        记录模型的响应
+        记录模型的响应（默认只记录摘要，完整内容按采样率截断记录）
         
         :param response_text: 从模型接收的响应
         """
-        self.logger.info(f"Received response from LLM API: {response_text}")
\ No newline at end of file
+        fields = {
+            'provider': self.provider_name,
+            'model': self.model_name,
+            'chars': len(response_text or '')
+        }
+        payload = sample_payload(response_text)
+        if payload is not None:
+            fields['payload'] = payload
+        self.logger.info("Received response from LLM API", extra={'fields': fields})
+
+
+# 基类实现的语法纠错方法同样需要追踪（子类覆盖时由 __init_subclass__ 处理）
+trace_methods(LLMBaseService, 'llm', ('correct_grammar', 'correct_grammar_batch', 'summarize'))
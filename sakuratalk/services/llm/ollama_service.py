@@ -1,39 +1,165 @@
 import sys
 import os
-import json
-import re
 import logging
+import threading
 import requests
 from http import HTTPStatus
 from tenacity import retry, stop_after_attempt, wait_exponential
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from ...config import Config
 from ...exceptions import ServiceCallError
 from ...prompts import PromptManager
 from .llm_base import LLMBaseService
 
-# 配置日志
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
 
 class OllamaService(LLMBaseService):
     """
     Ollama服务接口
     """
-    def __init__(self):
+    provider_name = 'ollama'
+    
+    def __init__(self, model_name: Optional[str] = None):
         """
         初始化Ollama服务
+        :param model_name: 模型名称，缺省时使用配置的默认模型
         """
         super().__init__()
         # 初始化Ollama API基础URL
         self.api_base = Config.OLLAMA_API_BASE
-        self.model = "gemma3:12b"
+        self.model_name = model_name or Config.OLLAMA_MODEL
+        self.keep_alive = Config.OLLAMA_KEEP_ALIVE
+        self.options = self._build_options()
+        self._keepalive_thread = None
+        self._keepalive_stop = threading.Event()
+    
+    def _build_options(self) -> Dict[str, Any]:
+        """
+        根据配置生成模型运行参数
+        
+        注意：所有请求必须使用相同的参数，否则Ollama会重新加载模型
+        
+        :return: Ollama options参数
+        """
+        options = {'num_ctx': Config.OLLAMA_NUM_CTX}
+        if Config.OLLAMA_NUM_THREAD > 0:
+            options['num_thread'] = Config.OLLAMA_NUM_THREAD
+        return options
+    
+    def warm_up(self) -> None:
+        """
+        预加载模型并启动定时保活
+        """
+        if Config.OLLAMA_PRELOAD:
+            self.preload_model()
+        if Config.OLLAMA_KEEPALIVE_INTERVAL > 0:
+            self.start_keepalive(Config.OLLAMA_KEEPALIVE_INTERVAL)
+    
+    def preload_model(self) -> bool:
+        """
+        发送不带prompt的生成请求，让Ollama把模型加载到内存中
+        
+        :return: 是否加载成功
+        """
+        try:
+            response = requests.post(
+                f"{self.api_base}/generate",
+                json={
+                    "model": self.model_name,
+                    "keep_alive": self.keep_alive,
+                    "options": self.options,
+                    "stream": False
+                },
+                headers={"Content-Type": "application/json"},
+                timeout=Config.OLLAMA_PRELOAD_TIMEOUT
+            )
+            if response.status_code == 200:
+                self.logger.info(f"Ollama模型已加载: {self.model_name}")
+                return True
+            self.logger.warning(f"Ollama模型预加载失败: {response.text}")
+        except requests.RequestException as e:
+            self.logger.warning(f"Ollama模型预加载失败: {str(e)}")
+        return False
+    
+    def start_keepalive(self, interval: int) -> None:
+        """
+        启动后台线程，定期发送保活请求防止模型被卸载
+        
+        :param interval: 保活请求间隔（秒）
+        """
+        if self._keepalive_thread and self._keepalive_thread.is_alive():
+            return
+        
+        def _keepalive_loop():
+            while not self._keepalive_stop.wait(interval):
+                self.preload_model()
+        
+        self._keepalive_stop.clear()
+        self._keepalive_thread = threading.Thread(target=_keepalive_loop, name='ollama-keepalive', daemon=True)
+        self._keepalive_thread.start()
+    
+    def stop_keepalive(self) -> None:
+        """
+        停止保活线程
+        """
+        self._keepalive_stop.set()
+    
+    def is_model_loaded(self) -> bool:
+        """
+        查询模型是否已驻留在内存中
+        
+        :return: 模型是否已加载
+        """
+        try:
+            response = requests.get(f"{self.api_base}/ps", timeout=5)
+            if response.status_code != 200:
+                return False
+            loaded_models = response.json().get('models', [])
+            return any(m.get('name') == self.model_name or m.get('model') == self.model_name for m in loaded_models)
+        except (requests.RequestException, ValueError):
+            return False
+    
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取服务的就绪状态
+        
+        :return: 状态信息
+        """
+        return {
+            'ready': self.is_model_loaded(),
+            'model': self.model_name,
+            'keep_alive': self.keep_alive
+        }
+    
+    def _build_messages(self, user_input: str, conversation_history: List[Dict[str, str]] = None) -> List[Dict[str, str]]:
+        """
+        构建发送给模型的消息列表
+        :param user_input: 用户输入
+        :param conversation_history: 对话历史
+        :return: 消息列表
+        """
+        # 使用集中管理的系统提示词
+        system_prompt = PromptManager.JAPANESE_LEARNING_ASSISTANT_JA
+
+        # 构建消息列表
+        messages = [
+            {
+                'role': 'system',
+                'content': system_prompt
+            }
+        ]
+        
+        # 添加对话历史（如果有的话）
+        if conversation_history:
+            messages.extend(conversation_history)
+        
+        # 添加当前用户输入
+        messages.append({
+            'role': 'user',
+            'content': user_input
+        })
+        return messages
     
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     def get_chat_response(self, user_input: str, conversation_history: List[Dict[str, str]] = None) -> Dict[str, Any]:
@@ -44,82 +170,37 @@ class OllamaService(LLMBaseService):
         :return: AI响应
         """
         try:
-            # 使用集中管理的系统提示词
-            system_prompt = PromptManager.JAPANESE_LEARNING_ASSISTANT_JA
-
-            # 构建消息列表
-            messages = [
-                {
-                    'role': 'system',
-                    'content': system_prompt
-                }
-            ]
-            
-            # 添加对话历史（如果有的话）
-            if conversation_history:
-                messages.extend(conversation_history)
-            
-            # 添加当前用户输入
-            messages.append({
-                'role': 'user',
-                'content': user_input
-            })
+            messages = self._build_messages(user_input, conversation_history)
             
             # 记录发送给模型的请求
             request_data = {
-                "model": self.model,
+                "model": self.model_name,
                 "messages": messages,
+                "format": PromptManager.CHAT_RESPONSE_SCHEMA,  # 使用JSON Schema约束输出格式
+                "keep_alive": self.keep_alive,
+                "options": self.options,
                 "stream": False
             }
             self._log_request(messages)
             
             # 调用Ollama API
-            response = requests.post(
-                f"{self.api_base}/chat",
-                json=request_data,
-                headers={"Content-Type": "application/json"}
-            )
+            with self._timed('llm_provider_call'):
+                response = requests.post(
+                    f"{self.api_base}/chat",
+                    json=request_data,
+                    headers={"Content-Type": "application/json"}
+                )
             
             if response.status_code == 200:
                 result = response.json()
+                self._record_usage(result.get('prompt_eval_count'), result.get('eval_count'))
                 ai_response = result['message']['content']
                 
                 # 记录模型的响应
                 self._log_response(ai_response)
                 
-                # 尝试解析JSON格式的回复
-                try:
-                    # 如果AI在JSON前后添加了其他内容，尝试提取JSON部分
-                    json_match = re.search(r'\{.*\}', ai_response, re.DOTALL)
-                    if json_match:
-                        json_text = json_match.group(0)
-                        parsed_response = json.loads(json_text)
-                    else:
-                        # 直接尝试解析整个回复
-                        parsed_response = json.loads(ai_response)
-                except json.JSONDecodeError:
-                    # 如果JSON解析失败，使用原始响应作为message字段
-                    parsed_response = {
-                        'japanese': ai_response,
-                        'hiragana': '暂无平假名',
-                        'chinese': '暂无翻译',
-                        'pronunciation_score': 85,
-                        'next_suggestion': 'お元気ですか？',
-                        'suggestion_hiragana': 'おげんきですか？',
-                        'suggestion_chinese': '你好吗？'
-                    }
-                
-                # 确保所有字段都有默认值
-                return {
-                    'message': parsed_response.get('japanese'),
-                    'translation': parsed_response.get('chinese', '暂无翻译'),
-                    'hiragana': parsed_response.get('hiragana', '暂无平假名'),
-                    'pronunciation_score': parsed_response.get('pronunciation_score', 85),
-                    'user_pronunciation_score': 80,  # 默认用户发音评分
-                    'next_suggestion': parsed_response.get('next_suggestion', 'お元気ですか？'),
-                    'suggestion_hiragana': parsed_response.get('suggestion_hiragana', 'おげんきですか？'),
-                    'suggestion_translation': parsed_response.get('suggestion_chinese', '你好吗？')
-                }
+                # 解析JSON格式的回复（必要时进行本地修复）
+                return self._parse_chat_response(ai_response)
             else:
                 error_msg = f"Ollama API调用失败: {response.text}"
                 self.logger.error(error_msg)
@@ -132,51 +213,42 @@ class OllamaService(LLMBaseService):
                 'error': str(e)
             }
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def correct_grammar(self, text: str) -> Dict[str, Any]:
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10), reraise=True)
+    def _complete(self, system_prompt: str, prompt: str, stage: str = 'llm_grammar_call') -> str:
         """
-        语法纠错
-        :param text: 需要纠错的文本
-        :return: 纠错结果
+        发送单轮请求并返回模型输出的文本
+        :param system_prompt: 系统提示词
+        :param prompt: 用户提示词
+        :param stage: 耗时指标的阶段名称
+        :return: 模型输出的文本
         """
-        try:
-            # 使用集中管理的语法纠错提示词
-            prompt = PromptManager.JAPANESE_GRAMMAR_CORRECTION.format(text=text)
-            
-            # 记录发送给模型的请求
-            request_data = {
-                "model": self.model,
-                "prompt": "你是一个专业的日语语法纠正助手。" + prompt,
-                "stream": False
-            }
-            self._log_request([{'role': 'user', 'content': request_data['prompt']}])
-            
-            # 调用Ollama API进行语法纠错
+        request_data = {
+            "model": self.model_name,
+            "system": system_prompt,
+            "prompt": prompt,
+            "format": "json",
+            "keep_alive": self.keep_alive,
+            "options": self.options,
+            "stream": False
+        }
+        # 记录发送给模型的请求
+        self._log_request([{'role': 'system', 'content': system_prompt}, {'role': 'user', 'content': prompt}])
+        
+        with self._timed(stage):
             response = requests.post(
                 f"{self.api_base}/generate",
                 json=request_data,
                 headers={"Content-Type": "application/json"}
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                correction_result = result['response']
-                
-                # 记录模型的响应
-                self._log_response(correction_result)
-                
-                return {
-                    'corrected_text': correction_result,
-                    'errors': [],  # 在实际应用中可以解析错误详情
-                    'suggestions': []
-                }
-            else:
-                error_msg = f"Ollama语法纠错API调用失败: {response.text}"
-                self.logger.error(error_msg)
-                raise ServiceCallError(error_msg)
-                
-        except Exception as e:
-            self.logger.error(f"语法纠错时出错: {str(e)}")
-            return {
-                'error': str(e)
-            }
\ No newline at end of file
+        
+        if response.status_code != 200:
+            error_msg = f"Ollama API调用失败: {response.text}"
+            self.logger.error(error_msg)
+            raise ServiceCallError(error_msg)
+        
+        result = response.json()
+        self._record_usage(result.get('prompt_eval_count'), result.get('eval_count'))
+        
+        # 记录模型的响应
+        self._log_response(result['response'])
+        return result['response']
@@ -0,0 +1,219 @@
+import wave
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+
+from ...exceptions import AudioProcessingError
+
+# 特征提取参数（16kHz单声道，25ms帧长，10ms帧移）
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 400
+FRAME_STEP = 160
+N_FFT = 512
+N_MELS = 26
+N_MFCC = 13
+PRE_EMPHASIS = 0.97
+# 低于最大帧能量该比例（dB）的首尾帧视为静音
+SILENCE_THRESHOLD_DB = 35.0
+# 帧能量高于该值（dBFS）才视为有声帧；有声帧少于MIN_VOICED_FRAMES（0.1秒）时视为没有说话
+VOICE_THRESHOLD_DBFS = -45.0
+MIN_VOICED_FRAMES = 10
+
+
+def load_wav(audio_file_path: str) -> np.ndarray:
+    """
+    读取WAV文件并转换为16kHz单声道浮点数组
+
+    :param audio_file_path: WAV文件路径
+    :return: 取值范围[-1, 1]的音频采样
+    """
+    try:
+        with wave.open(audio_file_path, 'rb') as wav_file:
+            n_channels = wav_file.getnchannels()
+            sample_width = wav_file.getsampwidth()
+            sample_rate = wav_file.getframerate()
+            frames = wav_file.readframes(wav_file.getnframes())
+    except (wave.Error, EOFError) as e:
+        raise AudioProcessingError(f"无法读取WAV音频: {e}")
+
+    return pcm_to_float(frames, sample_width, n_channels, sample_rate)
+
+
+def pcm_to_float(frames: bytes, sample_width: int, n_channels: int, sample_rate: int) -> np.ndarray:
+    """
+    将PCM字节数据转换为16kHz单声道浮点数组
+
+    :param frames: PCM字节数据
+    :param sample_width: 采样字节数（1、2或4）
+    :param n_channels: 声道数
+    :param sample_rate: 采样率
+    :return: 取值范围[-1, 1]的音频采样
+    """
+    if sample_width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768.0
+    elif sample_width == 4:
+        samples = np.frombuffer(frames, dtype='<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise AudioProcessingError(f"不支持的采样位宽: {sample_width * 8} bit")
+
+    if n_channels > 1:
+        samples = samples[:len(samples) - len(samples) % n_channels].reshape(-1, n_channels).mean(axis=1)
+
+    return resample(samples, sample_rate, SAMPLE_RATE)
+
+
+def resample(samples: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """
+    线性插值重采样（语音评分场景下精度足够）
+
+    :param samples: 音频采样
+    :param source_rate: 原采样率
+    :param target_rate: 目标采样率
+    :return: 重采样后的音频
+    """
+    if source_rate == target_rate or len(samples) == 0:
+        return samples
+    target_length = int(round(len(samples) * target_rate / source_rate))
+    source_positions = np.linspace(0, len(samples) - 1, num=target_length)
+    return np.interp(source_positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+@lru_cache(maxsize=4)
+def _mel_filterbank(sample_rate: int, n_fft: int, n_mels: int) -> np.ndarray:
+    """
+    生成梅尔滤波器组矩阵
+
+    :return: 形状为 (n_mels, n_fft // 2 + 1) 的滤波器矩阵
+    """
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    mel_points = np.linspace(hz_to_mel(0.0), hz_to_mel(sample_rate / 2.0), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mel_points) / sample_rate).astype(int)
+
+    filterbank = np.zeros((n_mels, n_fft // 2 + 1), dtype=np.float32)
+    for m in range(1, n_mels + 1):
+        left, center, right = bins[m - 1], bins[m], bins[m + 1]
+        if center > left:
+            filterbank[m - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            filterbank[m - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+    return filterbank
+
+
+@lru_cache(maxsize=4)
+def _dct_matrix(n_mels: int, n_mfcc: int) -> np.ndarray:
+    """
+    生成正交DCT-II矩阵
+
+    :return: 形状为 (n_mels, n_mfcc) 的DCT矩阵
+    """
+    n = np.arange(n_mels)
+    k = np.arange(n_mfcc)
+    dct = np.cos(np.pi / n_mels * (n[:, None] + 0.5) * k[None, :]) * np.sqrt(2.0 / n_mels)
+    dct[:, 0] /= np.sqrt(2.0)
+    return dct.astype(np.float32)
+
+
+def frame_signal(samples: np.ndarray) -> np.ndarray:
+    """
+    对音频分帧（不复制数据的滑动窗口视图）
+
+    :param samples: 音频采样
+    :return: 形状为 (帧数, FRAME_LENGTH) 的帧矩阵
+    """
+    if len(samples) < FRAME_LENGTH:
+        samples = np.pad(samples, (0, FRAME_LENGTH - len(samples)))
+    return np.lib.stride_tricks.sliding_window_view(samples, FRAME_LENGTH)[::FRAME_STEP]
+
+
+def trim_silence(frames: np.ndarray) -> np.ndarray:
+    """
+    去除首尾的静音帧
+
+    :param frames: 帧矩阵
+    :return: 去除首尾静音后的帧矩阵
+    """
+    energy_db = 10.0 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    voiced = np.flatnonzero(energy_db > energy_db.max() - SILENCE_THRESHOLD_DB)
+    if len(voiced) == 0:
+        return frames
+    return frames[voiced[0]:voiced[-1] + 1]
+
+
+def has_voice(samples: np.ndarray) -> bool:
+    """
+    录音中是否有说话的声音（空录音、静音或只有底噪时为False）
+
+    :param samples: 16kHz单声道音频采样
+    :return: 有声帧是否达到MIN_VOICED_FRAMES
+    """
+    if len(samples) == 0:
+        return False
+    energy_dbfs = 10.0 * np.log10(np.mean(frame_signal(samples) ** 2, axis=1) + 1e-10)
+    return int(np.count_nonzero(energy_dbfs > VOICE_THRESHOLD_DBFS)) >= MIN_VOICED_FRAMES
+
+
+def extract_mfcc(samples: np.ndarray) -> np.ndarray:
+    """
+    提取经过倒谱均值方差归一化（CMVN）的MFCC特征
+
+    :param samples: 16kHz单声道音频采样
+    :return: 形状为 (帧数, N_MFCC) 的特征矩阵
+    """
+    return _cmvn(_frames_to_mfcc(_prepare_frames(samples)))
+
+
+def extract_mfcc_batch(signals: List[np.ndarray]) -> List[np.ndarray]:
+    """
+    批量提取MFCC特征：所有录音的帧拼接成一个矩阵，只做一次FFT、梅尔滤波和DCT
+
+    :param signals: 多段16kHz单声道音频采样
+    :return: 每段音频的特征矩阵
+    """
+    if not signals:
+        return []
+    frames = [_prepare_frames(samples) for samples in signals]
+    mfcc = _frames_to_mfcc(np.concatenate(frames))
+    offsets = np.cumsum([len(f) for f in frames])[:-1]
+    return [_cmvn(features) for features in np.split(mfcc, offsets)]
+
+
+def _prepare_frames(samples: np.ndarray) -> np.ndarray:
+    """
+    预加重、分帧并去除首尾静音
+
+    :param samples: 16kHz单声道音频采样
+    :return: 帧矩阵
+    """
+    emphasized = np.append(samples[:1], samples[1:] - PRE_EMPHASIS * samples[:-1])
+    return trim_silence(frame_signal(emphasized))
+
+
+def _frames_to_mfcc(frames: np.ndarray) -> np.ndarray:
+    """
+    计算帧矩阵的MFCC
+
+    :param frames: 帧矩阵
+    :return: 形状为 (帧数, N_MFCC) 的MFCC矩阵
+    """
+    window = np.hamming(FRAME_LENGTH).astype(np.float32)
+    power_spectrum = np.abs(np.fft.rfft(frames * window, n=N_FFT)) ** 2 / N_FFT
+    mel_energy = power_spectrum @ _mel_filterbank(SAMPLE_RATE, N_FFT, N_MELS).T
+    return np.log(mel_energy + 1e-10) @ _dct_matrix(N_MELS, N_MFCC)
+
+
+def _cmvn(mfcc: np.ndarray) -> np.ndarray:
+    """
+    倒谱均值方差归一化，消除说话人和录音设备带来的整体偏差
+
+    :param mfcc: MFCC矩阵
+    :return: 归一化后的特征
+    """
+    return ((mfcc - mfcc.mean(axis=0)) / (mfcc.std(axis=0) + 1e-8)).astype(np.float32)
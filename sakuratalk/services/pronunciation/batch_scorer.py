@@ -0,0 +1,107 @@
+import multiprocessing
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from ...config import Config
+from .audio_features import extract_mfcc_batch, has_voice, load_wav
+from .mora import split_morae
+from .pronunciation_scorer import NO_VOICE_ERROR, score_features
+
+# 逐拍得分低于该值的拍计入薄弱拍统计
+WEAK_MORA_SCORE = 60
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    获取共享的进程池（首次调用时创建），避免每次批量评分都重新启动子进程
+
+    进程池在服务已启动多个线程之后才创建，以fork方式启动的子进程可能继承其他线程
+    持有的锁而死锁，因此使用spawn方式启动子进程。
+
+    :param max_workers: 进程数，缺省时使用配置值
+    :return: 进程池
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=max_workers or Config.PRONUNCIATION_BATCH_WORKERS or None,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        return _process_pool
+
+
+def score_batch(scorer, items: List[Dict[str, Any]], executor=None) -> Dict[str, Any]:
+    """
+    批量发音评分（用于跟读练习的课后报告）
+
+    参考特征在主进程中通过评分器的缓存获取（相同句子只合成一次），学习者录音的
+    MFCC在主进程中批量提取，逐句的DTW对齐分发到进程池并行计算。
+
+    :param scorer: PronunciationScorer实例
+    :param items: 待评分条目，每项包含audio_path、expected_text和可选的expected_hiragana
+    :param executor: 执行DTW对齐的执行器，缺省时使用共享进程池
+    :return: 包含逐句结果results和汇总结果summary的报告
+    """
+    results: List[Dict[str, Any]] = [None] * len(items)
+    signals, valid_indexes = [], []
+    for index, item in enumerate(items):
+        try:
+            samples = load_wav(item['audio_path'])
+        except Exception as e:
+            results[index] = {'expected_text': item.get('expected_text'), 'error': str(e)}
+            continue
+        if has_voice(samples):
+            signals.append(samples)
+            valid_indexes.append(index)
+        else:
+            results[index] = {'expected_text': item.get('expected_text'), 'error': NO_VOICE_ERROR}
+
+    learner_features = extract_mfcc_batch(signals)
+
+    executor = executor or get_process_pool()
+    futures = {}
+    for index, features in zip(valid_indexes, learner_features):
+        item = items[index]
+        try:
+            reference = scorer.get_reference_features(item['expected_text'])
+        except Exception as e:
+            results[index] = {'expected_text': item['expected_text'], 'error': str(e)}
+            continue
+        morae = split_morae(item.get('expected_hiragana') or item['expected_text'])
+        futures[index] = executor.submit(score_features, features, reference, morae)
+
+    for index, future in futures.items():
+        try:
+            results[index] = {'expected_text': items[index]['expected_text'], **future.result()}
+        except Exception as e:
+            results[index] = {'expected_text': items[index]['expected_text'], 'error': str(e)}
+
+    return {'results': results, 'summary': summarize(results)}
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    汇总批量评分结果
+
+    :param results: 逐句评分结果
+    :return: 汇总结果（平均分、最高/最低分、失败数量和最常见的薄弱拍）
+    """
+    scores = [r['score'] for r in results if 'score' in r]
+    weak_morae = Counter(
+        mora['mora']
+        for r in results if 'mora_scores' in r
+        for mora in r['mora_scores'] if mora['score'] < WEAK_MORA_SCORE
+    )
+    return {
+        'count': len(results),
+        'scored': len(scores),
+        'failed': len(results) - len(scores),
+        'average_score': round(sum(scores) / len(scores), 1) if scores else None,
+        'min_score': min(scores) if scores else None,
+        'max_score': max(scores) if scores else None,
+        'weak_morae': [{'mora': mora, 'count': count} for mora, count in weak_morae.most_common(10)]
+    }
@@ -0,0 +1,76 @@
+"""
+跟读练习批量发音评分命令行工具
+
+用法：
+    python -m sakuratalk.services.pronunciation.cli drill.csv --output report.json
+
+清单文件为CSV（表头：audio,expected_text,expected_hiragana）或JSON数组，
+audio为WAV文件路径（相对路径以清单文件所在目录为基准）。
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ...factory import ServiceFactory
+from ...logging_config import setup_logging
+from .batch_scorer import score_batch
+from .pronunciation_scorer import PronunciationScorer
+
+
+def load_manifest(manifest_path: str):
+    """
+    读取评分清单
+
+    :param manifest_path: CSV或JSON清单文件路径
+    :return: 待评分条目列表
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, encoding='utf-8') as f:
+        if manifest_path.endswith('.json'):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+
+    return [
+        {
+            'audio_path': os.path.join(base_dir, row['audio']),
+            'expected_text': row['expected_text'],
+            'expected_hiragana': row.get('expected_hiragana') or None
+        }
+        for row in rows
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='跟读练习批量发音评分')
+    parser.add_argument('manifest', help='CSV或JSON清单文件')
+    parser.add_argument('--output', help='报告输出路径（JSON），缺省时输出到标准输出')
+    parser.add_argument('--workers', type=int, default=None, help='并行评分的进程数')
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    items = load_manifest(args.manifest)
+    scorer = PronunciationScorer(ServiceFactory.create_tts_service())
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        report = score_batch(scorer, items, executor=executor)
+    report['summary']['elapsed_seconds'] = round(time.perf_counter() - start, 3)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    summary = report['summary']
+    print(f"已评分 {summary['scored']}/{summary['count']} 句，平均分: {summary['average_score']}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def pairwise_distances(query: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    """
+    计算两组特征帧之间的欧氏距离矩阵
+
+    :param query: 形状为 (N, D) 的特征
+    :param reference: 形状为 (M, D) 的特征
+    :return: 形状为 (N, M) 的距离矩阵
+    """
+    squared = (
+        np.sum(query ** 2, axis=1)[:, None]
+        + np.sum(reference ** 2, axis=1)[None, :]
+        - 2.0 * query @ reference.T
+    )
+    return np.sqrt(np.maximum(squared, 0.0))
+
+
+def dtw_align(query: np.ndarray, reference: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    使用动态时间规整（DTW）将学习者的特征帧对齐到参考特征帧
+
+    每个学习者帧对应一个参考帧，相邻学习者帧之间参考帧前进0、1或2帧。
+    这种步进约束使每一行只依赖上一行，因此可以按行向量化计算。
+
+    :param query: 学习者特征，形状为 (N, D)
+    :param reference: 参考特征，形状为 (M, D)
+    :return: (每个学习者帧对应的参考帧索引, 每个学习者帧的对齐距离)
+    """
+    n, m = len(query), len(reference)
+    cost = pairwise_distances(query, reference)
+    columns = np.arange(m)
+
+    accumulated = np.full(m, np.inf)
+    accumulated[0] = cost[0, 0]
+    steps = np.zeros((n, m), dtype=np.int8)
+    candidates = np.full((3, m), np.inf)
+
+    for i in range(1, n):
+        candidates[0] = accumulated
+        candidates[1, 1:] = accumulated[:-1]
+        candidates[2, 2:] = accumulated[:-2]
+        best = np.argmin(candidates, axis=0)
+        steps[i] = best
+        accumulated = cost[i] + candidates[best, columns]
+
+    if np.isfinite(accumulated[-1]):
+        path = np.empty(n, dtype=np.int64)
+        j = m - 1
+        path[-1] = j
+        for i in range(n - 1, 0, -1):
+            j -= int(steps[i, j])
+            path[i - 1] = j
+    else:
+        # 学习者语速远快于参考音频时无法满足步进约束，退化为线性对齐
+        path = np.minimum((np.arange(n) * m) // max(n, 1), m - 1)
+
+    return path, cost[np.arange(n), path]
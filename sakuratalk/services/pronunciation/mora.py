@@ -0,0 +1,41 @@
+import re
+from typing import List
+
+# 与前一个假名合并为一个拍的小写假名（拗音等）
+_SMALL_KANA = set('ゃゅょぁぃぅぇぉゎ')
+# 片假名与平假名的码位差
+_KATAKANA_OFFSET = ord('ア') - ord('あ')
+# 评分时忽略的标点和空白
+_IGNORED_PATTERN = re.compile(r'[\s、。，．,.!?！？「」『』（）()・〜~]')
+
+
+def to_hiragana(text: str) -> str:
+    """
+    将片假名转换为平假名
+
+    :param text: 输入文本
+    :return: 平假名文本
+    """
+    return ''.join(
+        chr(ord(char) - _KATAKANA_OFFSET) if 'ァ' <= char <= 'ヶ' else char
+        for char in text
+    )
+
+
+def split_morae(text: str) -> List[str]:
+    """
+    将假名文本切分为拍（mora）
+
+    拗音（きゃ等）合并为一拍，促音「っ」、拨音「ん」和长音「ー」各自为一拍；
+    汉字等非假名字符按单个字符处理。
+
+    :param text: 假名文本
+    :return: 拍列表
+    """
+    morae = []
+    for char in to_hiragana(_IGNORED_PATTERN.sub('', text)):
+        if char in _SMALL_KANA and morae:
+            morae[-1] += char
+        else:
+            morae.append(char)
+    return morae
@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ...config import Config
+from ...exceptions import ServiceCallError
+from ...metrics import record_cache, timed
+from .audio_features import extract_mfcc, has_voice, load_wav
+from .dtw import dtw_align
+from .mora import split_morae
+
+logger = logging.getLogger(__name__)
+
+# 录音为空或没有说话声音时的错误信息（不评分，避免静音得到一个很低的分数）
+NO_VOICE_ERROR = '录音中没有检测到语音'
+
+
+def distance_to_score(distance: np.ndarray) -> np.ndarray:
+    """
+    将对齐距离线性映射为0–100的分数
+
+    :param distance: 对齐距离
+    :return: 分数
+    """
+    good, bad = Config.PRONUNCIATION_GOOD_DISTANCE, Config.PRONUNCIATION_BAD_DISTANCE
+    return np.clip((bad - distance) / (bad - good), 0.0, 1.0) * 100.0
+
+
+def score_features(learner: np.ndarray, reference: np.ndarray, morae: List[str]) -> Dict[str, Any]:
+    """
+    根据学习者与参考音频的MFCC特征计算逐拍发音评分
+
+    参考音频按拍数均分为若干段，学习者的每一帧经DTW对齐后归入对应的拍；
+    没有任何学习者帧对齐到的拍（漏读）记0分。
+
+    :param learner: 学习者特征
+    :param reference: 参考特征
+    :param morae: 期望文本的拍列表
+    :return: 评分结果
+    """
+    units = morae or ['']
+    path, frame_costs = dtw_align(learner, reference)
+
+    # 参考帧 → 拍 的映射
+    boundaries = np.linspace(0, len(reference), len(units) + 1)
+    mora_of_frame = np.searchsorted(boundaries, np.arange(len(reference)), side='right') - 1
+    learner_mora = mora_of_frame[path]
+
+    counts = np.bincount(learner_mora, minlength=len(units))
+    cost_sums = np.bincount(learner_mora, weights=frame_costs, minlength=len(units))
+    mora_distances = np.where(counts > 0, cost_sums / np.maximum(counts, 1), np.inf)
+    mora_scores = distance_to_score(mora_distances)
+
+    return {
+        'score': int(round(float(mora_scores.mean()))),
+        'distance': round(float(frame_costs.mean()), 3),
+        'mora_scores': [
+            {'mora': mora, 'score': int(round(float(score)))}
+            for mora, score in zip(units, mora_scores)
+        ]
+    }
+
+
+class PronunciationScorer:
+    """
+    发音评分：将学习者录音与TTS合成的参考发音进行声学对齐（MFCC + DTW），给出逐拍评分
+    """
+    def __init__(self, tts_service, cache_dir: Optional[str] = None, cache_size: Optional[int] = None):
+        """
+        初始化发音评分器
+
+        :param tts_service: 用于合成参考发音的TTS服务
+        :param cache_dir: 参考特征的磁盘缓存目录
+        :param cache_size: 内存中缓存的参考特征数量
+        """
+        self.logger = logger
+        self.tts_service = tts_service
+        self.cache_dir = cache_dir or Config.PRONUNCIATION_CACHE_DIR
+        self.cache_size = cache_size or Config.PRONUNCIATION_CACHE_SIZE
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def get_reference_features(self, text: str) -> np.ndarray:
+        """
+        获取参考发音特征：依次查找内存缓存、磁盘缓存，都未命中时调用TTS合成
+
+        :param text: 期望的日语文本
+        :return: 参考MFCC特征
+        """
+        with self._lock:
+            features = self._cache.get(text)
+            if features is not None:
+                self._cache.move_to_end(text)
+                self.cache_hits += 1
+                record_cache('pronunciation_reference', True)
+                return features
+
+        cache_path = os.path.join(self.cache_dir, hashlib.sha1(text.encode('utf-8')).hexdigest() + '.npy')
+        if os.path.exists(cache_path):
+            features = np.load(cache_path)
+            self.cache_hits += 1
+            record_cache('pronunciation_reference', True)
+        else:
+            self.cache_misses += 1
+            record_cache('pronunciation_reference', False)
+            features = self._synthesize_reference(text)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.save(cache_path, features)
+
+        with self._lock:
+            self._cache[text] = features
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return features
+
+    def _synthesize_reference(self, text: str) -> np.ndarray:
+        """
+        合成参考发音并提取特征
+
+        :param text: 期望的日语文本
+        :return: 参考MFCC特征
+        """
+        # 特征提取需要WAV格式
+        response = self.tts_service.synthesize_text(text, language='ja', audio_format='wav')
+        if 'error' in response:
+            raise ServiceCallError(f"参考发音合成失败: {response['error']}")
+        self.logger.info(f"已合成参考发音: {text}")
+        return extract_mfcc(load_wav(response['audio_path']))
+
+    def score(self, audio_file_path: str, expected_text: str, expected_hiragana: Optional[str] = None) -> Dict[str, Any]:
+        """
+        对学习者录音进行发音评分
+
+        :param audio_file_path: 学习者录音（WAV）
+        :param expected_text: 期望的日语文本（例如上一轮的建议句子）
+        :param expected_hiragana: 期望文本的平假名，用于切分拍；缺省时使用期望文本
+        :return: 评分结果，包含总分score、平均对齐距离distance和逐拍评分mora_scores；
+                 录音为空或没有说话声音时只包含error
+        """
+        samples = load_wav(audio_file_path)
+        if not has_voice(samples):
+            return {'error': NO_VOICE_ERROR}
+        reference = self.get_reference_features(expected_text)
+        with timed('pronunciation_scoring', 'local', 'mfcc_dtw'):
+            learner = extract_mfcc(samples)
+            return score_features(learner, reference, split_morae(expected_hiragana or expected_text))
@@ -21,11 +21,14 @@ class AliyunSTTService(STTBaseService):
     """
     阿里云语音识别服务
     """
+    provider_name = 'dashscope'
+    
     def __init__(self):
         """
         初始化阿里云STT服务
         """
         super().__init__()
+        self.model_name = 'paraformer-realtime-v2'
         # 初始化DashScope
         dashscope.api_key = Config.DASHSCOPE_API_KEY
     
@@ -48,20 +51,25 @@ class AliyunSTTService(STTBaseService):
             # 对于实际的音频文件，使用阿里云的语音识别服务
             # 创建Recognition实例
             recognition = Recognition(
-                model='paraformer-realtime-v2',
+                model=self.model_name,
                 format='wav',
                 sample_rate=16000,
                 callback=None  # 简单场景下可以不使用回调
             )
             
             # 调用语音识别服务
-            response = recognition.call(file=audio_file_path)
+            with self._timed('stt_recognition'):
+                response = recognition.call(file=audio_file_path)
             
             # 检查响应状态
             if response.status_code == 200 and response.output:
+                # 同步调用返回已结束的句子列表，拼接为完整文本
+                sentences = response.get_sentence() or []
+                if isinstance(sentences, dict):
+                    sentences = [sentences]
                 return {
-                    'result': response.output.text,
-                    'confidence': response.output.confidence
+                    'result': ''.join(sentence.get('text', '') for sentence in sentences),
+                    'confidence': 0.9  # Paraformer不返回置信度，这里使用默认值
                 }
             else:
                 raise ServiceCallError(f"语音识别失败: {response.message}")
@@ -14,11 +14,14 @@ class LocalSTTService(STTBaseService):
     """
     本地语音识别服务（使用SpeechRecognition库）
     """
+    provider_name = 'local'
+    
     def __init__(self):
         """
         初始化本地STT服务
         """
         super().__init__()
+        self.model_name = 'speech_recognition'
         self.recognizer = sr.Recognizer()
     
     def recognize_voice(self, audio_file_path: Optional[str] = None) -> Dict[str, Any]:
@@ -43,7 +46,8 @@ class LocalSTTService(STTBaseService):
             # 注意：这需要安装PyAudio和网络连接
             try:
                 # 尝试使用Google语音识别
-                text = self.recognizer.recognize_google(audio_data, language="ja-JP")
+                with self._timed('stt_recognition'):
+                    text = self.recognizer.recognize_google(audio_data, language="ja-JP")
                 return {
                     'result': text,
                     'confidence': 0.9  # Google API不直接返回置信度，这里使用默认值
@@ -51,7 +55,8 @@ class LocalSTTService(STTBaseService):
             except sr.UnknownValueError:
                 # 如果Google识别失败，尝试使用Sphinx（离线识别）
                 try:
-                    text = self.recognizer.recognize_sphinx(audio_data, language="ja")
+                    with self._timed('stt_recognition'):
+                        text = self.recognizer.recognize_sphinx(audio_data, language="ja")
                     return {
                         'result': text,
                         'confidence': 0.7  # Sphinx置信度较低
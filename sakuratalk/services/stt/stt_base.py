@@ -2,26 +2,32 @@ from abc import ABC, abstractmethod
 import logging
 from typing import Dict, Any, Optional
 
-# 配置日志
+from ...tracing import trace_methods
+from ...metrics import timed
+
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
 
 
 class STTBaseService(ABC):
     """
     STT服务基类
     """
+    # 服务商名称，用于指标标签
+    provider_name = ''
+    
+    def __init_subclass__(cls, **kwargs):
+        """
+        为子类实现的服务调用自动添加追踪span
+        """
+        super().__init_subclass__(**kwargs)
+        trace_methods(cls, 'stt', ('recognize_voice',))
     
     def __init__(self):
         """
         初始化STT服务
         """
         self.logger = logger
+        self.model_name = ''
     
     @abstractmethod
     def recognize_voice(self, audio_file_path: Optional[str] = None) -> Dict[str, Any]:
@@ -31,4 +37,12 @@ class STTBaseService(ABC):
         :param audio_file_path: 音频文件路径
         :return: 识别结果
         """
-        pass
\ No newline at end of file
+        pass
+    
+    def _timed(self, stage: str):
+        """
+        记录阶段耗时，自动带上服务商和模型标签
+        
+        :param stage: 阶段名称
+        """
+        return timed(stage, self.provider_name, self.model_name)
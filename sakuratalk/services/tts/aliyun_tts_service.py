@@ -1,12 +1,11 @@
 import json
 import threading
-import time
 import dashscope
 from dashscope import Generation
 from dashscope.audio.asr import Recognition
 import sys
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -21,52 +20,46 @@ class AliyunTTSService(TTSBaseService):
     """
     阿里云语音合成服务
     """
+    provider_name = 'dashscope'
+    # DashScope可以直接合成MP3（不支持Opus）
+    native_formats = ('wav', 'mp3')
+    
     def __init__(self):
         """
         初始化阿里云TTS服务
         """
         super().__init__()
+        self.model_name = 'sambert-zhichu-v1'
         # 初始化DashScope
         dashscope.api_key = Config.DASHSCOPE_API_KEY
     
-    def synthesize_text(self, text: str, language: str = 'zh') -> Dict[str, Any]:
+    def synthesize_text(self, text: str, language: str = 'zh', audio_format: Optional[str] = None) -> Dict[str, Any]:
         """
         将文本合成为语音
         :param text: 要合成的文本
         :param language: 语言代码
+        :param audio_format: 输出格式（wav、mp3、opus），缺省时使用TTS_AUDIO_FORMAT
         :return: 音频文件URL或数据
         """
         try:
+            target_format = self._resolve_format(audio_format)
+            # 服务商不支持的格式先合成WAV，再在本地转换
+            synth_format = target_format if target_format in self.native_formats else 'wav'
+            
             # 使用DashScope的TTS功能
-            # 注意：实际部署时需要处理音频文件的存储和访问
-            response = dashscope.audio.tts.SpeechSynthesizer.call(
-                model='sambert-zhichu-v1',
-                text=text,
-                speech_rate=0,
-                volume=50,
-                output_format='wav'
-            )
+            with self._timed('tts_synthesis'):
+                response = dashscope.audio.tts.SpeechSynthesizer.call(
+                    model=self.model_name,
+                    text=text,
+                    speech_rate=0,
+                    volume=50,
+                    format=synth_format
+                )
             
             # 检查响应是否成功并包含音频数据
             if response.get_audio_data() is not None:
-                # 保存音频数据到文件
-                audio_filename = f"synthesized_{int(time.time())}.wav"
-                audio_path = os.path.join(os.path.dirname(__file__), '..', '..', 'static', 'audio')
-                
-                # 确保audio目录存在
-                os.makedirs(audio_path, exist_ok=True)
-                
-                # 保存音频文件
-                full_audio_path = os.path.join(audio_path, audio_filename)
-                with open(full_audio_path, 'wb') as f:
-                    f.write(response.get_audio_data())
-                
-                # 返回音频文件的URL
-                audio_url = f'/static/audio/{audio_filename}'
-                return {
-                    'audio_url': audio_url,
-                    'format': 'wav'
-                }
+                # 保存音频数据到文件并返回音频文件的URL
+                return self._save_audio(response.get_audio_data(), 'synthesized', synth_format, target_format)
             else:
                 # 如果没有音频数据，尝试从response中获取错误信息
                 if hasattr(response, 'message'):
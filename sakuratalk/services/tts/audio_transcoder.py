@@ -0,0 +1,65 @@
+"""
+使用ffmpeg将合成的WAV音频转换为压缩格式（Opus、MP3）
+"""
+import shutil
+import subprocess
+from typing import Optional
+
+from ...config import Config
+from ...exceptions import AudioProcessingError
+
+# 目标格式 -> ffmpeg的编码器、容器和码率配置
+ENCODERS = {
+    'opus': ('libopus', 'ogg', lambda: Config.TTS_OPUS_BITRATE),
+    'mp3': ('libmp3lame', 'mp3', lambda: Config.TTS_MP3_BITRATE)
+}
+
+_ffmpeg_path: Optional[str] = None
+
+
+def ffmpeg_path() -> Optional[str]:
+    """
+    查找ffmpeg可执行文件
+
+    :return: ffmpeg路径，未安装时返回None
+    """
+    global _ffmpeg_path
+    if _ffmpeg_path is None:
+        _ffmpeg_path = shutil.which(Config.FFMPEG_PATH) or ''
+    return _ffmpeg_path or None
+
+
+def transcode(audio_data: bytes, source_format: str, target_format: str, timeout: float = 30) -> bytes:
+    """
+    转换音频格式（通过管道调用ffmpeg，不写临时文件）
+
+    :param audio_data: 原始音频数据
+    :param source_format: 原始格式（例如wav）
+    :param target_format: 目标格式（opus或mp3）
+    :param timeout: 超时时间（秒）
+    :return: 转换后的音频数据
+    :raises AudioProcessingError: 不支持的格式、未安装ffmpeg或转换失败
+    """
+    if target_format not in ENCODERS:
+        raise AudioProcessingError(f"不支持的音频格式: {target_format}")
+    ffmpeg = ffmpeg_path()
+    if ffmpeg is None:
+        raise AudioProcessingError(f"未找到ffmpeg（{Config.FFMPEG_PATH}），无法转换为{target_format}")
+
+    codec, container, bitrate = ENCODERS[target_format]
+    # 语音为单声道，压缩格式使用语音优化的码率
+    command = [
+        ffmpeg, '-hide_banner', '-loglevel', 'error',
+        '-f', source_format, '-i', 'pipe:0',
+        '-ac', '1', '-c:a', codec, '-b:a', bitrate(),
+        '-f', container, 'pipe:1'
+    ]
+    if target_format == 'opus':
+        command[-3:-3] = ['-application', 'voip']
+    try:
+        result = subprocess.run(command, input=audio_data, capture_output=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise AudioProcessingError(f"音频格式转换失败: {str(e)}")
+    if result.returncode != 0 or not result.stdout:
+        raise AudioProcessingError(f"音频格式转换失败: {result.stderr.decode('utf-8', 'replace').strip()}")
+    return result.stdout
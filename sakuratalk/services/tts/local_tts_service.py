@@ -1,8 +1,7 @@
 import sys
 import os
-import time
 import pyttsx3
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from .tts_base import TTSBaseService
 
@@ -11,11 +10,14 @@ class LocalTTSService(TTSBaseService):
     """
     本地文本转语音服务，优化语速与音色（pitch）
     """
+    provider_name = 'local'
+    
     def __init__(self):
         """
         初始化本地TTS服务
         """
         super().__init__()
+        self.model_name = 'pyttsx3'
         self.engine = pyttsx3.init()
         # 加快语速，例如设置为 240
         self.engine.setProperty('rate', 300)
@@ -36,25 +38,34 @@ class LocalTTSService(TTSBaseService):
         else:
             self.logger.warning("未找到日语语音包，将使用系统默认语音。")
 
-    def synthesize_text(self, text: str, language: str = 'ja') -> Dict[str, Any]:
+    def synthesize_text(self, text: str, language: str = 'ja', audio_format: Optional[str] = None) -> Dict[str, Any]:
         """
         合成语音并保存
         :param text: 要合成的文本
         :param language: 语言代码
+        :param audio_format: 输出格式（wav、mp3、opus），缺省时使用TTS_AUDIO_FORMAT
         :return: 音频文件信息
         """
         try:
-            audio_filename = f"local_synth_{int(time.time())}.wav"
-            audio_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'static', 'audio')
-            os.makedirs(audio_path, exist_ok=True)
-            full_audio_path = os.path.join(audio_path, audio_filename)
+            target_format = self._resolve_format(audio_format)
+            audio_filename = self._new_audio_filename('local_synth', 'wav')
+            full_audio_path = self._audio_file_path(audio_filename)
 
-            self.engine.save_to_file(text, full_audio_path)
-            self.engine.runAndWait()
+            # pyttsx3直接将合成结果写入文件，合成与写入无法分开计时
+            with self._timed('tts_synthesis'):
+                self.engine.save_to_file(text, full_audio_path)
+                self.engine.runAndWait()
 
-            audio_url = f'/static/audio/{audio_filename}'
+            if target_format != 'wav':
+                # pyttsx3只能输出WAV，转换为压缩格式后删除WAV文件
+                with open(full_audio_path, 'rb') as f:
+                    wav_data = f.read()
+                os.remove(full_audio_path)
+                return self._save_audio(wav_data, 'local_synth', 'wav', target_format)
+
+            audio_url = f'{self.AUDIO_URL_PREFIX}/{audio_filename}'
             self.logger.info(f"语音合成成功: {full_audio_path}")
-            return {'audio_url': audio_url, 'format': 'wav'}
+            return {'audio_url': audio_url, 'audio_path': full_audio_path, 'format': 'wav'}
 
         except Exception as e:
             self.logger.error(f"本地语音合成错误: {str(e)}")
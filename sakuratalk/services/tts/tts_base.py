@@ -1,35 +1,128 @@
 from abc import ABC, abstractmethod
 import logging
-from typing import Dict, Any
+import os
+import time
+import uuid
+from typing import Dict, Any, Optional
+
+from ...config import Config
+from ...exceptions import AudioProcessingError
+from ...tracing import trace_methods
+from ...metrics import timed
+from .audio_transcoder import transcode
 
-# 配置日志
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-if not logger.handlers:
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+
+# 可以输出的音频格式
+SUPPORTED_FORMATS = ('wav', 'mp3', 'opus')
 
 
 class TTSBaseService(ABC):
     """
     TTS服务基类
     """
+    # 服务商名称，用于指标标签
+    provider_name = ''
+    
+    # 合成音频的保存目录及对应的URL前缀
+    AUDIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'static', 'audio')
+    AUDIO_URL_PREFIX = '/audio'
+    
+    # 服务商可以直接合成的格式，其他格式在本地由WAV转换
+    native_formats = ('wav',)
+    
+    def __init_subclass__(cls, **kwargs):
+        """
+        为子类实现的服务调用自动添加追踪span
+        """
+        super().__init_subclass__(**kwargs)
+        trace_methods(cls, 'tts', ('synthesize_text',))
     
     def __init__(self):
         """
         初始化TTS服务
         """
         self.logger = logger
+        self.model_name = ''
     
     @abstractmethod
-    def synthesize_text(self, text: str, language: str = 'zh') -> Dict[str, Any]:
+    def synthesize_text(self, text: str, language: str = 'zh', audio_format: Optional[str] = None) -> Dict[str, Any]:
         """
         将文本合成为语音
         
         :param text: 要合成的文本
         :param language: 语言代码
-        :return: 音频文件URL或数据
+        :param audio_format: 输出格式（wav、mp3、opus），缺省时使用TTS_AUDIO_FORMAT
+        :return: 音频文件URL或数据（audio_url、audio_path、format）
+        """
+        pass
+    
+    @staticmethod
+    def _resolve_format(audio_format: Optional[str]) -> str:
+        """
+        确定输出格式，不支持的格式使用WAV
+        
+        :param audio_format: 请求的格式
+        :return: 输出格式
+        """
+        audio_format = (audio_format or Config.TTS_AUDIO_FORMAT).lower()
+        return audio_format if audio_format in SUPPORTED_FORMATS else 'wav'
+    
+    def _timed(self, stage: str):
+        """
+        记录阶段耗时，自动带上服务商和模型标签
+        
+        :param stage: 阶段名称
         """
-        pass
\ No newline at end of file
+        return timed(stage, self.provider_name, self.model_name)
+    
+    def _new_audio_filename(self, prefix: str, audio_format: str) -> str:
+        """
+        生成不重复的音频文件名（同一秒内的多次合成不会互相覆盖）
+        
+        :param prefix: 文件名前缀
+        :param audio_format: 音频格式（扩展名）
+        :return: 音频文件名
+        """
+        return f"{prefix}_{int(time.time())}_{uuid.uuid4().hex[:8]}.{audio_format}"
+    
+    def _audio_file_path(self, audio_filename: str) -> str:
+        """
+        获取合成音频的保存路径（确保目录存在）
+        
+        :param audio_filename: 音频文件名
+        :return: 音频文件的完整路径
+        """
+        os.makedirs(self.AUDIO_DIR, exist_ok=True)
+        return os.path.join(self.AUDIO_DIR, audio_filename)
+    
+    def _save_audio(self, audio_data: bytes, prefix: str, audio_format: str,
+                    target_format: Optional[str] = None) -> Dict[str, Any]:
+        """
+        保存合成的音频数据，需要时先转换为目标格式（转换失败时保存原始格式）
+        
+        :param audio_data: 音频数据
+        :param prefix: 文件名前缀
+        :param audio_format: 音频数据的格式
+        :param target_format: 保存的格式，缺省时与音频数据相同
+        :return: 包含audio_url、audio_path和format的结果
+        """
+        if target_format and target_format != audio_format:
+            try:
+                with self._timed('tts_transcode'):
+                    audio_data = transcode(audio_data, audio_format, target_format)
+                audio_format = target_format
+            except AudioProcessingError as e:
+                self.logger.warning(f"{str(e)}，使用{audio_format}格式")
+        
+        audio_filename = self._new_audio_filename(prefix, audio_format)
+        full_audio_path = self._audio_file_path(audio_filename)
+        with self._timed('tts_file_write'):
+            with open(full_audio_path, 'wb') as f:
+                f.write(audio_data)
+        
+        return {
+            'audio_url': f'{self.AUDIO_URL_PREFIX}/{audio_filename}',
+            'audio_path': full_audio_path,
+            'format': audio_format
+        }
@@ -0,0 +1,432 @@
+"""
+多进程共享状态：对话历史、缓存索引和限流计数保存在共享存储中，多个工作进程（或多台机器）看到同一份状态，
+负载均衡无需按会话粘连
+
+- MemoryStore：进程内实现（与Redis命令语义一致），用于单进程开发测试和本地的Redis替身服务
+- RedisStore：通过RESP协议访问Redis（或兼容的服务），内置连接池，批量操作通过管道一次往返完成
+
+两种存储都以Redis命令的形式访问（例如 ('RPUSH', key, value)），调用方的代码与后端无关。
+"""
+import socket
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import unquote, urlparse
+
+from .config import Config
+from .exceptions import ConfigurationError, StateError
+from .metrics import timed
+
+Command = Tuple[Any, ...]
+
+
+class StateStore(ABC):
+    """
+    共享状态存储的基类
+    """
+    def __init__(self, prefix: str = ''):
+        """
+        :param prefix: 所有键的前缀（多个应用共用一个Redis时区分）
+        """
+        self.prefix = prefix
+
+    def key(self, *parts: Any) -> str:
+        """
+        生成带前缀的键
+
+        :param parts: 键的各部分，以冒号连接
+        :return: 完整的键
+        """
+        return self.prefix + ':'.join(str(part) for part in parts)
+
+    @abstractmethod
+    def execute(self, *command: Any) -> Any:
+        """
+        执行一条命令
+
+        :param command: 命令及参数，例如 ('GET', key)
+        :return: 命令结果
+        :raises StateError: 命令执行失败或存储不可用
+        """
+
+    @abstractmethod
+    def pipeline(self, commands: Sequence[Command], transaction: bool = False) -> List[Any]:
+        """
+        批量执行命令（一次往返）
+
+        :param commands: 命令列表
+        :param transaction: 是否作为事务原子执行（MULTI/EXEC）
+        :return: 与命令一一对应的结果
+        :raises StateError: 任一命令执行失败或存储不可用
+        """
+
+    def lock(self, name: str, ttl: float = 60, wait: float = 30) -> 'StoreLock':
+        """
+        创建跨进程的互斥锁
+
+        :param name: 锁的名称
+        :param ttl: 锁的过期时间（秒），持有者异常退出时锁在过期后自动释放
+        :param wait: 获取锁的最长等待时间（秒）
+        :return: 锁（上下文管理器）
+        """
+        return StoreLock(self, self.key('lock', name), ttl, wait)
+
+
+class StoreLock:
+    """
+    基于 SET NX EX 的互斥锁：获取时写入随机令牌，释放时只删除自己持有的锁
+    """
+    def __init__(self, store: StateStore, key: str, ttl: float, wait: float, poll_interval: float = 0.1):
+        self.store = store
+        self.key = key
+        self.ttl = ttl
+        self.wait = wait
+        self.poll_interval = poll_interval
+        self._token = uuid.uuid4().hex
+
+    def __enter__(self) -> 'StoreLock':
+        deadline = time.monotonic() + self.wait
+        while not self.store.execute('SET', self.key, self._token, 'NX', 'EX', max(1, int(self.ttl))):
+            if time.monotonic() >= deadline:
+                raise StateError(f"等待锁超时: {self.key}")
+            time.sleep(self.poll_interval)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        # 锁已过期并被其他进程获取时不删除（GET与DEL之间的间隔远小于过期时间）
+        if self.store.execute('GET', self.key) == self._token:
+            self.store.execute('DEL', self.key)
+
+
+# ---------- 进程内实现 ----------
+
+def _range(length: int, start: int, stop: int) -> Tuple[int, int]:
+    """
+    将Redis的闭区间下标（支持负数）转换为Python切片的起止位置
+    """
+    if start < 0:
+        start = max(length + start, 0)
+    if stop < 0:
+        stop = length + stop
+    return start, max(min(stop, length - 1) + 1, 0)
+
+
+class MemoryStore(StateStore):
+    """
+    进程内的共享状态存储：实现本项目用到的Redis命令子集，命令语义与Redis一致
+    """
+    def __init__(self, prefix: Optional[str] = None):
+        super().__init__(Config.STATE_KEY_PREFIX if prefix is None else prefix)
+        # 键 -> 值（字符串或列表）；键 -> 过期时间（time.monotonic）
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._commands = {
+            'PING': self._ping,
+            'GET': self._get,
+            'MGET': self._mget,
+            'SET': self._set,
+            'DEL': self._del,
+            'EXISTS': self._exists,
+            'INCR': lambda key: self._incrby(key, 1),
+            'INCRBY': self._incrby,
+            'EXPIRE': self._expire,
+            'TTL': self._ttl,
+            'RPUSH': self._rpush,
+            'LRANGE': self._lrange,
+            'LTRIM': self._ltrim,
+            'LLEN': self._llen,
+            'FLUSHDB': self._flushdb
+        }
+
+    def _alive(self, key: str) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            del self._expires[key]
+        return key in self._data
+
+    def _value(self, key: str, kind: type) -> Any:
+        if not self._alive(key):
+            return None
+        value = self._data[key]
+        if not isinstance(value, kind):
+            raise StateError('WRONGTYPE Operation against a key holding the wrong kind of value')
+        return value
+
+    def _ping(self, *args) -> str:
+        return args[0] if args else 'PONG'
+
+    def _get(self, key: str) -> Optional[str]:
+        return self._value(key, str)
+
+    def _mget(self, *keys: str) -> List[Optional[str]]:
+        return [value if isinstance(value, str) else None
+                for value in (self._data[key] if self._alive(key) else None for key in keys)]
+
+    def _set(self, key: str, value: Any, *options: Any) -> Optional[str]:
+        options = [str(option).upper() for option in options]
+        ttl = None
+        if 'EX' in options:
+            ttl = float(options[options.index('EX') + 1])
+        if 'NX' in options and self._alive(key):
+            return None
+        self._data[key] = str(value)
+        self._expires.pop(key, None)
+        if ttl is not None:
+            self._expires[key] = time.monotonic() + ttl
+        return 'OK'
+
+    def _del(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self._data[key]
+                self._expires.pop(key, None)
+                removed += 1
+        return removed
+
+    def _exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._alive(key))
+
+    def _incrby(self, key: str, amount: Any) -> int:
+        current = self._value(key, str)
+        try:
+            value = int(current or 0) + int(amount)
+        except ValueError:
+            raise StateError('ERR value is not an integer or out of range')
+        self._data[key] = str(value)
+        return value
+
+    def _expire(self, key: str, seconds: Any) -> int:
+        if not self._alive(key):
+            return 0
+        self._expires[key] = time.monotonic() + float(seconds)
+        return 1
+
+    def _ttl(self, key: str) -> int:
+        if not self._alive(key):
+            return -2
+        expires_at = self._expires.get(key)
+        return -1 if expires_at is None else int(round(expires_at - time.monotonic()))
+
+    def _rpush(self, key: str, *values: Any) -> int:
+        items = self._value(key, list)
+        if items is None:
+            items = self._data[key] = []
+        items.extend(str(value) for value in values)
+        return len(items)
+
+    def _lrange(self, key: str, start: Any, stop: Any) -> List[str]:
+        items = self._value(key, list) or []
+        begin, end = _range(len(items), int(start), int(stop))
+        return items[begin:end]
+
+    def _ltrim(self, key: str, start: Any, stop: Any) -> str:
+        items = self._value(key, list)
+        if items is not None:
+            begin, end = _range(len(items), int(start), int(stop))
+            del items[end:]
+            del items[:begin]
+            if not items:
+                self._del(key)
+        return 'OK'
+
+    def _llen(self, key: str) -> int:
+        return len(self._value(key, list) or [])
+
+    def _flushdb(self) -> str:
+        self._data.clear()
+        self._expires.clear()
+        return 'OK'
+
+    def execute(self, *command: Any) -> Any:
+        handler = self._commands.get(str(command[0]).upper())
+        if handler is None:
+            raise StateError(f"ERR unknown command '{command[0]}'")
+        with self._lock:
+            try:
+                return handler(*command[1:])
+            except TypeError:
+                raise StateError(f"ERR wrong number of arguments for '{command[0]}' command")
+
+    def pipeline(self, commands: Sequence[Command], transaction: bool = False) -> List[Any]:
+        # 持有锁执行所有命令，本身就是原子的
+        with self._lock:
+            return [self.execute(*command) for command in commands]
+
+
+# ---------- Redis（RESP协议） ----------
+
+class _RespConnection:
+    """
+    一个到Redis的连接，负责RESP协议的编码和解析
+    """
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+
+    @staticmethod
+    def encode(command: Command) -> bytes:
+        parts = [b'*%d\r\n' % len(command)]
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(parts)
+
+    def send(self, commands: Sequence[Command]) -> None:
+        self.sock.sendall(b''.join(self.encode(command) for command in commands))
+
+    def read(self) -> Any:
+        """
+        读取一个回复；错误回复作为StateError对象返回（不抛出），以便读完管道中其余的回复
+        """
+        line = self.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('Redis连接已关闭')
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode('utf-8')
+        if kind == b'-':
+            return StateError(body.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError('Redis连接已关闭')
+            return data[:-2].decode('utf-8')
+        if kind == b'*':
+            count = int(body)
+            return None if count < 0 else [self.read() for _ in range(count)]
+        raise ConnectionError(f'无法解析的Redis回复: {line[:32]!r}')
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def _raise_errors(results: List[Any]) -> List[Any]:
+    for result in results:
+        if isinstance(result, StateError):
+            raise result
+    return results
+
+
+class RedisStore(StateStore):
+    """
+    通过RESP协议访问Redis的共享状态存储
+    """
+    def __init__(self, url: Optional[str] = None, prefix: Optional[str] = None,
+                 pool_size: Optional[int] = None, timeout: Optional[float] = None):
+        """
+        初始化Redis存储，缺省参数使用配置值（首次执行命令时才建立连接）
+
+        :param url: 连接地址，例如 redis://:password@localhost:6379/0
+        :param prefix: 所有键的前缀
+        :param pool_size: 连接池中保留的空闲连接数
+        :param timeout: 连接和读写超时（秒）
+        """
+        super().__init__(Config.STATE_KEY_PREFIX if prefix is None else prefix)
+        parsed = urlparse(url or Config.STATE_REDIS_URL)
+        if parsed.scheme != 'redis':
+            raise ConfigurationError(f"不支持的Redis地址: {url or Config.STATE_REDIS_URL}")
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.pool_size = pool_size or Config.STATE_POOL_SIZE
+        self.timeout = timeout or Config.STATE_TIMEOUT
+        self._idle: List[_RespConnection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> _RespConnection:
+        connection = _RespConnection(self.host, self.port, self.timeout)
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.username, self.password) if self.username else ('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        if setup:
+            connection.send(setup)
+            try:
+                _raise_errors([connection.read() for _ in setup])
+            except StateError:
+                connection.close()
+                raise
+        return connection
+
+    def _acquire(self) -> _RespConnection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def _release(self, connection: _RespConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def _roundtrip(self, commands: Sequence[Command]) -> List[Any]:
+        """
+        发送一批命令并读取全部回复；连接出错时关闭该连接，不放回连接池
+        """
+        with timed('state_roundtrip', 'redis'):
+            try:
+                connection = self._acquire()
+            except OSError as e:
+                raise StateError(f"无法连接Redis（{self.host}:{self.port}）: {str(e)}")
+            try:
+                connection.send(commands)
+                results = [connection.read() for _ in commands]
+            except (OSError, ValueError) as e:
+                connection.close()
+                raise StateError(f"Redis读写失败: {str(e)}")
+            self._release(connection)
+        return results
+
+    def execute(self, *command: Any) -> Any:
+        return _raise_errors(self._roundtrip([command]))[0]
+
+    def pipeline(self, commands: Sequence[Command], transaction: bool = False) -> List[Any]:
+        if not commands:
+            return []
+        if not transaction:
+            return _raise_errors(self._roundtrip(commands))
+        results = self._roundtrip([('MULTI',), *commands, ('EXEC',)])
+        # MULTI和各命令的排队回复（+OK/+QUEUED）中的错误说明命令本身有误，事务不会执行
+        _raise_errors(results[:-1])
+        if results[-1] is None:
+            raise StateError('Redis事务被中止')
+        if isinstance(results[-1], StateError):
+            raise results[-1]
+        return _raise_errors(results[-1])
+
+
+def create_state_store() -> Optional[StateStore]:
+    """
+    按配置创建共享状态存储
+
+    :return: 共享状态存储；STATE_BACKEND为local时返回None，各组件使用各自进程内的数据结构
+    :raises ConfigurationError: 未知的后端
+    """
+    backend = Config.STATE_BACKEND
+    if backend == 'local':
+        return None
+    if backend == 'memory':
+        return MemoryStore()
+    if backend == 'redis':
+        return RedisStore()
+    raise ConfigurationError(f"未知的共享状态后端: {backend}")
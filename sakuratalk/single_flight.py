@@ -0,0 +1,83 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .metrics import record_cache
+
+
+class _Call:
+    """
+    一次正在进行中的调用
+    """
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    请求合并（single-flight）：相同key的并发调用只执行一次，其余调用等待并共享同一结果
+
+    注意：共享的结果对象会返回给所有等待者，调用方不应修改它
+    """
+    def __init__(self, name: Optional[str] = None):
+        """
+        初始化请求合并器
+
+        :param name: 名称，提供时将合并命中情况记录到缓存指标中
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        执行调用；如果相同key的调用正在进行，则等待其结果
+
+        :param key: 请求合并的键
+        :param fn: 实际执行的函数
+        :return: 函数的返回值（与同时到达的其他调用共享）
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if self.name:
+            record_cache(self.name, not leader)
+
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                # 先移除再通知，之后到达的请求会发起新的调用而不是读取旧结果
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.event.set()
+        else:
+            call.event.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def in_flight(self) -> int:
+        """
+        返回当前正在进行中的调用数量
+        """
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,199 @@
+"""
+推测执行：回复发送后，按回复中的建议句子（next_suggestion）在后台提前生成下一轮的回复及其语音；
+学习者实际说出的内容与建议句子一致（规范化后相同或足够相似）时直接返回预先生成的结果
+"""
+import difflib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .config import Config
+from .metrics import SPECULATION_RESULTS
+from .tracing import bind_context
+
+logger = logging.getLogger(__name__)
+
+# 比较时忽略的标点和空白
+_IGNORED_PATTERN = re.compile(r'[\s、。，,．.！!？?「」『』（）()\[\]〜~…・"\'-]+')
+
+# 跟踪推测预算的最大会话数
+MAX_SESSIONS = 1024
+
+
+def normalize_utterance(text: str) -> str:
+    """
+    规范化句子用于比较：统一全角/半角（NFKC）、去掉标点和空白、英文字母转小写
+
+    :param text: 句子
+    :return: 规范化后的句子
+    """
+    return _IGNORED_PATTERN.sub('', unicodedata.normalize('NFKC', text or '')).lower()
+
+
+def utterance_similarity(expected: str, actual: str) -> float:
+    """
+    计算两个句子规范化后的相似度
+
+    :param expected: 期望的句子（建议句子）
+    :param actual: 实际的句子（学习者输入或识别结果）
+    :return: 0–1的相似度，规范化后相同时为1
+    """
+    expected, actual = normalize_utterance(expected), normalize_utterance(actual)
+    if not expected or not actual:
+        return 0.0
+    if expected == actual:
+        return 1.0
+    return difflib.SequenceMatcher(None, expected, actual, autojunk=False).ratio()
+
+
+class Speculation:
+    """
+    一次推测执行
+    """
+    __slots__ = ('suggestion', 'revision', 'service_key', 'future', 'cancelled', 'created_at')
+
+    def __init__(self, suggestion: str, revision: int, service_key: Tuple[str, str]):
+        self.suggestion = suggestion
+        self.revision = revision
+        self.service_key = service_key
+        self.future: Optional[Future] = None
+        self.cancelled = threading.Event()
+        self.created_at = time.monotonic()
+
+    def cancel(self) -> None:
+        """
+        取消推测：尚未开始的任务不再执行，进行中的任务跳过后续阶段（例如语音合成）并丢弃结果
+        """
+        self.cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+
+class Speculator:
+    """
+    推测执行管理器：每个会话最多保留一个进行中的推测，并按会话限制一段时间内的推测次数
+    """
+    def __init__(self, max_workers: Optional[int] = None, budget: Optional[int] = None,
+                 window: Optional[float] = None, match_ratio: Optional[float] = None):
+        """
+        初始化推测执行管理器
+
+        :param max_workers: 同时进行的推测任务数（所有会话共享）
+        :param budget: 每个会话在时间窗口内的最大推测次数
+        :param window: 预算的时间窗口（秒）
+        :param match_ratio: 判定学习者输入与建议句子一致的最低相似度
+        """
+        self.budget = Config.SPECULATION_BUDGET if budget is None else budget
+        self.window = window or Config.SPECULATION_WINDOW
+        self.match_ratio = match_ratio or Config.SPECULATION_MATCH_RATIO
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or Config.SPECULATION_MAX_WORKERS,
+                                            thread_name_prefix='speculation')
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Speculation] = {}
+        self._usage: 'OrderedDict[str, deque]' = OrderedDict()
+
+    def _consume_budget(self, session_id: str) -> bool:
+        """
+        占用一次会话的推测预算
+
+        :return: 预算是否足够
+        """
+        now = time.monotonic()
+        with self._lock:
+            usage = self._usage.get(session_id)
+            if usage is None:
+                usage = self._usage[session_id] = deque()
+                while len(self._usage) > MAX_SESSIONS:
+                    self._usage.popitem(last=False)
+            else:
+                self._usage.move_to_end(session_id)
+            while usage and now - usage[0] > self.window:
+                usage.popleft()
+            if len(usage) >= self.budget:
+                return False
+            usage.append(now)
+            return True
+
+    def schedule(self, session_id: str, suggestion: str, revision: int, service_key: Tuple[str, str],
+                 compute: Callable[[threading.Event], Dict[str, Any]]) -> bool:
+        """
+        为会话启动一次推测，同一会话之前的推测会被取消
+
+        :param session_id: 会话ID
+        :param suggestion: 建议句子（预计学习者下一轮会说的话）
+        :param revision: 推测所基于的对话历史版本
+        :param service_key: 生成回复所用的（服务商, 模型）
+        :param compute: 生成回复的函数，参数为取消事件，返回对话结果（失败时包含error字段）
+        :return: 是否已启动
+        """
+        self.discard(session_id)
+        if not suggestion or not normalize_utterance(suggestion):
+            return False
+        if not self._consume_budget(session_id):
+            SPECULATION_RESULTS.labels('budget_exhausted').inc()
+            return False
+
+        speculation = Speculation(suggestion, revision, service_key)
+        with self._lock:
+            self._pending[session_id] = speculation
+        speculation.future = self._executor.submit(bind_context(self._run), speculation, compute)
+        SPECULATION_RESULTS.labels('scheduled').inc()
+        return True
+
+    def _run(self, speculation: Speculation, compute: Callable[[threading.Event], Dict[str, Any]]) -> Dict[str, Any]:
+        try:
+            return compute(speculation.cancelled)
+        except Exception as e:
+            logger.warning(f"推测执行失败: {str(e)}")
+            return {'error': str(e)}
+
+    def discard(self, session_id: str) -> None:
+        """
+        取消会话中进行中的推测
+        """
+        with self._lock:
+            speculation = self._pending.pop(session_id, None)
+        if speculation is not None:
+            speculation.cancel()
+            SPECULATION_RESULTS.labels('cancelled').inc()
+
+    def take(self, session_id: str, user_message: str, revision: int,
+             service_key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """
+        学习者输入与推测的建议句子一致时取出预先生成的结果（仍在生成时等待其完成），否则取消推测
+
+        :param session_id: 会话ID
+        :param user_message: 学习者实际输入（或识别结果）
+        :param revision: 当前的对话历史版本，与推测时不同说明期间有其他对话，结果作废
+        :param service_key: 本轮选用的（服务商, 模型），与推测时不同时结果作废
+        :return: 预先生成的对话结果，不可用时返回None
+        """
+        with self._lock:
+            speculation = self._pending.pop(session_id, None)
+        if speculation is None:
+            return None
+
+        outcome = None
+        if speculation.revision != revision or speculation.service_key != service_key:
+            outcome = 'stale'
+        elif utterance_similarity(speculation.suggestion, user_message) < self.match_ratio:
+            outcome = 'miss'
+        elif speculation.future.cancel():
+            # 任务还在排队，说明推测执行跟不上，直接走正常流程
+            outcome = 'not_started'
+        if outcome:
+            speculation.cancel()
+            SPECULATION_RESULTS.labels(outcome).inc()
+            return None
+
+        result = speculation.future.result()
+        if 'error' in result:
+            SPECULATION_RESULTS.labels('error').inc()
+            return None
+        SPECULATION_RESULTS.labels('hit').inc()
+        return dict(result)
@@ -0,0 +1,180 @@
+import functools
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, Sequence
+
+from opentelemetry import context, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter, SpanExportResult
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+from .config import Config
+
+tracer = trace.get_tracer('sakuratalk')
+_propagator = TraceContextTextMapPropagator()
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """
+    将span以JSON Lines格式写入本地文件，便于离线分析一轮对话的关键路径
+    """
+    def __init__(self, file_path: str):
+        """
+        初始化文件导出器
+
+        :param file_path: 输出文件路径
+        """
+        directory = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(file_path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence) -> SpanExportResult:
+        with self._lock:
+            for span in spans:
+                self._file.write(json.dumps(json.loads(span.to_json()), ensure_ascii=False) + '\n')
+            self._file.flush()
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def _create_exporter(exporter_name: str):
+    """
+    根据配置创建span导出器
+
+    :param exporter_name: 导出器名称（file、otlp、console）
+    :return: 导出器实例，未知名称时返回None
+    """
+    if exporter_name == 'file':
+        return JsonLinesSpanExporter(Config.TRACING_FILE)
+    if exporter_name == 'otlp':
+        # OTLP导出器为可选依赖：pip install opentelemetry-exporter-otlp-proto-http
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=Config.OTLP_ENDPOINT)
+    if exporter_name == 'console':
+        return ConsoleSpanExporter()
+    return None
+
+
+def init_tracing(app) -> None:
+    """
+    初始化链路追踪：配置导出器，并为每个HTTP请求创建服务端span
+
+    浏览器通过W3C traceparent请求头传入的上下文会作为父span，
+    因此同一轮对话的多个请求会出现在同一条链路中。
+
+    :param app: Flask应用
+    """
+    exporter = _create_exporter(Config.TRACING_EXPORTER)
+    if exporter is not None and not isinstance(trace.get_tracer_provider(), TracerProvider):
+        provider = TracerProvider(resource=Resource.create({'service.name': Config.TRACING_SERVICE_NAME}))
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+
+    from flask import g, request
+
+    @app.before_request
+    def start_request_span():
+        parent = _propagator.extract(request.headers)
+        span = tracer.start_span(
+            f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+            context=parent,
+            kind=SpanKind.SERVER,
+            attributes={'http.method': request.method, 'http.target': request.path}
+        )
+        g.trace_span = span
+        g.trace_token = context.attach(trace.set_span_in_context(span, parent))
+
+    @app.after_request
+    def record_response_status(response):
+        span = g.get('trace_span')
+        if span is not None:
+            span.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                span.set_status(Status(StatusCode.ERROR))
+        return response
+
+    @app.teardown_request
+    def end_request_span(exc):
+        # 流式响应的请求上下文在数据全部发送后才会销毁，span因此覆盖整个流水线
+        span = g.pop('trace_span', None)
+        token = g.pop('trace_token', None)
+        if span is not None:
+            if exc is not None:
+                span.record_exception(exc)
+                span.set_status(Status(StatusCode.ERROR))
+            span.end()
+        if token is not None:
+            context.detach(token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    创建一个子span的上下文管理器
+
+    :param name: span名称
+    """
+    with tracer.start_as_current_span(name, attributes=attributes) as current_span:
+        yield current_span
+
+
+def bind_context(fn: Callable) -> Callable:
+    """
+    绑定当前的追踪上下文，使函数在其他线程中执行时仍属于当前链路
+
+    :param fn: 要在其他线程中执行的函数
+    :return: 包装后的函数
+    """
+    captured = context.get_current()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = context.attach(captured)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            context.detach(token)
+    return wrapper
+
+
+def trace_methods(cls, kind: str, method_names: Iterable[str]) -> None:
+    """
+    为服务类中定义的方法添加span（供服务基类的 __init_subclass__ 使用）
+
+    :param cls: 服务子类
+    :param kind: 服务类型（llm、stt、tts）
+    :param method_names: 需要追踪的方法名
+    """
+    for method_name in method_names:
+        method = cls.__dict__.get(method_name)
+        if method is None or getattr(method, '__traced__', False):
+            continue
+
+        def make_wrapper(method, method_name):
+            @functools.wraps(method)
+            def wrapper(self, *args, **kwargs):
+                with tracer.start_as_current_span(
+                    f"{kind}.{method_name}",
+                    kind=SpanKind.CLIENT,
+                    attributes={
+                        'sakuratalk.provider': self.provider_name,
+                        'sakuratalk.model': self.model_name
+                    }
+                ) as current_span:
+                    result = method(self, *args, **kwargs)
+                    # 服务以error字段返回失败，而不是抛出异常
+                    if isinstance(result, dict) and 'error' in result:
+                        current_span.set_status(Status(StatusCode.ERROR, str(result['error'])))
+                    return result
+            wrapper.__traced__ = True
+            return wrapper
+
+        setattr(cls, method_name, make_wrapper(method, method_name))
@@ -20,11 +20,19 @@ class SakuraTalk {
         this.suggestionTranslation = document.getElementById('suggestionTranslation');
         this.playUserVoice = document.getElementById('playUserVoice');
         this.playAiVoice = document.getElementById('playAiVoice');
+        this.playSuggestion = document.getElementById('playSuggestion');
         
         this.isRecording = false;
         this.currentScenario = 'greeting';
         this.audioElement = null; // 用于播放语音
         this.userAudioBlob = null; // 用户录音的音频数据
+        this.capture = null; // 进行中的录音（AudioWorklet采集并分片上传）
+        this.traceparent = null; // 当前一轮对话的W3C追踪上下文，同一轮的请求共享
+        this.sessionId = Array.from(crypto.getRandomValues(new Uint8Array(8)))
+            .map(b => b.toString(16).padStart(2, '0')).join(''); // 会话ID，服务端按会话预先生成下一轮回复
+        this.learnerId = this.loadLearnerId(); // 学习者ID（保存在浏览器中），服务端按学习者统计学习进度
+        // 服务端合成语音的格式：支持Opus的浏览器使用Opus，否则使用MP3
+        this.audioFormat = new Audio().canPlayType('audio/ogg; codecs=opus') ? 'opus' : 'mp3';
         
         // Web Speech API相关
         this.recognition = null;
@@ -32,6 +40,7 @@ class SakuraTalk {
         
         this.initEventListeners();
         this.initSpeechRecognition();
+        this.registerServiceWorker();
     }
     
     initEventListeners() {
@@ -63,6 +72,7 @@ class SakuraTalk {
         // 播放控制事件
         this.playUserVoice.addEventListener('click', () => this.playUserVoiceRecording());
         this.playAiVoice.addEventListener('click', () => this.playAiVoiceResponse());
+        this.playSuggestion.addEventListener('click', () => this.playSuggestionVoice());
         
         // 场景选择事件
         const scenarioButtons = document.querySelectorAll('.scenario-btn');
@@ -107,29 +117,102 @@ class SakuraTalk {
         }
     }
     
+    // 读取保存在浏览器中的学习者ID，首次使用时生成（无法使用localStorage时退化为会话ID）
+    loadLearnerId() {
+        try {
+            let learnerId = localStorage.getItem('sakuratalk.learnerId');
+            if (!learnerId) {
+                learnerId = Array.from(crypto.getRandomValues(new Uint8Array(8)))
+                    .map(b => b.toString(16).padStart(2, '0')).join('');
+                localStorage.setItem('sakuratalk.learnerId', learnerId);
+            }
+            return learnerId;
+        } catch (error) {
+            return this.sessionId;
+        }
+    }
+
+    // 注册Service Worker，在本地缓存服务端合成的语音（重播和建议句子无需再次请求服务端）
+    registerServiceWorker() {
+        if (!('serviceWorker' in navigator)) {
+            return;
+        }
+        navigator.serviceWorker.register('/sw.js').catch(error => {
+            console.warn('Service Worker注册失败:', error);
+        });
+    }
+    
+    // 通知Service Worker缓存语音：prefetch为提前合成，store为保存已合成的音频
+    cacheSpeech(type, text, audioUrl = null) {
+        const worker = navigator.serviceWorker && navigator.serviceWorker.controller;
+        if (!worker || !text) {
+            return;
+        }
+        worker.postMessage({ type: type, text: text, format: this.audioFormat, audio_url: audioUrl });
+    }
+    
+    // 为新一轮对话生成W3C traceparent，使该轮的所有请求出现在同一条服务端链路中
+    startTrace() {
+        const randomHex = (bytes) => Array.from(crypto.getRandomValues(new Uint8Array(bytes)))
+            .map(b => b.toString(16).padStart(2, '0')).join('');
+        this.traceparent = `00-${randomHex(16)}-${randomHex(8)}-01`;
+        return this.traceparent;
+    }
+    
+    // 附带追踪上下文的请求头
+    traceHeaders(headers = {}) {
+        if (this.traceparent) {
+            headers['traceparent'] = this.traceparent;
+        }
+        return headers;
+    }
+    
     sendMessage() {
         const message = this.userInput.value.trim();
         if (!message) return;
         
+        this.startTrace();
         this.addMessageToHistory(message, 'user');
         this.userInput.value = '';
         
+        // 浏览器不支持语音合成时，通过语音对话接口一次往返同时获取回复和语音
+        if (!this.synth) {
+            const formData = new FormData();
+            formData.append('text', message);
+            formData.append('session_id', this.sessionId);
+            formData.append('learner_id', this.learnerId);
+            formData.append('audio_format', this.audioFormat);
+            this.runVoiceTurn(formData, message);
+            return;
+        }
+        
         // 显示AI正在输入
         const aiLoadingMessage = this.addMessageToHistory('AI正在思考中...', 'ai', true);
         
         // 发送请求到后端
         fetch('/api/chat', {
             method: 'POST',
-            headers: {
+            headers: this.traceHeaders({
                 'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ message: message })
+            }),
+            body: JSON.stringify({
+                message: message,
+                session_id: this.sessionId,
+                learner_id: this.learnerId,
+                audio_format: this.audioFormat
+            })
         })
         .then(response => response.json())
         .then(data => {
             // 移除加载消息
             aiLoadingMessage.remove();
             
+            // 限流或服务繁忙（429/503）等错误直接提示
+            if (data.error) {
+                this.addMessageToHistory(`抱歉，${data.error}`, 'ai');
+                return;
+            }
+            
             // 显示AI回复
             const aiMessage = `
                 <strong>AI助手:</strong>
@@ -150,6 +233,122 @@ class SakuraTalk {
         });
     }
     
+    // 发送录音，一次往返完成 语音识别 → AI回复 → 语音合成
+    // upload为已分片上传的录音（{uploadId, chunks}），提供时不再上传音频文件
+    sendVoiceTurn(audioBlob, upload = null) {
+        this.startTrace();
+        const formData = new FormData();
+        if (upload) {
+            formData.append('upload_id', upload.uploadId);
+            formData.append('upload_chunks', upload.chunks);
+        } else {
+            formData.append('audio', audioBlob, 'recording.wav');
+        }
+        formData.append('session_id', this.sessionId);
+        formData.append('learner_id', this.learnerId);
+        // 以上一轮的建议句子作为期望文本进行发音评分
+        formData.append('expected_text', this.nextSuggestion.textContent);
+        formData.append('expected_hiragana', this.suggestionHiragana.textContent);
+        // 浏览器支持语音合成时无需服务端合成语音
+        formData.append('tts', this.synth ? 'false' : 'true');
+        formData.append('audio_format', this.audioFormat);
+        // 多进程部署中请求到了没有该上传的进程时（404），改为上传整段录音
+        const retry = upload && this.userAudioBlob ? () => this.sendVoiceTurn(this.userAudioBlob) : null;
+        this.runVoiceTurn(formData, null, retry);
+    }
+    
+    // 调用 /api/voice_turn 并逐行处理NDJSON事件流；retry为上传不存在（404）时的重试
+    async runVoiceTurn(formData, userMessage, retry = null) {
+        const aiLoadingMessage = this.addMessageToHistory('AI正在思考中...', 'ai', true);
+        const turn = { userMessage: userMessage, loading: aiLoadingMessage };
+        
+        try {
+            const response = await fetch('/api/voice_turn', {
+                method: 'POST',
+                headers: this.traceHeaders(),
+                body: formData
+            });
+            if (response.status === 404 && retry) {
+                return retry();
+            }
+            if (!response.ok) {
+                // 限流或服务繁忙（429/503）时不会开始事件流
+                const data = await response.json();
+                this.addMessageToHistory(`抱歉，${data.error || '处理您的消息时出现错误。'}`, 'ai');
+                return;
+            }
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                lines.filter(line => line.trim()).forEach(line => {
+                    this.handleVoiceTurnEvent(JSON.parse(line), turn);
+                });
+            }
+        } catch (error) {
+            console.error('Error:', error);
+            this.addMessageToHistory('抱歉，处理您的消息时出现错误。', 'ai');
+        } finally {
+            turn.loading.remove();
+        }
+    }
+    
+    // 处理语音对话流水线推送的事件
+    handleVoiceTurnEvent(event, turn) {
+        switch (event.event) {
+            case 'transcript':
+                turn.userMessage = event.text;
+                this.userRecognizedText.textContent = event.text;
+                this.chatHistory.insertBefore(this.addMessageToHistory(event.text, 'user'), turn.loading);
+                break;
+            case 'reply':
+                turn.reply = event.message;
+                turn.suggestion = event.next_suggestion;
+                this.addMessageToHistory(`
+                    <strong>AI助手:</strong>
+                    <p>${event.message}</p>
+                `, 'ai');
+                this.updateDetailsPanel(event, turn.userMessage);
+                if (this.synth) {
+                    this.synthesizeSpeech(event.message);
+                } else {
+                    // 使用服务端语音时，回复一到就预取建议句子的语音，学习者点击播放时直接从本地缓存播放
+                    this.cacheSpeech('prefetch', turn.suggestion);
+                }
+                break;
+            case 'pronunciation':
+                this.userPronunciationScore.textContent = event.score;
+                break;
+            case 'audio':
+                if (event.target === 'reply') {
+                    this.playAudioUrl(event.audio_url);
+                    this.cacheSpeech('store', turn.reply, event.audio_url);
+                } else if (event.target === 'suggestion') {
+                    this.cacheSpeech('store', turn.suggestion, event.audio_url);
+                }
+                break;
+            case 'error':
+                console.error(`语音对话错误(${event.stage}):`, event.error);
+                this.addMessageToHistory('抱歉，处理您的消息时出现错误。', 'ai');
+                break;
+        }
+    }
+    
+    // 播放服务端合成的语音
+    playAudioUrl(audioUrl) {
+        if (this.audioElement) {
+            this.audioElement.pause();
+        }
+        this.audioElement = new Audio(audioUrl);
+        this.audioElement.play();
+    }
+    
     // 更新详情面板
     updateDetailsPanel(data, userMessage) {
         // 更新AI助手回复详情
@@ -168,6 +367,7 @@ class SakuraTalk {
         
         // 启用播放按钮
         this.playAiVoice.disabled = false;
+        this.playSuggestion.disabled = false;
         if (this.userAudioBlob) {
             this.playUserVoice.disabled = false;
         }
@@ -191,20 +391,16 @@ class SakuraTalk {
             // 如果Web Speech API不可用，使用后端API
             fetch('/api/text_to_speech', {
                 method: 'POST',
-                headers: {
+                headers: this.traceHeaders({
                     'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ text: text })
+                }),
+                body: JSON.stringify({ text: text, audio_format: this.audioFormat })
             })
             .then(response => response.json())
             .then(data => {
                 if (data.audio_url) {
                     // 播放合成的语音
-                    if (this.audioElement) {
-                        this.audioElement.pause();
-                    }
-                    this.audioElement = new Audio(data.audio_url);
-                    this.audioElement.play();
+                    this.playAudioUrl(data.audio_url);
                 }
             })
             .catch(error => {
@@ -231,6 +427,129 @@ class SakuraTalk {
         }
     }
     
+    // 播放下一句练习建议
+    playSuggestionVoice() {
+        const text = this.nextSuggestion.textContent;
+        if (text) {
+            this.synthesizeSpeech(text);
+        }
+    }
+    
+    // 浏览器是否支持用AudioWorklet采集录音
+    canCaptureAudio() {
+        return !!(navigator.mediaDevices && navigator.mediaDevices.getUserMedia && window.AudioWorkletNode);
+    }
+    
+    // 开始采集录音：AudioWorklet降采样为16kHz单声道PCM16，每250毫秒一个分片，边录音边上传
+    async startCapture() {
+        if (this.capture) return;
+        const stream = await navigator.mediaDevices.getUserMedia({
+            audio: { channelCount: 1, echoCancellation: true, noiseSuppression: true }
+        });
+        const context = new AudioContext();
+        await context.audioWorklet.addModule('/static/recorder-worklet.js');
+        const node = new AudioWorkletNode(context, 'pcm16-recorder');
+        const sampleRate = Math.min(context.sampleRate, 16000);
+        const capture = {
+            stream: stream,
+            context: context,
+            node: node,
+            sampleRate: sampleRate,
+            chunks: [],
+            failed: false,
+            uploads: Promise.resolve()
+        };
+        capture.done = new Promise(resolve => { capture.resolveDone = resolve; });
+        // 开始上传与录音同时进行，分片在上传ID返回后依次发送
+        capture.opened = fetch('/api/audio_upload', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ session_id: this.sessionId, sample_rate: sampleRate })
+        })
+        .then(response => response.ok ? response.json() : Promise.reject(new Error(`HTTP ${response.status}`)))
+        .then(data => data.upload_id);
+        node.port.onmessage = (event) => {
+            if (event.data.chunk) {
+                this.uploadChunk(capture, event.data.chunk);
+            } else if (event.data.done) {
+                capture.resolveDone();
+            }
+        };
+        context.createMediaStreamSource(stream).connect(node);
+        this.capture = capture;
+        if (!this.isRecording) {
+            // 麦克风就绪之前已经停止录音
+            await this.stopCapture();
+        }
+    }
+    
+    // 按序号依次上传分片；上传失败时录音结束后改为整段上传
+    uploadChunk(capture, chunk) {
+        const seq = capture.chunks.length;
+        capture.chunks.push(chunk);
+        capture.uploads = capture.uploads
+            .then(() => capture.failed ? null : capture.opened)
+            .then(uploadId => uploadId && fetch(`/api/audio_upload/${uploadId}/${seq}`, {
+                method: 'PUT',
+                headers: { 'Content-Type': 'application/octet-stream' },
+                body: chunk
+            }))
+            .then(response => {
+                if (response && !response.ok) capture.failed = true;
+            })
+            .catch(error => {
+                console.warn('录音分片上传失败:', error);
+                capture.failed = true;
+            });
+    }
+    
+    // 结束采集：发送最后一个分片，随后以上传ID发起语音对话
+    async stopCapture() {
+        const capture = this.capture;
+        if (!capture) return;
+        this.capture = null;
+        capture.node.port.postMessage('stop');
+        await capture.done;
+        capture.stream.getTracks().forEach(track => track.stop());
+        capture.context.close();
+        
+        this.userAudioBlob = this.encodeWav(capture.chunks, capture.sampleRate);
+        await capture.uploads;
+        if (capture.chunks.length === 0) {
+            this.recordStatus.textContent = '没有录到声音';
+            return;
+        }
+        const uploadId = capture.failed ? null : await capture.opened.catch(() => null);
+        if (uploadId) {
+            this.sendVoiceTurn(null, { uploadId: uploadId, chunks: capture.chunks.length });
+        } else {
+            this.sendVoiceTurn(this.userAudioBlob);
+        }
+    }
+    
+    // 将PCM16分片拼接为WAV（用于回放和分片上传失败时整段上传）
+    encodeWav(chunks, sampleRate) {
+        const dataLength = chunks.reduce((total, chunk) => total + chunk.byteLength, 0);
+        const header = new DataView(new ArrayBuffer(44));
+        const writeString = (offset, text) => {
+            for (let i = 0; i < text.length; i++) header.setUint8(offset + i, text.charCodeAt(i));
+        };
+        writeString(0, 'RIFF');
+        header.setUint32(4, 36 + dataLength, true);
+        writeString(8, 'WAVE');
+        writeString(12, 'fmt ');
+        header.setUint32(16, 16, true);
+        header.setUint16(20, 1, true); // PCM
+        header.setUint16(22, 1, true); // 单声道
+        header.setUint32(24, sampleRate, true);
+        header.setUint32(28, sampleRate * 2, true);
+        header.setUint16(32, 2, true);
+        header.setUint16(34, 16, true);
+        writeString(36, 'data');
+        header.setUint32(40, dataLength, true);
+        return new Blob([header.buffer, ...chunks], { type: 'audio/wav' });
+    }
+    
     toggleRecording() {
         if (!this.isRecording) {
             this.startRecording();
@@ -246,8 +565,16 @@ class SakuraTalk {
         this.recordStatus.textContent = '录音中...点击停止';
         this.micIcon.textContent = '⏹';
         
-        // 使用Web Speech API进行录音
-        if (this.recognition) {
+        // 优先录音并交给服务端：一次 /api/voice_turn 完成识别、回复和语音合成
+        if (this.canCaptureAudio()) {
+            this.startCapture().catch(error => {
+                console.error('录音失败:', error);
+                this.capture = null;
+                this.stopRecording();
+                this.recordStatus.textContent = '无法访问麦克风';
+            });
+        } else if (this.recognition) {
+            // 无法采集录音时使用Web Speech API识别
             this.recognition.start();
             console.log('开始录音...');
         } else {
@@ -271,8 +598,10 @@ class SakuraTalk {
         this.recordStatus.textContent = '点击麦克风开始录音';
         this.micIcon.textContent = '🎤';
         
-        // 停止Web Speech API录音
-        if (this.recognition) {
+        if (this.capture) {
+            this.stopCapture().catch(error => console.error('录音上传失败:', error));
+        } else if (this.recognition) {
+            // 停止Web Speech API录音
             this.recognition.stop();
         }
         
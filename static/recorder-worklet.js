@@ -0,0 +1,70 @@
+// 录音处理（AudioWorklet）：混合为单声道、降采样到16kHz并编码为16位PCM，
+// 每积累CHUNK_MS毫秒发送一个分片给页面，由页面边录音边上传
+
+const TARGET_SAMPLE_RATE = 16000;
+const CHUNK_MS = 250;
+
+class PCM16Recorder extends AudioWorkletProcessor {
+    constructor() {
+        super();
+        // 设备采样率低于16kHz时（很少见）保持原采样率，页面按同样的规则上报采样率
+        this.outputRate = Math.min(sampleRate, TARGET_SAMPLE_RATE);
+        this.ratio = sampleRate / this.outputRate;
+        this.chunkSamples = Math.round(this.outputRate * CHUNK_MS / 1000);
+        this.buffer = new Int16Array(this.chunkSamples);
+        this.length = 0;
+        // 降采样：对每个输出样本对应的输入样本取平均（简单的抗混叠低通）
+        this.position = 0; // 下一个输出样本在输入中的结束位置（相对于当前输入块）
+        this.sum = 0;
+        this.count = 0;
+        this.stopped = false;
+        this.port.onmessage = (event) => {
+            if (event.data === 'stop') {
+                this.flush();
+                this.stopped = true;
+                this.port.postMessage({ done: true });
+            }
+        };
+    }
+
+    push(sample) {
+        const clipped = Math.max(-1, Math.min(1, sample));
+        this.buffer[this.length++] = clipped < 0 ? clipped * 0x8000 : clipped * 0x7fff;
+        if (this.length === this.chunkSamples) {
+            this.flush();
+        }
+    }
+
+    // 把已积累的样本作为一个分片发出（转移缓冲区，不复制）
+    flush() {
+        if (this.length === 0) return;
+        const chunk = this.buffer.slice(0, this.length).buffer;
+        this.port.postMessage({ chunk: chunk }, [chunk]);
+        this.length = 0;
+    }
+
+    process(inputs) {
+        if (this.stopped) return false;
+        const input = inputs[0];
+        if (!input || input.length === 0) return true;
+        const frames = input[0].length;
+        for (let i = 0; i < frames; i++) {
+            let sample = 0;
+            for (let channel = 0; channel < input.length; channel++) {
+                sample += input[channel][i];
+            }
+            this.sum += sample / input.length;
+            this.count += 1;
+            if (i + 1 >= this.position + this.ratio) {
+                this.push(this.sum / this.count);
+                this.sum = 0;
+                this.count = 0;
+                this.position += this.ratio;
+            }
+        }
+        this.position -= frames;
+        return true;
+    }
+}
+
+registerProcessor('pcm16-recorder', PCM16Recorder);
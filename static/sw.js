@@ -0,0 +1,240 @@
+// SakuraTalk 的Service Worker：在浏览器本地（IndexedDB）缓存合成的语音
+//
+// - POST /api/text_to_speech：按（格式, 文本哈希）缓存响应和音频数据，相同文本再次合成时不访问服务端
+// - GET /audio/<文件名>：已缓存的音频直接从本地返回（支持Range请求），重播和离线时也能播放
+// - 页面通过postMessage请求预取（prefetch）或保存（store）某段文本的语音
+
+const DB_NAME = 'sakuratalk';
+const DB_VERSION = 1;
+const STORE = 'speech';
+const MAX_ENTRIES = 200; // 本地缓存的最大语音条数，超出时删除最久未使用的
+
+let dbPromise = null;
+
+// 打开IndexedDB（首次使用时创建对象仓库）
+function openDb() {
+    if (!dbPromise) {
+        dbPromise = new Promise((resolve, reject) => {
+            const request = indexedDB.open(DB_NAME, DB_VERSION);
+            request.onupgradeneeded = () => {
+                const store = request.result.createObjectStore(STORE, { keyPath: 'key' });
+                store.createIndex('audio_url', 'audio_url', { unique: false });
+                store.createIndex('used_at', 'used_at', { unique: false });
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => {
+                dbPromise = null;
+                reject(request.error);
+            };
+        });
+    }
+    return dbPromise;
+}
+
+// 在事务中执行操作，返回操作结果
+async function withStore(mode, operation) {
+    const db = await openDb();
+    return new Promise((resolve, reject) => {
+        const tx = db.transaction(STORE, mode);
+        const request = operation(tx.objectStore(STORE));
+        tx.oncomplete = () => resolve(request ? request.result : undefined);
+        tx.onerror = () => reject(tx.error);
+        tx.onabort = () => reject(tx.error);
+    });
+}
+
+// 缓存键：格式 + 文本的SHA-256
+async function speechKey(text, format) {
+    const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+    const hash = Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    return `${format || 'default'}:${hash}`;
+}
+
+// 更新最近使用时间（用于淘汰），失败不影响播放
+function touch(record) {
+    record.used_at = Date.now();
+    withStore('readwrite', store => store.put(record)).catch(() => {});
+}
+
+// 删除最久未使用的记录，使缓存不超过MAX_ENTRIES条
+async function trim() {
+    const count = await withStore('readonly', store => store.count());
+    if (count <= MAX_ENTRIES) return;
+    let excess = count - MAX_ENTRIES;
+    await withStore('readwrite', store => {
+        const cursorRequest = store.index('used_at').openCursor();
+        cursorRequest.onsuccess = () => {
+            const cursor = cursorRequest.result;
+            if (cursor && excess > 0) {
+                cursor.delete();
+                excess -= 1;
+                cursor.continue();
+            }
+        };
+        return null;
+    });
+}
+
+// 下载音频并连同合成结果保存到本地
+async function storeSpeech(key, text, format, audioUrl) {
+    const response = await fetch(audioUrl);
+    if (!response.ok) return null;
+    const blob = await response.blob();
+    const record = {
+        key: key,
+        text: text,
+        format: format,
+        audio_url: new URL(audioUrl, self.location.origin).pathname,
+        blob: blob,
+        used_at: Date.now()
+    };
+    await withStore('readwrite', store => store.put(record));
+    trim().catch(() => {});
+    return record;
+}
+
+// 按文本获取语音：本地有缓存时直接返回，否则请求服务端合成并保存
+async function speechFor(text, format, headers) {
+    const key = await speechKey(text, format);
+    const cached = await withStore('readonly', store => store.get(key));
+    if (cached) {
+        touch(cached);
+        return { record: cached };
+    }
+    const response = await fetch('/api/text_to_speech', {
+        method: 'POST',
+        headers: headers,
+        body: JSON.stringify({ text: text, audio_format: format })
+    });
+    if (!response.ok) {
+        return { response: response };
+    }
+    const data = await response.json();
+    if (!data.audio_url) {
+        return { data: data };
+    }
+    // 按请求的格式保存（服务端转换失败返回其他格式时，下次请求同样会得到该格式）
+    const record = await storeSpeech(key, text, format, data.audio_url);
+    return record ? { record: record } : { data: data };
+}
+
+function jsonResponse(data) {
+    return new Response(JSON.stringify(data), { headers: { 'Content-Type': 'application/json' } });
+}
+
+// 拦截语音合成请求
+async function handleTextToSpeech(request) {
+    let body;
+    try {
+        body = await request.clone().json();
+    } catch (error) {
+        return fetch(request);
+    }
+    if (!body || !body.text) {
+        return fetch(request);
+    }
+    const headers = { 'Content-Type': 'application/json' };
+    const traceparent = request.headers.get('traceparent');
+    if (traceparent) {
+        headers['traceparent'] = traceparent;
+    }
+    try {
+        const result = await speechFor(body.text, body.audio_format, headers);
+        if (result.response) return result.response;
+        if (result.data) return jsonResponse(result.data);
+        return jsonResponse({ audio_url: result.record.audio_url, format: result.record.format, cached: true });
+    } catch (error) {
+        // IndexedDB不可用（例如隐私模式）时直接请求服务端
+        return fetch(request);
+    }
+}
+
+// 从本地缓存返回音频，支持单个范围的Range请求
+function blobResponse(blob, rangeHeader) {
+    const match = rangeHeader && /^bytes=(\d*)-(\d*)$/.exec(rangeHeader.trim());
+    if (!match || (!match[1] && !match[2])) {
+        return new Response(blob, {
+            headers: { 'Content-Type': blob.type, 'Content-Length': String(blob.size), 'Accept-Ranges': 'bytes' }
+        });
+    }
+    let start;
+    let end;
+    if (match[1]) {
+        start = parseInt(match[1], 10);
+        end = match[2] ? Math.min(parseInt(match[2], 10), blob.size - 1) : blob.size - 1;
+    } else {
+        // bytes=-N：最后N个字节
+        start = Math.max(blob.size - parseInt(match[2], 10), 0);
+        end = blob.size - 1;
+    }
+    if (start >= blob.size || start > end) {
+        return new Response(null, { status: 416, headers: { 'Content-Range': `bytes */${blob.size}` } });
+    }
+    return new Response(blob.slice(start, end + 1, blob.type), {
+        status: 206,
+        headers: {
+            'Content-Type': blob.type,
+            'Content-Length': String(end - start + 1),
+            'Content-Range': `bytes ${start}-${end}/${blob.size}`,
+            'Accept-Ranges': 'bytes'
+        }
+    });
+}
+
+// 拦截音频下载
+async function handleAudio(request) {
+    const path = new URL(request.url).pathname;
+    let record;
+    try {
+        record = await withStore('readonly', store => store.index('audio_url').get(path));
+    } catch (error) {
+        record = null;
+    }
+    if (!record) {
+        return fetch(request);
+    }
+    touch(record);
+    return blobResponse(record.blob, request.headers.get('Range'));
+}
+
+self.addEventListener('install', () => {
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', (event) => {
+    // 首次安装后立即接管已打开的页面
+    event.waitUntil(self.clients.claim());
+});
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+    if (request.method === 'POST' && url.pathname === '/api/text_to_speech') {
+        event.respondWith(handleTextToSpeech(request));
+    } else if (request.method === 'GET' && url.pathname.startsWith('/audio/')) {
+        event.respondWith(handleAudio(request));
+    }
+});
+
+// 页面的预取和保存请求
+//   { type: 'prefetch', text, format }：提前合成并保存（例如回复中的建议句子）
+//   { type: 'store', text, format, audio_url }：保存服务端已经合成的语音（例如语音对话流推送的音频）
+self.addEventListener('message', (event) => {
+    const message = event.data || {};
+    if (!message.text) return;
+    let work;
+    if (message.type === 'prefetch') {
+        work = speechFor(message.text, message.format, { 'Content-Type': 'application/json' });
+    } else if (message.type === 'store' && message.audio_url) {
+        work = speechKey(message.text, message.format).then(async (key) => {
+            const cached = await withStore('readonly', store => store.get(key));
+            if (!cached) {
+                await storeSpeech(key, message.text, message.format, message.audio_url);
+            }
+        });
+    } else {
+        return;
+    }
+    event.waitUntil(work.catch(error => console.warn('语音缓存失败:', error)));
+});